@@ -0,0 +1,98 @@
+"""End to end throughput on recorded traffic.
+
+Record a cassette once (needs network):
+    python benchmarks/e2e.py --record video.jsonl --url https://www.youtube.com/watch?v=...
+
+Replay it with no network, 50 ms latency, 5 MB/sec per response and 8 concurrent tasks:
+    python benchmarks/e2e.py --cassette video.jsonl --url ... --latency 0.05 --bandwidth 5 -c 8
+
+Each task runs get_video, get_streams, the first comment pages and a
+download of the smallest stream (--no-download to skip it).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_client_async as yc  # noqa: E402
+
+
+async def _scenario(url: str, sr: yc.SessionRequest, comment_pages: int, download: bool, directory: str):
+    it = yc.InnerTube(sr)
+    video = await yc.get_video(url, sr, it)
+    streams = await video.get_streams()
+    if comment_pages:
+        getter = await video.get_comments_response_getter()
+        if getter is not None:
+            pages = 0
+            async for _ in getter:
+                pages += 1
+                if pages >= comment_pages:
+                    break
+    if download:
+        candidates = streams.filter(progressive=True) or streams.filter(only_audio=True)
+        smallest = candidates.order_by("bitrate").first
+        await yc.simple_download(smallest, os.path.join(directory, f"{id(sr)}"), sr)
+
+
+async def run(args) -> yc.Metrics:
+    metrics = yc.Metrics()
+    if args.record:
+        cassette = yc.Cassette(args.record)
+        async with yc.SessionRequest(session=yc.RecordingSession(cassette), metrics=metrics) as sr:
+            with tempfile.TemporaryDirectory() as directory:
+                await _scenario(args.url, sr, args.comment_pages, not args.no_download, directory)
+        print(f"recorded {len(cassette)} interactions to {args.record}")
+        return metrics
+
+    cassette = yc.Cassette.load(args.cassette)
+    bandwidth = args.bandwidth * 1024 * 1024 if args.bandwidth else None
+
+    async def task(directory: str):
+        session = yc.ReplaySession(cassette, latency=args.latency, bandwidth=bandwidth)
+        async with yc.SessionRequest(session=session, metrics=metrics) as sr:
+            await _scenario(args.url, sr, args.comment_pages, not args.no_download, directory)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            await asyncio.gather(*(task(directory) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    scenarios = args.rounds * args.concurrency
+    snapshot = metrics.snapshot()
+    print(f"{scenarios} scenarios in {elapsed:.3f} s, {scenarios / elapsed:.2f} scenarios/sec")
+    for endpoint, values in snapshot["endpoints"].items():
+        latency = values["latency"]
+        print(
+            f"  {endpoint:<50} requests={values['requests']:<5} "
+            f"p50={(latency['p50'] or 0) * 1e3:.1f} ms p95={(latency['p95'] or 0) * 1e3:.1f} ms"
+        )
+    download = snapshot["download"]
+    if download["downloads"]:
+        print(f"  download: {download['bytes'] / 1024 / 1024:.1f} mb, {download['average_throughput'] / 1024 / 1024:.2f} mb/sec")
+    return metrics
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", default=None, help="record traffic to cassette file")
+    mode.add_argument("--cassette", default=None, help="replay traffic from cassette file")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--bandwidth", type=float, default=None, help="mb/sec per response")
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--comment-pages", type=int, default=2)
+    parser.add_argument("--no-download", action="store_true")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Local aiohttp server that emulates youtube for download and stress tests.
+
+Serves the endpoints the package uses with the generated documents of
+fixtures.py:
+    /watch                          watch page html
+    /youtubei/v1/player|next|browse|search
+    /s/player/.../base.js           player js that deciphers the fixture signatures
+    /videoplayback                  media bytes, &range=start-end or Range header,
+                                    HEAD gives Content-Length, &sq=N serves OTF segments
+
+Faults (403, 404, stalls longer than the client timeout) are injected into
+/videoplayback with the given probabilities.
+
+In code:
+    async with MockServer(media_size=64 * 1024 * 1024) as server:
+        async with server.session_request() as sr:
+            video = await yc.get_video("https://www.youtube.com/watch?v=" + server.video_id, sr, yc.InnerTube(sr))
+
+From the command line:
+    python benchmarks/mock_server.py --port 8080                   # serve until ctrl+c
+    python benchmarks/mock_server.py --download 137 --size 512     # measure simple_download
+    python benchmarks/mock_server.py --filesize --otf-segments 300 # measure seq_filesize
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from urllib import parse
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+
+import youtube_client_async as yc  # noqa: E402
+
+
+class Faults:
+    """Probabilities of injected faults per /videoplayback request"""
+
+    def __init__(
+        self,
+        forbidden: float = 0.0,
+        not_found: float = 0.0,
+        stall: float = 0.0,
+        stall_seconds: float = 60.0,
+        latency: float = 0.0,
+        seed: int = 0,
+    ):
+        self.forbidden = forbidden
+        self.not_found = not_found
+        self.stall = stall
+        self.stall_seconds = stall_seconds
+        self.latency = latency
+        self.random = random.Random(seed)
+
+    async def apply(self) -> Optional[web.Response]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        value = self.random.random()
+        if value < self.forbidden:
+            return web.Response(status=403)
+        value -= self.forbidden
+        if value < self.not_found:
+            return web.Response(status=404)
+        value -= self.not_found
+        if value < self.stall:
+            await asyncio.sleep(self.stall_seconds)
+        return None
+
+
+class MockServer:
+    """Mock of youtube web, innertube and googlevideo endpoints.
+
+    :param int media_size:
+        size in bytes of every stream
+    :param int otf_segments:
+        when set, requests with &sq= are answered as an OTF stream with this many segments
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        media_size: int = 32 * 1024 * 1024,
+        otf_segments: Optional[int] = None,
+        faults: Optional[Faults] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.media_size = media_size
+        self.otf_segments = otf_segments
+        self.faults = faults if faults else Faults()
+        self.requests: Dict[str, int] = {}
+        self.write_size: int = 256 * 1024
+        self.media = os.urandom(media_size)
+        self.player = fixtures.player_response()
+        for f in self.player["streamingData"]["formats"] + self.player["streamingData"]["adaptiveFormats"]:
+            f["contentLength"] = str(media_size)
+        self.video_id: str = self.player["videoDetails"]["videoId"]
+        self.documents = {
+            "watch": fixtures.watch_html().replace(
+                json.dumps(fixtures.player_response()), json.dumps(self.player)
+            ).encode(),
+            "base.js": fixtures.base_js().encode(),
+            "player": json.dumps(self.player).encode(),
+            "next": json.dumps(fixtures.next_response()).encode(),
+            "browse": json.dumps(fixtures.browse_response()).encode(),
+            "search": json.dumps(fixtures.search_response()).encode(),
+        }
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def rewrite_url(self, url: str) -> str:
+        """For net.SessionRequest(rewrite_url=...), sends youtube and googlevideo urls to the server"""
+        split_url = parse.urlsplit(url)
+        return parse.urlunsplit(("http", f"{self.host}:{self.port}", split_url.path, split_url.query, ""))
+
+    def session_request(self, **kwargs) -> yc.SessionRequest:
+        return yc.SessionRequest(rewrite_url=self.rewrite_url, **kwargs)
+
+    def _count(self, name: str):
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    def _document(self, name: str, content_type: str):
+        async def handler(request: web.Request) -> web.Response:
+            self._count(name)
+            return web.Response(body=self.documents[name], content_type=content_type)
+        return handler
+
+    async def _videoplayback(self, request: web.Request) -> web.StreamResponse:
+        self._count("videoplayback")
+        fault = await self.faults.apply()
+        if fault is not None:
+            return fault
+        media = self.media
+        sq = request.query.get("sq")
+        if sq is not None and self.otf_segments:
+            segment_size = len(media) // self.otf_segments
+            sq = int(sq)
+            if sq == 0:
+                return web.Response(body=(
+                    b"Sequence-Number: 0\r\n"
+                    b"Segment-Count: " + str(self.otf_segments).encode() + b"\r\n"
+                    b"Segment-Duration-Us: 5000000\r\n\r\n"
+                ))
+            if sq > self.otf_segments:
+                return web.Response(status=404)
+            return web.Response(body=media[(sq - 1) * segment_size:sq * segment_size])
+
+        byte_range = request.query.get("range")
+        status = 200
+        if byte_range is None and request.headers.get("Range", "").startswith("bytes="):
+            byte_range = request.headers["Range"][len("bytes="):]
+            status = 206
+        if byte_range is None:
+            return await self._send_media(request, 200, 0, len(media) - 1)
+        start, end = byte_range.split("-", 1)
+        start = int(start)
+        end = min(int(end) if end else len(media) - 1, len(media) - 1)
+        if start >= len(media):
+            return web.Response(status=416 if status == 206 else 400)
+        return await self._send_media(request, status, start, end)
+
+    async def _send_media(self, request: web.Request, status: int, start: int, end: int) -> web.StreamResponse:
+        """Streams media[start:end + 1] like a real server instead of building the whole body first"""
+        response = web.StreamResponse(status=status)
+        response.content_type = "application/octet-stream"
+        response.content_length = end - start + 1
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{len(self.media)}"
+        await response.prepare(request)
+        if request.method != "HEAD":
+            view = memoryview(self.media)
+            for position in range(start, end + 1, self.write_size):
+                await response.write(view[position:min(position + self.write_size, end + 1)])
+        await response.write_eof()
+        return response
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/watch", self._document("watch", "text/html"))
+        app.router.add_get(r"/s/player/{path:.+}/base.js", self._document("base.js", "text/javascript"))
+        for endpoint in ("player", "next", "browse", "search"):
+            app.router.add_post(f"/youtubei/v1/{endpoint}", self._document(endpoint, "application/json"))
+        app.router.add_get("/videoplayback", self._videoplayback)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+async def _bench_download(server: MockServer, itag: int, concurrency: int, adaptive: bool, sr_kwargs: dict):
+    async with server.session_request(**sr_kwargs) as sr:
+        video = await yc.get_video("https://www.youtube.com/watch?v=" + server.video_id, sr, yc.InnerTube(sr))
+        stream = (await video.get_streams()).get_by_itag(itag)
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                yc.simple_download(stream, os.path.join(directory, str(i)), sr, adaptive=adaptive)
+                for i in range(concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+    total = server.media_size * concurrency
+    print(f"downloaded {total / 1024 / 1024:.1f} mb in {elapsed:.3f} s, {total / 1024 / 1024 / elapsed:.1f} mb/sec")
+
+
+async def _bench_filesize(server: MockServer, sample: Optional[int], sr_kwargs: dict):
+    async with server.session_request(**sr_kwargs) as sr:
+        url = "https://rr3---sn-4g5ednsz.googlevideo.com/videoplayback?itag=137&source=yt_otf"
+        start = time.perf_counter()
+        size = await sr.seq_filesize(url, sample=sample)
+        elapsed = time.perf_counter() - start
+    print(f"seq_filesize {size} bytes in {elapsed * 1e3:.1f} ms, {server.requests.get('videoplayback', 0)} requests")
+
+
+async def main_async(args):
+    faults = Faults(args.forbidden, args.not_found, args.stall, args.stall_seconds, args.latency)
+    async with MockServer(args.host, args.port, args.size * 1024 * 1024, args.otf_segments, faults) as server:
+        sr_kwargs = {"timeout": args.timeout}
+        if args.download is not None:
+            await _bench_download(server, args.download, args.concurrency, args.adaptive, sr_kwargs)
+        elif args.filesize:
+            await _bench_filesize(server, args.sample, sr_kwargs)
+        else:
+            print(f"serving on {server.base_url}, video id {server.video_id}")
+            await asyncio.Event().wait()
+        print("requests:", server.requests)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--size", type=int, default=32, help="stream size in mb")
+    parser.add_argument("--otf-segments", type=int, default=None)
+    parser.add_argument("--forbidden", type=float, default=0.0, help="probability of 403")
+    parser.add_argument("--not-found", type=float, default=0.0, help="probability of 404")
+    parser.add_argument("--stall", type=float, default=0.0, help="probability of a stalled response")
+    parser.add_argument("--stall-seconds", type=float, default=60.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every media response")
+    parser.add_argument("--timeout", type=int, default=30, help="client timeout")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--download", type=int, default=None, metavar="ITAG", help="benchmark simple_download")
+    mode.add_argument("--filesize", action="store_true", help="benchmark seq_filesize (use with --otf-segments)")
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("--adaptive", action="store_true", help="simple_download with adaptive ranges")
+    parser.add_argument("--sample", type=int, default=None, help="segments sampled by seq_filesize")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Offline benchmarks of the parsing hot paths.
+
+Usage (from the repository root):
+    python benchmarks/run.py                       # run all benchmarks
+    python benchmarks/run.py -k cipher             # only names containing "cipher"
+    python benchmarks/run.py --json base.json      # save results
+    python benchmarks/run.py --compare base.json   # show change against saved results
+    python benchmarks/run.py --write-fixtures      # dump generated fixtures to edit or replace
+
+Time is measured with time.perf_counter over repeated rounds, peak memory
+with tracemalloc over a single extra call (so tracing overhead does not
+affect the timings).
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+
+from youtube_client_async import caption, cipher, comment, extract, live_video, search, stream  # noqa: E402
+
+default_fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class Benchmark(NamedTuple):
+    name: str
+    setup: Callable[[Dict[str, str]], Callable[[], object]]
+
+
+class Result(NamedTuple):
+    name: str
+    rounds: int
+    mean: float
+    median: float
+    min: float
+    peak_memory: int
+
+
+def _streams(docs: Dict[str, str]) -> Callable[[], object]:
+    raw = json.loads(docs["player"])
+    manifest = extract.apply_descrambler(raw["streamingData"])
+    c = cipher.Cipher(docs["base_js"], fixtures.JS_URL)
+    for s in manifest:
+        s["url"] = s["url"] + "&sig=" + c.get_signature(s.pop("s"))
+    duration = raw["videoDetails"]["lengthSeconds"]
+    title = raw["videoDetails"]["title"]
+    return lambda: stream.StreamQuery([stream.Stream(s, duration, title, None) for s in manifest])
+
+
+def _stream_query(docs: Dict[str, str]) -> Callable[[], object]:
+    query = _streams(docs)()
+
+    def run():
+        return (
+            query.get_highest_resolution(),
+            query.filter(only_audio=True).order_by("bitrate", reverse=True).first,
+            query.filter(video_codec="vp9", adaptive=True),
+        )
+    return run
+
+
+def _cipher_signature(docs: Dict[str, str]) -> Callable[[], object]:
+    c = cipher.Cipher(docs["base_js"], fixtures.JS_URL)
+    return lambda: c.get_signature("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789" * 2)
+
+
+def _cipher_throttling(docs: Dict[str, str]) -> Callable[[], object]:
+    c = cipher.Cipher(docs["base_js"], fixtures.JS_URL)
+    return lambda: c.get_throttling("q5Zk2WmTnT0A9XyBcD")
+
+
+def _apply_signature(docs: Dict[str, str]) -> Callable[[], object]:
+    raw = json.loads(docs["player"])
+
+    def run():
+        streaming_data = json.loads(json.dumps(raw["streamingData"]))
+        manifest = extract.apply_descrambler(streaming_data)
+        extract.apply_signature(manifest, raw, docs["base_js"], fixtures.JS_URL)
+        return manifest
+    return run
+
+
+def _search(docs: Dict[str, str]) -> Callable[[], object]:
+    raw = json.loads(docs["search"])
+    return lambda: list(search.SearchResponse(raw, None, None))
+
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("extract.initial_data", lambda d: lambda: extract.initial_data(d["watch_html"])),
+    Benchmark("extract.get_ytcfg", lambda d: lambda: extract.get_ytcfg(d["watch_html"])),
+    Benchmark("extract.get_ytplayer_config", lambda d: lambda: extract.get_ytplayer_config(d["watch_html"])),
+    Benchmark("extract.js_url", lambda d: lambda: extract.js_url(d["watch_html"])),
+    Benchmark("cipher.Cipher", lambda d: lambda: cipher.Cipher(d["base_js"], fixtures.JS_URL)),
+    Benchmark("cipher.get_signature", _cipher_signature),
+    Benchmark("cipher.get_throttling", _cipher_throttling),
+    Benchmark("extract.apply_signature", _apply_signature),
+    Benchmark("stream.Stream+StreamQuery", _streams),
+    Benchmark("stream.StreamQuery.select", _stream_query),
+    Benchmark("comment.CommentResponse", lambda d: (
+        lambda raw: lambda: comment.CommentResponse(raw, None, None))(json.loads(d["next"]))),
+    Benchmark("search.SearchResponse.iter", _search),
+    Benchmark("live_video.LiveChatResponse.messages", lambda d: (
+        lambda raw: lambda: live_video.LiveChatResponse(raw, None, None).messages)(json.loads(d["live_chat"]))),
+    Benchmark("caption.xml_to_srt", lambda d: lambda: caption.Caption._xml_caption_to_srt(d["caption_xml"])),
+    Benchmark("json.loads.player", lambda d: lambda: json.loads(d["player"])),
+    Benchmark("json.loads.next", lambda d: lambda: json.loads(d["next"])),
+    Benchmark("json.loads.browse", lambda d: lambda: json.loads(d["browse"])),
+    Benchmark("json.loads.search", lambda d: lambda: json.loads(d["search"])),
+]
+
+
+def measure(benchmark: Benchmark, docs: Dict[str, str], min_time: float, max_rounds: int) -> Result:
+    func = benchmark.setup(docs)
+    func()  # warm up caches (compiled regexes, interpreter)
+    times = []
+    total = 0.0
+    gc.collect()
+    while total < min_time and len(times) < max_rounds:
+        start = time.perf_counter()
+        func()
+        delta = time.perf_counter() - start
+        times.append(delta)
+        total += delta
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Result(
+        benchmark.name, len(times), statistics.mean(times), statistics.median(times), min(times), peak
+    )
+
+
+def _format_time(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
+
+
+def print_results(results: List[Result], baseline: Optional[Dict[str, dict]] = None):
+    header = f"{'benchmark':<40} {'rounds':>7} {'median':>11} {'min':>11} {'peak mem':>11}"
+    if baseline:
+        header += f" {'vs base':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = (
+            f"{r.name:<40} {r.rounds:>7} {_format_time(r.median):>11} {_format_time(r.min):>11} "
+            f"{r.peak_memory / 1024:>8.1f} KB"
+        )
+        if baseline and r.name in baseline:
+            line += f" {(r.median / baseline[r.name]['median'] - 1) * 100:>+8.1f}%"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="keyword", default=None, help="run benchmarks whose name contains keyword")
+    parser.add_argument("--fixtures", default=default_fixtures_dir, help="directory with recorded fixtures")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per benchmark")
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to json file")
+    parser.add_argument("--compare", default=None, help="json file of previous run to compare with")
+    parser.add_argument("--write-fixtures", action="store_true", help="write generated fixtures and exit")
+    args = parser.parse_args(argv)
+
+    if args.write_fixtures:
+        fixtures.write(args.fixtures)
+        print(f"fixtures written to {args.fixtures}")
+        return
+
+    docs = fixtures.load(args.fixtures)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = [
+        measure(b, docs, args.min_time, args.max_rounds)
+        for b in BENCHMARKS
+        if args.keyword is None or args.keyword in b.name
+    ]
+    print_results(results, baseline)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({r.name: r._asdict() for r in results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
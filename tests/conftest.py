@@ -0,0 +1,38 @@
+import asyncio
+import os
+import sys
+
+# the mock server and fixtures of the benchmarks are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import pytest  # noqa: E402
+
+from youtube_client_async import stream  # noqa: E402
+
+
+@pytest.fixture
+def make_stream():
+    """Stream of the mock server media, OTF streams have no contentLength like in real manifests.
+
+    Sessions of the streams that the test did not close are closed after it"""
+    sessions = []
+
+    def make(server, otf: bool = False, itag: int = 137, mime: str = 'video/mp4; codecs="avc1.640028"') -> stream.Stream:
+        raw = {
+            "itag": itag,
+            "url": f"https://rr1---sn-test.googlevideo.com/videoplayback?itag={itag}",
+            "mimeType": mime,
+            "bitrate": 1000000,
+        }
+        if otf:
+            raw["is_otf"] = True
+            raw["url"] += "&source=yt_otf"
+        else:
+            raw["contentLength"] = str(server.media_size)
+        sr = server.session_request()
+        sessions.append(sr)
+        return stream.Stream(raw, 10, "title", sr)
+    yield make
+    for sr in sessions:
+        # closing twice is a no-op, sessions closed by the test are skipped
+        asyncio.run(sr.session.close())
@@ -0,0 +1,68 @@
+import asyncio
+import multiprocessing
+
+import pytest
+from fixtures import JS_URL, base_js
+
+import youtube_client_async as yc
+from youtube_client_async import extract
+
+_signatures = [("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789" * 2)[i:i + 100] for i in range(8)]
+_n_values = ["abcdefghijklmnop", "qrstuvwxyz012345"]
+
+
+@pytest.fixture(scope="module")
+def js():
+    return base_js(filler_functions=100)
+
+
+def test_same_result_as_extract(js):
+    async def main():
+        async with yc.DecipherService(workers=1, chunk_size=3) as service:
+            first = await service.decipher(js, JS_URL, _signatures, _n_values)
+            second = await service.decipher(js, JS_URL, _signatures, _n_values)
+            return first, second, service
+
+    first, second, service = asyncio.run(main())
+    assert first == second == extract.decipher(js, JS_URL, _signatures, _n_values)
+    # the js goes only with the calls of the first batch
+    assert service.js_sent == 4
+    assert service.calls == 8
+
+
+def test_close_cancels_pending_calls(js):
+    async def main():
+        service = yc.DecipherService(workers=1, chunk_size=1)
+        task = asyncio.ensure_future(service.decipher(js, JS_URL, _signatures * 4, []))
+        await asyncio.sleep(0.05)
+        service.close()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 10)
+        return service
+
+    service = asyncio.run(main())
+    assert not service._futures
+
+
+def test_installed_service():
+    service = yc.DecipherService(workers=1)
+    yc.set_decipher_service(service)
+    assert yc.get_decipher_service() is service
+    service.close()
+    assert yc.get_decipher_service() is None
+
+
+def test_spawned_workers_use_player_index(js, tmp_path):
+    index = yc.PlayerIndex(str(tmp_path))
+    yc.set_player_index(index)
+    try:
+        async def main():
+            async with yc.DecipherService(workers=1, mp_context=multiprocessing.get_context("spawn")) as service:
+                return await service.decipher(js, JS_URL, _signatures[:2], [])
+
+        deciphered, _ = asyncio.run(main())
+    finally:
+        yc.set_player_index(None)
+    assert deciphered == extract.decipher(js, JS_URL, _signatures[:2], [])[0]
+    # the worker found the functions and saved them to the index
+    assert index.load(JS_URL) is not None
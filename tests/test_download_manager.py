@@ -0,0 +1,124 @@
+import asyncio
+from pathlib import Path
+
+from mock_server import Faults, MockServer
+
+import youtube_client_async as yc
+
+_size = 256 * 1024
+
+
+class _CountingServer(MockServer):
+    """Counts /videoplayback requests served at once"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = 0
+        self.max_active = 0
+
+    async def _videoplayback(self, request):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            return await super()._videoplayback(request)
+        finally:
+            self.active -= 1
+
+
+def test_downloads(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            streams = [make_stream(server, itag=itag) for itag in (137, 136, 135)]
+            async with streams[0].net_obj, yc.DownloadManager(streams[0].net_obj, url_chunk_size=64 * 1024) as manager:
+                jobs = [manager.add(s, str(tmp_path / str(s.itag)), priority=i) for i, s in enumerate(streams)]
+                await manager.join()
+                return server.media, jobs, manager.progress()
+
+    media, jobs, progress = asyncio.run(main())
+    assert all(job.state == yc.DownloadState.done for job in jobs)
+    assert all(Path(job.path).read_bytes() == media for job in jobs)
+    assert (progress.done, progress.failed, progress.cancelled) == (3, 0, 0)
+    assert progress.downloaded == progress.total == 3 * _size
+
+
+def test_close_while_running(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=4 * 1024 * 1024) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                manager = yc.DownloadManager(s.net_obj, max_bandwidth=256 * 1024, url_chunk_size=64 * 1024)
+                running = manager.add(s, str(tmp_path / "running"))
+                manager.add(make_stream(server, itag=136), str(tmp_path / "queued"), priority=-1)
+                manager.max_files = 1
+                while running.downloaded == 0:
+                    await asyncio.sleep(0.01)
+                await asyncio.wait_for(manager.close(), 5)
+                return manager
+
+    manager = asyncio.run(main())
+    assert [job.state for job in manager.jobs] == [yc.DownloadState.cancelled] * 2
+    assert all(job.done.is_set() for job in manager.jobs)
+    progress = manager.progress()
+    assert (progress.cancelled, progress.failed, progress.running) == (2, 0, 0)
+
+
+def test_cancel_job_keeps_worker(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=4 * 1024 * 1024) as server:
+            s = make_stream(server)
+            async with s.net_obj, yc.DownloadManager(
+                s.net_obj, max_files=1, max_bandwidth=256 * 1024, url_chunk_size=64 * 1024
+            ) as manager:
+                first = manager.add(s, str(tmp_path / "first"))
+                while first.downloaded == 0:
+                    await asyncio.sleep(0.01)
+                first.cancel()
+                manager.bandwidth = None
+                second = manager.add(make_stream(server, itag=136), str(tmp_path / "second"))
+                await asyncio.wait_for(manager.join(), 10)
+                return first, second
+
+    first, second = asyncio.run(main())
+    assert first.state == yc.DownloadState.cancelled
+    assert second.state == yc.DownloadState.done
+
+
+def test_otf_requests_limited_per_host(tmp_path, make_stream):
+    async def main():
+        async with _CountingServer(media_size=_size, otf_segments=16, faults=Faults(latency=0.01)) as server:
+            s = make_stream(server, otf=True)
+            async with s.net_obj, yc.DownloadManager(s.net_obj, max_per_host=1) as manager:
+                job = manager.add(s, str(tmp_path / "otf"))
+                await manager.join()
+                return server, job, manager
+
+    server, job, manager = asyncio.run(main())
+    assert job.state == yc.DownloadState.done
+    assert job.filesize == job.downloaded == len(Path(job.path).read_bytes())
+    # header and 16 segments, without HEAD requests for the size
+    assert server.requests["videoplayback"] == 17
+    assert server.max_active == 1
+    assert list(manager._hosts) == ["rr1---sn-test.googlevideo.com"]
+
+
+def test_range_limit_is_per_contacted_host(tmp_path, make_stream):
+    async def main():
+        async with _CountingServer(media_size=_size, faults=Faults(latency=0.01)) as server:
+            streams = [make_stream(server, itag=itag) for itag in (137, 136, 135)]
+            for s in streams:
+                s.url += "&mn=sn-mirror&fvip=2"
+            pool = yc.HostPool()
+            # the original host failed just now, ranges go to the mirror
+            pool.fail(streams[0].url)
+            async with streams[0].net_obj, yc.DownloadManager(
+                streams[0].net_obj, max_per_host=1, url_chunk_size=32 * 1024, hosts=pool
+            ) as manager:
+                for s in streams:
+                    manager.add(s, str(tmp_path / str(s.itag)))
+                await manager.join()
+                return server, manager
+
+    server, manager = asyncio.run(main())
+    assert all(job.state == yc.DownloadState.done for job in manager.jobs)
+    assert "rr2---sn-mirror.googlevideo.com" in manager._hosts
+    assert server.max_active == 1
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+
+from fixtures import initial_data, player_response
+
+import youtube_client_async as yc
+from youtube_client_async import export, playable, short, video
+
+
+def _video(player: dict = None) -> video.Video:
+    player = player if player else player_response()
+    data = initial_data()
+    primary, secondary = data["contents"]["twoColumnWatchNextResults"]["results"]["results"]["contents"]
+    primary["videoPrimaryInfoRenderer"]["videoActions"] = {"menuRenderer": {"topLevelButtons": [
+        {"segmentedLikeDislikeButtonViewModel": {"likeButtonViewModel": {"likeButtonViewModel": {
+            "likeStatusEntity": {"likeStatus": "INDIFFERENT"},
+            "toggleButtonViewModel": {"toggleButtonViewModel": {"defaultButtonViewModel": {
+                "buttonViewModel": {"accessibilityText": "like this video along with 1,234 other people"}}}},
+        }}}},
+    ]}}
+    secondary["videoSecondaryInfoRenderer"]["owner"] = {
+        "videoOwnerRenderer": {"subscriberCountText": {"simpleText": "5.6K subscribers"}}
+    }
+    sr = yc.SessionRequest(session=yc.ReplaySession(yc.Cassette()))
+    return video.Video(
+        f"https://www.youtube.com/watch?v={player['videoDetails']['videoId']}", "", sr, yc.InnerTube(sr), player,
+        data, {}, "https://www.youtube.com/s/player/6e1dd460/player_ias.vflset/en_US/base.js", ""
+    )
+
+
+def test_record_is_properties():
+    v = _video()
+    record = v.to_record()
+    assert tuple(record) == export.default_fields(video.Video)
+    for name, value in record.items():
+        if name.endswith("_raw"):
+            continue
+        assert value == getattr(v, name), name
+    assert record["likes_count"] == "like this video along with 1,234 other people"
+    assert record["owner_subscribers_count"] == "5.6K subscribers"
+
+
+def _short() -> short.Short:
+    player = player_response()
+    sr = yc.SessionRequest(session=yc.ReplaySession(yc.Cassette()))
+    return short.Short(
+        f"https://www.youtube.com/shorts/{player['videoDetails']['videoId']}", "", sr, yc.InnerTube(sr), player,
+        initial_data(), {}, "https://www.youtube.com/s/player/6e1dd460/player_ias.vflset/en_US/base.js", ""
+    )
+
+
+def test_short_record_has_short_fields():
+    s = _short()
+    record = s.to_record()
+    assert tuple(record) == ("video_id",) + tuple(playable.PlayableBase.record_fields)
+    assert not {"likes_count", "like_status", "owner_subscribers_count"} & set(record)
+    for name, value in record.items():
+        if not name.endswith("_raw"):
+            assert value == getattr(s, name), name
+
+
+def test_mixed_classes():
+    v, s = _video(), _short()
+    records = list(yc.to_records([v, s]))
+    assert "likes_count" in records[0] and "likes_count" not in records[1]
+    assert list(yc.to_records([v, s], fields=["video_id", "title"])) == [
+        {"video_id": v.video_id, "title": v.title}, {"video_id": s.video_id, "title": s.title},
+    ]
+
+
+def test_raw_dates():
+    v = _video()
+    record = v.to_record(["publish_date_raw", "upload_date_raw", "start_live_raw"])
+    assert record["publish_date_raw"] == v.initial_player["microformat"]["playerMicroformatRenderer"]["publishDate"]
+    assert v.publish_date.isoformat() == "2024-01-01T00:00:00-07:00"
+    assert record["start_live_raw"] is None
+    assert "publish_date" not in video.Video.record_fields and "upload_date" not in video.Video.record_fields
+
+
+def test_missing_values_are_property_defaults():
+    player = player_response()
+    player["videoDetails"].pop("keywords")
+    player["microformat"]["playerMicroformatRenderer"].pop("isShortsEligible", None)
+    v = _video(player)
+    record = v.to_record(["keywords", "is_shorts_eligible", "error_reason"])
+    assert record == {"keywords": [], "is_shorts_eligible": False, "error_reason": None}
+    assert record == {name: getattr(v, name) for name in record}
+    # defaults are not shared by records
+    record["keywords"].append("changed")
+    assert v.to_record(["keywords"]) == {"keywords": []}
+
+
+def test_ndjson_and_csv():
+    videos = [_video(), _video()]
+    fields = ["video_id", "title", "lenght", "keywords", "likes_count"]
+
+    ndjson = io.StringIO()
+    assert yc.write_ndjson(videos, ndjson, fields=fields) == 2
+    lines = [json.loads(line) for line in ndjson.getvalue().splitlines()]
+    assert lines == [v.to_record(fields) for v in videos]
+
+    rows = io.StringIO(newline="")
+    assert yc.write_csv(videos, rows, fields=fields) == 2
+    header, *values = list(csv.reader(io.StringIO(rows.getvalue())))
+    assert header == fields
+    assert values[0][2] == str(videos[0].lenght)
+    assert json.loads(values[0][3]) == videos[0].keywords
+
+    rows = io.StringIO(newline="")
+    yc.write_csv(videos, rows)
+    assert next(csv.reader(io.StringIO(rows.getvalue()))) == list(export.default_fields(video.Video))
@@ -0,0 +1,49 @@
+import pytest
+from fixtures import player_response
+
+from youtube_client_async import extract, format_selector, stream
+
+
+@pytest.fixture
+def streams():
+    player = player_response()
+    manifest = extract.apply_descrambler(player["streamingData"])
+    for s in manifest:
+        s.pop("s", None)
+    return stream.StreamQuery([stream.Stream(s, 1200, "title", None) for s in manifest], "video_id")
+
+
+def _best_video(streams, check=lambda s: True):
+    video = [s for s in streams if s.only_video and check(s)]
+    return max(video, key=lambda s: (s.raw.get("height") or 0, s.raw.get("fps") or 0, s.raw.get("bitrate") or 0))
+
+
+def test_best_video_and_audio(streams):
+    video, audio = streams.select("bv+ba")
+    assert video is _best_video(streams)
+    assert audio is max((s for s in streams if s.only_audio), key=lambda s: s.raw.get("bitrate") or 0)
+
+
+def test_filters(streams):
+    video = streams.select("bv[height<=480][ext=webm]")
+    assert video is _best_video(streams, lambda s: s.raw.get("height", 0) <= 480 and s.ext == "webm")
+    assert streams.select("wa[abr>1G]") is None
+
+
+def test_alternatives_and_grouping(streams):
+    # the first alternative matches nothing, the pair is formed with the second
+    video, audio = streams.select("(bv[height>10000]/bv[height<=360])+ba")
+    assert video is _best_video(streams, lambda s: s.raw.get("height", 0) <= 360)
+    assert audio.only_audio
+    # without parentheses + binds tighter, so the first alternative is a single stream
+    assert streams.select("bv[height<=360]/bv+ba") is _best_video(streams, lambda s: s.raw.get("height", 0) <= 360)
+
+
+def test_compiled_once():
+    assert format_selector.compile_selector("bv+ba") is format_selector.compile_selector("bv+ba")
+
+
+@pytest.mark.parametrize("expression", ["bv[height<=]", "bv+", "(bv", "bx", "bv[unknown=1]"])
+def test_syntax_errors(expression):
+    with pytest.raises(format_selector.SelectorSyntaxError):
+        format_selector.compile_selector(expression)
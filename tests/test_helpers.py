@@ -0,0 +1,38 @@
+import pytest
+
+from youtube_client_async.helpers import DictPath, compile_path, get_from_dict
+
+_source = {
+    "videoDetails": {"title": "title", "thumbnails": [{"url": "a"}, {"url": "b"}], "empty": None},
+    "list": [1, 2],
+}
+
+
+def test_plain_path():
+    assert compile_path("videoDetails|title")(_source) == "title"
+    assert get_from_dict(_source, "videoDetails|title") == "title"
+    assert compile_path("videoDetails|title") is compile_path("videoDetails|title")
+
+
+def test_list_index():
+    assert get_from_dict(_source, "videoDetails|thumbnails|1|url", int_include=True) == "b"
+    assert get_from_dict(_source, "videoDetails|thumbnails|-1|url", int_include=True) == "b"
+    assert get_from_dict(_source, "videoDetails|thumbnails|5|url", int_include=True, throw_ex=False) is None
+
+
+@pytest.mark.parametrize("path", [
+    "videoDetails|missing",
+    "videoDetails|empty|key",  # None on the way
+    "list|key",  # list without int_include
+    "videoDetails|title|key",  # string on the way
+])
+def test_missing_returns_default(path):
+    assert get_from_dict(_source, path, default="default", throw_ex=False) == "default"
+    with pytest.raises(KeyError):
+        get_from_dict(_source, path)
+
+
+def test_error_message_names_the_parent():
+    with pytest.raises(KeyError) as e:
+        DictPath("videoDetails|missing").get(_source)
+    assert '["videoDetails"]' in str(e.value)
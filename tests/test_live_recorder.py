@@ -0,0 +1,105 @@
+import asyncio
+
+from aiohttp import web
+from mock_server import MockServer
+
+import youtube_client_async as yc
+from youtube_client_async import live_recorder
+
+_interval = 0.1
+
+
+class _LiveServer(MockServer):
+    """Publishes a segment every interval seconds after the first head segments.
+    With burst the segments appear burst at a time and X-Head-Seqnum announces
+    the next burst already, like an edge node that did not get it yet. With
+    forbidden_sq the first request of that segment is answered with 403"""
+
+    def __init__(
+        self, *args, head: int = 2, interval: float = _interval, burst: int = 1, forbidden_sq: int = None, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.first_head = head
+        self.interval = interval
+        self.burst = burst
+        self.forbidden_sq = forbidden_sq
+        self.started = None
+
+    def head(self, ahead: float = 0.0) -> int:
+        if self.started is None:
+            self.started = asyncio.get_running_loop().time()
+        elapsed = asyncio.get_running_loop().time() - self.started + ahead
+        return self.first_head + int(elapsed / (self.interval * self.burst)) * self.burst
+
+    def published_at(self, sq: int) -> float:
+        bursts = -(-max(0, sq - self.first_head) // self.burst)
+        return self.started + bursts * self.burst * self.interval
+
+    @staticmethod
+    def segment(sq: int) -> bytes:
+        return f"segment {sq}".encode()
+
+    async def _videoplayback(self, request):
+        self._count("videoplayback")
+        head = self.head()
+        headers = {"X-Head-Seqnum": str(self.head(self.interval * self.burst if self.burst > 1 else 0.0))}
+        sq = request.query.get("sq")
+        if sq is None:
+            return web.Response(headers=headers)
+        sq = int(sq)
+        if sq == self.forbidden_sq and not self.requests.get("forbidden"):
+            self._count("forbidden")
+            return web.Response(status=403)
+        if sq > head:
+            return web.Response(status=404, headers=headers)
+        return web.Response(body=self.segment(sq), headers=headers)
+
+
+def test_stale_prefetches_are_requested_again(make_stream):
+    async def main():
+        async with _LiveServer(media_size=1024, burst=4) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                recorder = live_recorder.LiveRecorder(s, readahead=8, segment_duration=_interval)
+                lags = []
+                segments = recorder.segments()
+                try:
+                    async for sq, data in segments:
+                        assert data == server.segment(sq)
+                        lags.append(asyncio.get_running_loop().time() - server.published_at(sq))
+                        if len(lags) == 10:
+                            break
+                finally:
+                    await segments.aclose()
+            return lags
+
+    lags = asyncio.run(main())
+    # prefetches of a burst found nothing before it, each of them used to add a wait
+    assert max(lags) < 1.5 * _interval
+
+
+def test_renews_url_after_403():
+    async def main():
+        async with _LiveServer(media_size=1024, forbidden_sq=3) as server:
+            async with server.session_request() as sr:
+                video = await yc.get_video(yc.get_video_url(server.video_id), sr, yc.InnerTube(sr))
+                streams = await video.get_streams()
+                handle = video.get_stream_handle(streams.filter(only_video=True).first)
+                players = server.requests["player"]
+                recorder = live_recorder.LiveRecorder(handle, readahead=2, rewind=2, segment_duration=_interval)
+                received = {}
+                segments = recorder.segments()
+                try:
+                    async for sq, data in segments:
+                        received[sq] = data
+                        if sq == 5:
+                            break
+                finally:
+                    await segments.aclose()
+            return server, handle, players, received
+
+    server, handle, players, received = asyncio.run(main())
+    assert received == {sq: server.segment(sq) for sq in range(6)}
+    assert server.requests["forbidden"] == 1
+    assert handle.renewals == 1
+    assert server.requests["player"] == players + 1
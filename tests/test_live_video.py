@@ -0,0 +1,41 @@
+import pytest
+from fixtures import player_response
+
+import youtube_client_async as yc
+from youtube_client_async import live_recorder, live_video, stream
+
+
+def _live(**details) -> live_video.LiveVideo:
+    player = player_response()
+    player["videoDetails"].update(details)
+    sr = yc.SessionRequest(session=yc.ReplaySession(yc.Cassette()))
+    return live_video.LiveVideo(
+        f"https://www.youtube.com/watch?v={player['videoDetails']['videoId']}", "", sr, yc.InnerTube(sr), player,
+        {}, {}, "https://www.youtube.com/s/player/6e1dd460/player_ias.vflset/en_US/base.js", ""
+    )
+
+
+def _stream(live: live_video.LiveVideo) -> stream.Stream:
+    raw = live.initial_player["streamingData"]["adaptiveFormats"][0]
+    return stream.Stream(dict(raw, url=raw.get("url", "https://rr1---sn-test.googlevideo.com/videoplayback")),
+                         0, "title", live.net_obj)
+
+
+def test_readahead_from_player():
+    live = _live(liveChunkReadahead=5)
+    assert live.live_chunk_readahead == 5
+    assert live.get_recorder(_stream(live)).readahead == 5
+
+
+def test_missing_readahead():
+    live = _live()
+    live.initial_player["videoDetails"].pop("liveChunkReadahead", None)
+    assert live.live_chunk_readahead is None
+    assert live.get_recorder(_stream(live)).readahead == 3
+    assert live.get_recorder(_stream(live), readahead=7).readahead == 7
+
+
+def test_rewind_needs_dvr():
+    live = _live(isLiveDvrEnabled=False)
+    with pytest.raises(live_recorder.LiveRecordingError):
+        live.get_recorder(_stream(live), rewind=10)
@@ -0,0 +1,126 @@
+import asyncio
+import concurrent.futures
+
+from aiohttp import web
+from mock_server import MockServer
+
+import youtube_client_async as yc
+from youtube_client_async import stream
+
+
+class _CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Counts calls that carry the player js"""
+
+    def __init__(self):
+        super().__init__(2)
+        self.calls = 0
+        self.js_sent = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls += 1
+        if any(isinstance(arg, str) and len(arg) > 100000 for arg in args):
+            self.js_sent += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+def _urls(manifests):
+    return {video_id: sorted(s.url for s in streams) for video_id, streams in manifests.items()}
+
+
+def test_resolve_by_id():
+    async def main():
+        async with MockServer(media_size=1024) as server:
+            async with server.session_request() as sr:
+                resolver = yc.ManifestResolver(sr, chunk_size=4)
+                manifests = await resolver.resolve([server.video_id, "https://youtu.be/" + server.video_id])
+                reference = await (await yc.get_video(yc.get_video_url(server.video_id), sr, yc.InnerTube(sr))).get_streams()
+            return server, manifests, reference
+
+    server, manifests, reference = asyncio.run(main())
+    streams = manifests[server.video_id]
+    assert isinstance(streams, stream.StreamQuery)
+    assert sorted(s.url for s in streams) == sorted(s.url for s in reference)
+    # js url is read from the watch page of one video of the batch
+    assert server.requests["watch"] == 1 + 1
+
+
+def test_js_is_sent_once_per_player():
+    async def main():
+        async with MockServer(media_size=1024) as server:
+            async with server.session_request() as sr:
+                with _CountingExecutor() as executor:
+                    resolver = yc.ManifestResolver(sr, executor=executor, chunk_size=4)
+                    first = await resolver.resolve([server.video_id])
+                    sent_first = executor.js_sent
+                    second = await resolver.resolve([server.video_id])
+                    return first, second, sent_first, executor
+
+    first, second, sent_first, executor = asyncio.run(main())
+    assert _urls(first) == _urls(second)
+    assert sent_first > 0
+    # the second batch reuses the Ciphers of the workers
+    assert executor.js_sent == sent_first
+    assert executor.calls > 2 * sent_first - 1
+
+
+def test_given_js_url_skips_watch_pages():
+    async def main():
+        async with MockServer(media_size=1024) as server:
+            async with server.session_request() as sr:
+                js_url = yc.extract.js_url(await sr.get_text(yc.get_video_url(server.video_id)))
+                resolver = yc.ManifestResolver(sr, js_url=js_url)
+                manifests = await resolver.resolve([server.video_id])
+            return server, manifests
+
+    server, manifests = asyncio.run(main())
+    assert isinstance(manifests[server.video_id], stream.StreamQuery)
+    assert server.requests["watch"] == 1
+
+
+class _PlayerChangedServer(MockServer):
+    """The first watch page names a player that is gone by the time its js is requested"""
+
+    def _document(self, name, content_type):
+        handler = super()._document(name, content_type)
+
+        async def changed(request):
+            if name == "watch" and not self.requests.get("watch"):
+                self._count("watch")
+                return web.Response(
+                    body=self.documents["watch"].replace(b"/s/player/bench0001/", b"/s/player/old0001/"),
+                    content_type=content_type,
+                )
+            if name == "base.js" and "old0001" in request.path:
+                self._count("old base.js")
+                return web.Response(status=404)
+            return await handler(request)
+        return changed
+
+
+def test_changed_player_uses_own_js_url():
+    async def main():
+        async with _PlayerChangedServer(media_size=1024) as server:
+            async with server.session_request() as sr:
+                manifests = await yc.ManifestResolver(sr).resolve([server.video_id])
+            return server, manifests
+
+    server, manifests = asyncio.run(main())
+    assert isinstance(manifests[server.video_id], stream.StreamQuery)
+    assert server.requests["old base.js"] == 1
+    assert server.requests["watch"] == 2
+
+
+def test_executor_is_not_shut_down():
+    async def main():
+        async with MockServer(media_size=1024) as server:
+            async with server.session_request() as sr:
+                with concurrent.futures.ThreadPoolExecutor(2) as executor:
+                    resolver = yc.ManifestResolver(sr, executor=executor)
+                    manifests = await resolver.resolve([server.video_id])
+                    resolver._service.close()
+                    assert executor.submit(int, "1").result() == 1
+            return server, manifests, resolver
+
+    server, manifests, resolver = asyncio.run(main())
+    assert isinstance(manifests[server.video_id], stream.StreamQuery)
+    assert resolver._service.calls > 0
@@ -0,0 +1,151 @@
+import asyncio
+import math
+
+import pytest
+from aiohttp import web
+from aiohttp_retry import ExponentialRetry, RetryClient
+
+import youtube_client_async as yc
+
+
+async def _flaky_server(failures: int):
+    """Server that answers 500 to the first failures requests"""
+    calls = {"count": 0}
+
+    async def handler(request):
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            return web.Response(status=500)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/page", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/page", calls
+
+
+def _retries(metrics: yc.Metrics) -> int:
+    return sum(em.retries for em in metrics.endpoints.values())
+
+
+def test_retries_of_own_session():
+    async def main():
+        runner, url, calls = await _flaky_server(2)
+        metrics = yc.Metrics()
+        try:
+            async with yc.SessionRequest(metrics=metrics) as sr:
+                sr.retry_options.start_timeout = 0.001
+                assert await sr.get_text(url) == "ok"
+        finally:
+            await runner.cleanup()
+        return calls["count"], _retries(metrics)
+
+    assert asyncio.run(main()) == (3, 2)
+
+
+def test_retries_of_passed_session():
+    async def main():
+        runner, url, calls = await _flaky_server(1)
+        metrics = yc.Metrics()
+        try:
+            session = RetryClient(retry_options=ExponentialRetry(attempts=3, start_timeout=0.001))
+            async with yc.SessionRequest(session=session, metrics=metrics) as sr:
+                assert await sr.get_text(url) == "ok"
+        finally:
+            await runner.cleanup()
+        return calls["count"], _retries(metrics)
+
+    assert asyncio.run(main()) == (2, 1)
+
+
+def test_retries_of_recording_session():
+    async def main():
+        runner, url, calls = await _flaky_server(1)
+        metrics = yc.Metrics()
+        try:
+            session = yc.RecordingSession(
+                yc.Cassette(), RetryClient(retry_options=ExponentialRetry(attempts=3, start_timeout=0.001))
+            )
+            async with yc.SessionRequest(session=session, metrics=metrics) as sr:
+                assert await sr.get_text(url) == "ok"
+        finally:
+            await runner.cleanup()
+        return calls["count"], _retries(metrics)
+
+    assert asyncio.run(main()) == (2, 1)
+
+
+def test_histogram_buckets():
+    histogram = yc.metrics.Histogram((0.1, 1.0, 10.0))
+    for value in (0.05, 0.1, 0.5, 2.0, 20.0):
+        histogram.observe(value)
+    # a value equal to a bound falls in its bucket, values above the last one in +Inf
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.cumulative_counts() == [(0.1, 2), (1.0, 3), (10.0, 4), (math.inf, 5)]
+    assert histogram.count == 5 and histogram.sum == pytest.approx(22.65)
+    assert (histogram.min, histogram.max) == (0.05, 20.0)
+    assert histogram.quantile(0.2) == pytest.approx(0.075)
+    assert histogram.quantile(1.0) == 20.0
+    assert yc.metrics.Histogram().quantile(0.5) is None
+
+
+def test_prometheus_text():
+    metrics = yc.Metrics(latency_buckets=(0.1, 1.0))
+    metrics.observe_request("get", "https://www.youtube.com/watch?v=first", 200, 0.05)
+    metrics.observe_request("GET", "https://www.youtube.com/watch?v=second", 404, 2.0)
+    metrics.observe_bytes_in("GET", "https://www.youtube.com/watch?v=first", 1000)
+    lines = metrics.to_prometheus(prefix="yt").splitlines()
+
+    labels = 'method="GET",endpoint="www.youtube.com/watch"'
+    assert lines[:3] == [
+        "# HELP yt_requests_total Requests sent",
+        "# TYPE yt_requests_total counter",
+        f"yt_requests_total{{{labels}}} 2",
+    ]
+    assert f"yt_response_bytes_total{{{labels}}} 1000" in lines
+    assert f'yt_responses_total{{{labels},status="200"}} 1' in lines
+    assert f'yt_responses_total{{{labels},status="404"}} 1' in lines
+    start = lines.index("# TYPE yt_request_duration_seconds histogram") + 1
+    assert lines[start:start + 5] == [
+        f'yt_request_duration_seconds_bucket{{{labels},le="0.1"}} 1',
+        f'yt_request_duration_seconds_bucket{{{labels},le="1.0"}} 1',
+        f'yt_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+        f"yt_request_duration_seconds_sum{{{labels}}} 2.05",
+        f"yt_request_duration_seconds_count{{{labels}}} 2",
+    ]
+    assert f'yt_request_latency_seconds{{{labels},quantile="0.5"}} 0.1' in lines
+    assert "yt_downloads_total 0" in lines
+    assert all(line.startswith(("# HELP yt_", "# TYPE yt_", "yt_")) for line in lines)
+
+
+def test_text_bytes_are_decoded_size():
+    body = "compressible " * 1000
+
+    async def main():
+        async def handler(request):
+            resp = web.Response(text=body)
+            resp.enable_compression()
+            return resp
+
+        app = web.Application()
+        app.router.add_get("/page", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/page"
+        metrics = yc.Metrics()
+        try:
+            async with yc.SessionRequest(metrics=metrics) as sr:
+                assert await sr.get_text(url) == body
+                assert await sr.get_bytes(url) == body.encode()
+        finally:
+            await runner.cleanup()
+        return metrics.get_endpoint("GET", url).bytes_in
+
+    # both text and bytes count the decompressed body
+    assert asyncio.run(main()) == 2 * len(body.encode())
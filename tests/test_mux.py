@@ -0,0 +1,70 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import pytest
+from mock_server import MockServer
+
+import youtube_client_async as yc
+
+_audio_mime = 'audio/mp4; codecs="mp4a.40.2"'
+
+
+def test_pair_without_ffmpeg(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=256 * 1024) as server:
+            video = make_stream(server)
+            audio = make_stream(server, itag=140, mime=_audio_mime)
+            async with video.net_obj, audio.net_obj:
+                result = await yc.download_pair(video, audio, str(tmp_path / "pair"), ffmpeg=None)
+            return server.media, result
+
+    media, result = asyncio.run(main())
+    assert result.path is None
+    assert result.video_bytes == result.audio_bytes == len(media)
+    assert [Path(part).read_bytes() == media for part in result.parts] == [True, True]
+
+
+def test_pipes_closed_when_ffmpeg_fails_to_start(tmp_path, make_stream):
+    if not os.path.isdir("/proc/self/fd"):
+        pytest.skip("needs /proc to list open descriptors")
+    # executable, but not a program the system can run
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_bytes(b"\0not an executable")
+    ffmpeg.chmod(0o755)
+
+    async def main():
+        async with MockServer(media_size=256 * 1024) as server:
+            video = make_stream(server)
+            audio = make_stream(server, itag=140, mime=_audio_mime)
+            async with video.net_obj, audio.net_obj:
+                before = set(os.listdir("/proc/self/fd"))
+                with pytest.raises(OSError):
+                    await yc.download_pair(video, audio, str(tmp_path / "pair"), ffmpeg=str(ffmpeg))
+                return set(os.listdir("/proc/self/fd")) - before
+
+    assert asyncio.run(main()) == set()
+
+
+def test_failed_stream_stops_the_other(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=4 * 1024 * 1024) as server:
+            video = make_stream(server)
+            audio = make_stream(server, itag=140, mime=_audio_mime)
+            # nothing listens on port 1
+            audio.net_obj = yc.SessionRequest(rewrite_url=lambda url: url.replace("https://", "http://").replace(
+                "rr1---sn-test.googlevideo.com", "127.0.0.1:1"))
+            async with video.net_obj, audio.net_obj:
+                start = time.perf_counter()
+                with pytest.raises(Exception):
+                    await yc.download_pair(
+                        video, audio, str(tmp_path / "pair"), ffmpeg=None, max_bandwidth=256 * 1024
+                    )
+                # the video download is not left running into the closed file
+                assert not [t for t in asyncio.all_tasks() if t.get_coro().__name__ == "download_to_sink"]
+                return time.perf_counter() - start
+
+    # the video alone takes 16 seconds under the bandwidth limit
+    assert asyncio.run(main()) < 5
+    assert (tmp_path / "pair.video.mp4").stat().st_size < 4 * 1024 * 1024
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from mock_server import MockServer
+
+import youtube_client_async as yc
+
+_url = "https://rr1---sn-test.googlevideo.com/videoplayback?itag=137&source=yt_otf"
+
+
+class _SegmentServer(MockServer):
+    """OTF server with a shorter last segment, counts HEADs in flight"""
+
+    def __init__(self, *args, header_padding: int = 0, segment_count: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.header_padding = header_padding
+        self.segment_count = segment_count
+        self.heads = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def segment(self, sq: int) -> bytes:
+        return self.media[:400 if sq == self.otf_segments else 1000]
+
+    def expected_size(self) -> int:
+        return len(self.header()) + sum(len(self.segment(sq)) for sq in range(1, self.otf_segments + 1))
+
+    def header(self) -> bytes:
+        header = b"Sequence-Number: 0\r\n" + b"X-Padding: " + b"p" * self.header_padding + b"\r\n"
+        if self.segment_count:
+            header += b"Segment-Count: " + str(self.otf_segments).encode() + b"\r\n"
+        return header + b"Segment-Duration-Us: 5000000\r\n\r\n"
+
+    async def _videoplayback(self, request):
+        self._count("videoplayback")
+        sq = int(request.query["sq"])
+        if sq == 0:
+            return web.Response(body=self.header())
+        self.heads.append(sq)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        return web.Response(body=self.segment(sq))
+
+
+def _seq_filesize(server: _SegmentServer, **kwargs) -> int:
+    async def main():
+        async with server:
+            async with server.session_request() as sr:
+                return await sr.seq_filesize(_url, **kwargs)
+    return asyncio.run(main())
+
+
+def test_exact_size():
+    server = _SegmentServer(media_size=4096, otf_segments=20)
+    assert _seq_filesize(server, concurrency=3) == server.expected_size()
+    assert sorted(server.heads) == list(range(1, 21))
+    assert server.max_in_flight == 3
+
+
+def test_sampled_size():
+    server = _SegmentServer(media_size=4096, otf_segments=21)
+    assert _seq_filesize(server, sample=5) == server.expected_size()
+    # 5 spread segments and the shorter last one
+    assert len(server.heads) == 6
+    assert 21 in server.heads
+
+
+def test_header_larger_than_a_chunk():
+    server = _SegmentServer(media_size=4096, otf_segments=4, header_padding=512 * 1024)
+    assert _seq_filesize(server) == server.expected_size()
+
+
+def test_missing_segment_count():
+    server = _SegmentServer(media_size=4096, otf_segments=4, segment_count=False)
+    with pytest.raises(yc.exceptions.RegexMatchError):
+        _seq_filesize(server)
+    assert server.heads == []
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fixtures import JS_URL, initial_data, player_response
+
+import youtube_client_async as yc
+from youtube_client_async import exceptions, playable, video
+
+
+def _get_video(html: str = "<html></html>", **kwargs) -> video.Video:
+    player = player_response()
+    sr = yc.SessionRequest(session=yc.ReplaySession(yc.Cassette()))
+    kwargs.setdefault("initial_data", initial_data())
+    return asyncio.run(video.get_video(
+        video.get_video_url(player["videoDetails"]["videoId"]), sr, yc.InnerTube(sr), html=html,
+        initial_player=player, **kwargs
+    ))
+
+
+def test_release_keeps_passed_js():
+    v = _get_video(js_url=JS_URL, js="var passed;")
+    v.release_html()
+    assert asyncio.run(v._get_js()) == "var passed;"
+
+
+def test_release_drops_cached_js():
+    playable._js_texts[JS_URL] = "var cached;"
+    try:
+        v = _get_video(js_url=JS_URL)
+        assert asyncio.run(v._get_js()) == "var cached;"
+        v.release_html()
+        assert v._js_obj is None
+        assert asyncio.run(v._get_js()) == "var cached;"
+    finally:
+        playable._js_texts.pop(JS_URL, None)
+
+
+def test_lean_js_url_from_ytcfg():
+    # the page has no player script, ytcfg names the player
+    v = _get_video(ytcfg={"PLAYER_JS_URL": JS_URL[len("https://youtube.com"):]}, lean=True)
+    assert v.html is None
+    assert v._get_js_url() == JS_URL
+
+
+def test_lean_without_js_url():
+    v = _get_video(ytcfg={"INNERTUBE_API_KEY": "key"}, lean=True)
+    assert v.html is None
+    assert v.title == player_response()["videoDetails"]["title"]
+    with pytest.raises(exceptions.HTMLReleasedError):
+        v._get_js_url()
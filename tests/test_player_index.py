@@ -0,0 +1,43 @@
+from fixtures import JS_URL, base_js
+
+from youtube_client_async import cipher, player_index
+
+
+def test_player_id():
+    assert player_index.player_id(
+        "https://www.youtube.com/s/player/6e1dd460/player_ias.vflset/en_US/base.js"
+    ) == "6e1dd460-player_ias.vflset-en_US-base.js"
+
+
+def test_save_and_load(tmp_path):
+    index = player_index.PlayerIndex(str(tmp_path / "players"))
+    assert index.load(JS_URL) is None
+    index.save(JS_URL, {"signature": "abc"})
+    entry = index.load(JS_URL)
+    assert entry["signature"] == "abc"
+    assert entry["js_url"] == JS_URL
+    assert [p.name for p in (tmp_path / "players").iterdir()] == [player_index.player_id(JS_URL) + ".json"]
+
+
+def test_unusable_entries(tmp_path):
+    index = player_index.PlayerIndex(str(tmp_path))
+    with open(index.path(JS_URL), "w") as f:
+        f.write("{not json")
+    assert index.load(JS_URL) is None
+    index.save(JS_URL, {})
+    with open(index.path(JS_URL)) as f:
+        text = f.read()
+    with open(index.path(JS_URL), "w") as f:
+        f.write(text.replace('"version": 1', '"version": 0'))
+    assert index.load(JS_URL) is None
+
+
+def test_cipher_from_index():
+    js = base_js(filler_functions=100)
+    first = cipher.Cipher(js, JS_URL)
+    signature = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789" * 2
+    expected = first.get_signature(signature)
+    assert first.index_changed
+    # the indexed Cipher does not search the js again, an empty one is enough
+    indexed = cipher.Cipher("", JS_URL, first.to_index())
+    assert indexed.get_signature(signature) == expected
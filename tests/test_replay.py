@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import youtube_client_async as yc
+
+_text = "compressible text " * 1000
+_media = bytes(range(256)) * 64
+
+
+async def _server():
+    async def page(request):
+        resp = web.Response(text=_text)
+        resp.enable_compression()
+        return resp
+
+    async def media(request):
+        return web.Response(body=_media)
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    app.router.add_get("/media", media)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def _record(path=None) -> yc.Cassette:
+    async def main():
+        runner, base = await _server()
+        cassette = yc.Cassette(path)
+        try:
+            async with yc.SessionRequest(session=yc.RecordingSession(cassette)) as sr:
+                assert await sr.get_text(base + "/page", headers={"Accept-Encoding": "gzip"}) == _text
+                await sr.session.get(base + "/media", params={"b": 1, "a": 2})
+        finally:
+            await runner.cleanup()
+        return cassette
+
+    return asyncio.run(main())
+
+
+def test_recorded_headers_match_decoded_body():
+    cassette = _record()
+    page = cassette.interactions[0]
+    headers = {k.lower(): v for k, v in page.headers}
+    assert "content-encoding" not in headers
+    assert int(headers["content-length"]) == len(page.body) == len(_text)
+
+
+def test_replay_from_saved_cassette(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    _record(path)
+    cassette = yc.Cassette.load(path)
+    assert len(cassette) == 2
+
+    async def main():
+        async with yc.SessionRequest(session=yc.ReplaySession(cassette)) as sr:
+            page = await sr.get_text(cassette.interactions[0].url)
+            # params in another order are the same request
+            media_url = cassette.interactions[1].url.split("?")[0]
+            resp = await sr.session.get(media_url, params={"a": 2, "b": 1, "range": "10-19"})
+            return page, resp.content_length, await resp.read()
+
+    page, length, body = asyncio.run(main())
+    assert page == _text
+    assert length == 10
+    assert body == _media[10:20]
+
+
+def test_replay_miss():
+    cassette = _record()
+
+    async def main():
+        await yc.ReplaySession(cassette).get("http://127.0.0.1/unknown")
+
+    with pytest.raises(yc.CassetteMissError):
+        asyncio.run(main())
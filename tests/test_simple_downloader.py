@@ -0,0 +1,282 @@
+import asyncio
+import io
+
+import aiohttp
+import pytest
+from aiohttp import web
+from mock_server import MockServer
+
+import youtube_client_async as yc
+from youtube_client_async import stream
+
+_size = 512 * 1024
+
+
+def test_download(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                filesize = await yc.simple_download(s, str(tmp_path / "video"), url_chunk_size=100 * 1024)
+            return server.media, filesize
+
+    media, filesize = asyncio.run(main())
+    assert filesize == _size
+    assert (tmp_path / "video.mp4").read_bytes() == media
+
+
+def test_otf_download_has_no_size_requests(tmp_path, make_stream):
+    async def main():
+        async with MockServer(media_size=_size, otf_segments=8) as server:
+            s = make_stream(server, otf=True)
+            sizes = []
+            async with s.net_obj:
+                filesize = await yc.simple_download(
+                    s, str(tmp_path / "video"), callback=lambda chunk, downloaded, total: sizes.append(total)
+                )
+            return server, filesize, sizes
+
+    server, filesize, sizes = asyncio.run(main())
+    data = (tmp_path / "video.mp4").read_bytes()
+    # header and 8 segments, the size is not asked before
+    assert server.requests["videoplayback"] == 9
+    assert filesize == len(data)
+    assert data.endswith(server.media)
+    assert set(sizes) == {0}
+
+
+def test_otf_to_sink(make_stream):
+    async def main():
+        async with MockServer(media_size=_size, otf_segments=4) as server:
+            s = make_stream(server, otf=True)
+            target = io.BytesIO()
+            async with s.net_obj:
+                written = await yc.download_to_sink(s, target, close=False)
+            return server, written, target.getvalue()
+
+    server, written, data = asyncio.run(main())
+    assert server.requests["videoplayback"] == 5
+    assert written == len(data)
+    assert data.endswith(server.media)
+
+
+class _RangeServer(MockServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ranges = []
+
+    async def _videoplayback(self, request):
+        if "range" in request.query:
+            start, end = request.query["range"].split("-")
+            self.ranges.append((request.host, int(start), int(end)))
+        return await super()._videoplayback(request)
+
+
+def test_slow_host_failover(tmp_path, make_stream):
+    async def main():
+        async with _RangeServer(media_size=4 * _size) as server:
+            s = make_stream(server)
+            s.url += "&mn=sn-mirror1,sn-mirror2&fvip=2"
+            # every host is too slow, every block moves to the other host
+            pool = yc.HostPool(min_throughput=1e15, slow_after=0)
+            async with s.net_obj:
+                filesize = await yc.simple_download(
+                    s, str(tmp_path / "video"), url_chunk_size=128 * 1024, chunk_size=32 * 1024, hosts=pool
+                )
+            return server, pool, filesize
+
+    server, pool, filesize = asyncio.run(main())
+    assert filesize == 4 * _size
+    assert (tmp_path / "video.mp4").read_bytes() == server.media
+    assert len([stats for stats in pool.hosts.values() if stats.errors]) > 1
+    # a range is never requested after its last byte arrived
+    assert all(start <= end and start < 4 * _size for _, start, end in server.ranges)
+
+
+class _ExpiringServer(MockServer):
+    """403 for urls without &renewed, like an expired googlevideo url"""
+
+    async def _videoplayback(self, request):
+        if "renewed" not in request.query and self.requests.get("videoplayback", 0) >= 2:
+            self._count("forbidden")
+            return web.Response(status=403)
+        return await super()._videoplayback(request)
+
+
+class _Handle:
+    def __init__(self, url: str):
+        self.url = url
+        self.refreshed = 0
+
+    async def get_url(self) -> str:
+        return self.url
+
+    async def refresh(self, failed_url: str):
+        self.refreshed += 1
+        self.url = failed_url + "&renewed=1"
+
+
+def test_range_stream_from_start(make_stream):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                chunks = [c async for c in yc.range_video_stream(
+                    s.url, s.net_obj, _size, 1000, url_chunk_size=100 * 1024
+                )]
+            return server.media, b"".join(chunks)
+
+    media, data = asyncio.run(main())
+    assert data == media[1000:]
+
+
+def test_range_stream_unknown_size(make_stream):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                chunks = [c async for c in yc.range_video_stream(s.url, s.net_obj, 0, url_chunk_size=100 * 1024)]
+            return server.media, b"".join(chunks)
+
+    media, data = asyncio.run(main())
+    assert data == media
+
+
+def test_range_stream_renews_url(make_stream):
+    async def main():
+        async with _ExpiringServer(media_size=_size) as server:
+            s = make_stream(server)
+            handle = _Handle(s.url)
+            async with s.net_obj:
+                chunks = [c async for c in yc.range_video_stream(
+                    s.url, s.net_obj, _size, url_chunk_size=100 * 1024, handle=handle
+                )]
+            return server, handle, b"".join(chunks)
+
+    server, handle, data = asyncio.run(main())
+    assert data == server.media
+    assert handle.refreshed == 1
+    assert server.requests["forbidden"] == 1
+
+
+def test_tuner_starts_with_initial_size():
+    tuner = yc.RangeTuner(initial_size=3 * 1024 * 1024)
+    assert tuner.next_size() == 3 * 1024 * 1024
+
+
+def test_tuner_grows_on_fast_link():
+    tuner = yc.RangeTuner(target_duration=2.0, max_size=1024 * 1024 * 1024)
+    # 2 MB in 0.1 s after 0.05 s of rtt is 40 MB/s
+    tuner.observe(2 * 1024 * 1024, 0.05, 0.1)
+    size = tuner.next_size()
+    assert size > tuner.initial_size
+    # about throughput * (target - rtt), rounded down to 64 KB
+    assert size == int(40 * 1024 * 1024 * 1.95) // (64 * 1024) * (64 * 1024)
+
+
+def test_tuner_shrinks_on_slow_link():
+    tuner = yc.RangeTuner(target_duration=2.0)
+    tuner.observe(2 * 1024 * 1024, 0.1, 8.1)
+    assert tuner.next_size() < tuner.initial_size
+
+
+def test_tuner_limits():
+    tuner = yc.RangeTuner(min_size=512 * 1024, max_size=8 * 1024 * 1024)
+    tuner.observe(100 * 1024 * 1024, 0.01, 0.02)
+    assert tuner.next_size() == 8 * 1024 * 1024
+    tuner = yc.RangeTuner(min_size=512 * 1024, max_size=8 * 1024 * 1024)
+    tuner.observe(1024, 0.5, 10)
+    assert tuner.next_size() == 512 * 1024
+
+
+def test_tuner_smooths_and_ignores_empty_ranges():
+    tuner = yc.RangeTuner(smoothing=0.5)
+    tuner.observe(1000, 0.0, 1.0)
+    tuner.observe(0, 0.0, 1.0)
+    assert tuner.throughput == 1000
+    tuner.observe(3000, 0.0, 1.0)
+    assert tuner.throughput == 2000
+    assert tuner.to_dict()["ranges"] == 3
+    assert tuner.bytes == 4000
+    # rtt longer than the target still leaves half of it for the transfer
+    tuner.rtt = 10.0
+    assert tuner.next_size() == tuner.min_size
+
+
+def test_adaptive_download(tmp_path, make_stream):
+    async def main():
+        async with _RangeServer(media_size=4 * 1024 * 1024) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                filesize = await yc.simple_download(s, str(tmp_path / "video"), adaptive=True)
+            return server, filesize
+
+    server, filesize = asyncio.run(main())
+    assert filesize == 4 * 1024 * 1024
+    assert (tmp_path / "video.mp4").read_bytes() == server.media
+    # the first range has the initial size, later ones are sized by the measured throughput
+    _, start, end = server.ranges[0]
+    assert (start, end) == (0, 2 * 1024 * 1024)
+    assert len(server.ranges) >= 2
+
+
+def _sized_stream(server, content_length: int) -> stream.Stream:
+    return stream.Stream({
+        "itag": 137,
+        "url": "https://rr1---sn-test.googlevideo.com/videoplayback?itag=137",
+        "mimeType": 'video/mp4; codecs="avc1.640028"',
+        "bitrate": 1000000,
+        "contentLength": str(content_length),
+    }, 10, "title", server.session_request())
+
+
+def test_zero_copy_download(tmp_path, make_stream):
+    parts = []
+
+    def callback(part, downloaded, total):
+        assert isinstance(part, memoryview)
+        parts.append((bytes(part), downloaded, total))
+
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                filesize = await yc.simple_download(
+                    s, str(tmp_path / "video"), url_chunk_size=100 * 1024, zero_copy=True, callback=callback
+                )
+            return server.media, filesize
+
+    media, filesize = asyncio.run(main())
+    assert filesize == _size
+    assert (tmp_path / "video.mp4").read_bytes() == media
+    assert b"".join(part for part, _, _ in parts) == media
+    assert [downloaded for _, downloaded, _ in parts] == sorted(downloaded for _, downloaded, _ in parts)
+    assert parts[-1][1:] == (_size, _size)
+
+
+def test_zero_copy_partial_file_is_truncated(tmp_path):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            # the manifest promises more than the server has
+            s = _sized_stream(server, _size + 300 * 1024)
+            async with s.net_obj:
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await yc.simple_download(s, str(tmp_path / "video"), url_chunk_size=100 * 1024, zero_copy=True)
+            return server.media
+
+    media = asyncio.run(main())
+    # the preallocated file keeps only the received bytes
+    assert (tmp_path / "video.mp4").read_bytes() == media
+
+
+def test_zero_copy_longer_than_filesize(tmp_path):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = _sized_stream(server, _size - 1000)
+            async with s.net_obj:
+                with pytest.raises(yc.exceptions.YoutubeClientError):
+                    await yc.simple_download(s, str(tmp_path / "video"), url_chunk_size=100 * 1024, zero_copy=True)
+            return server.media
+
+    media = asyncio.run(main())
+    assert media.startswith((tmp_path / "video.mp4").read_bytes())
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import sys
+
+import pytest
+from mock_server import MockServer
+
+import youtube_client_async as yc
+from youtube_client_async import sink
+
+_size = 256 * 1024
+
+
+class _RecordingSink(sink.AsyncSink):
+    def __init__(self, fail_after: int = 0):
+        self.data = bytearray()
+        self.fail_after = fail_after
+        self.closed = False
+
+    async def write(self, data: bytes):
+        if self.fail_after and len(self.data) >= self.fail_after:
+            raise OSError("disk full")
+        self.data += data
+
+    async def close(self):
+        self.closed = True
+
+
+def _download(make_stream, target, **kwargs):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = make_stream(server)
+            async with s.net_obj:
+                written = await yc.download_to_sink(s, target, url_chunk_size=64 * 1024, **kwargs)
+            return server.media, written
+    return asyncio.run(main())
+
+
+def test_bytes_sink_is_not_closed(make_stream):
+    target = io.BytesIO()
+    media, written = _download(make_stream, target)
+    assert written == _size
+    assert target.getvalue() == media
+
+
+def test_file_sink(tmp_path, make_stream):
+    file = open(tmp_path / "out", "wb")
+    media, _ = _download(make_stream, file, close=True)
+    assert file.closed
+    assert (tmp_path / "out").read_bytes() == media
+
+
+def test_sync_and_async_callables(make_stream):
+    parts = []
+    media, _ = _download(make_stream, parts.append)
+    assert b"".join(parts) == media
+
+    async_parts = []
+
+    async def consume(data: bytes):
+        await asyncio.sleep(0)
+        async_parts.append(data)
+
+    assert isinstance(sink.make_sink(consume), sink.CallableSink)
+    media, _ = _download(make_stream, consume)
+    assert b"".join(async_parts) == media
+
+
+def test_subprocess_stdin(make_stream):
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            s = make_stream(server)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())",
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            )
+            output = asyncio.ensure_future(process.stdout.read())
+            async with s.net_obj:
+                # the end of the download closes stdin, the process sees the end of its input
+                await yc.download_to_sink(s, process, url_chunk_size=64 * 1024)
+            await process.wait()
+            return server.media, await output
+
+    media, output = asyncio.run(main())
+    assert output == media
+
+
+def test_sink_is_closed_on_error(make_stream):
+    target = _RecordingSink(fail_after=64 * 1024)
+    with pytest.raises(OSError):
+        _download(make_stream, target)
+    assert target.closed
+    assert len(target.data) >= 64 * 1024
+
+
+def test_make_sink_errors():
+    async def main():
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", "pass")
+        try:
+            with pytest.raises(ValueError):
+                sink.make_sink(process)
+        finally:
+            await process.wait()
+
+    asyncio.run(main())
+    with pytest.raises(TypeError):
+        sink.make_sink(42)
+    recording = _RecordingSink()
+    assert sink.make_sink(recording) is recording
@@ -0,0 +1,228 @@
+import asyncio
+import math
+import time
+
+import pytest
+from aiohttp import web
+from fixtures import player_response
+from mock_server import MockServer
+
+from youtube_client_async import extract, itags, stream
+
+
+@pytest.fixture
+def query() -> stream.StreamQuery:
+    player = player_response()
+    manifest = extract.apply_descrambler(player["streamingData"])
+    for s in manifest:
+        s.pop("s", None)
+    return stream.StreamQuery([stream.Stream(s, 1200, "title", None) for s in manifest], "video_id")
+
+
+def test_indexes_are_built_on_first_lookup_of_the_root(query):
+    derived = query.filter(only_audio=True).order_by("bitrate")[1:].reversed
+    assert query._indexes is None
+    assert derived.filter(audio_codec="opus").items == [
+        s for s in derived.items if s.audio_codec == "opus"
+    ]
+    assert query._indexes is not None
+    assert derived._indexes is None
+    assert derived._root is query
+
+
+def test_filter_matches_scan(query):
+    mp4 = query.filter(subtype="mp4")
+    assert mp4.items == [s for s in query.items if s.ext == "mp4"]
+    video = query.filter(type="video", adaptive=True).order_by("bitrate", reverse=True)
+    resolution = video.first.resolution
+    assert video.filter(res=resolution).items == [s for s in video.items if s.resolution == resolution]
+    itags = [s.itag for s in query.items[:3]]
+    assert video.reversed.filter(itag=itags).items == [s for s in video.reversed.items if s.itag in itags]
+
+
+def test_get_by_itag_of_derived_query(query):
+    audio = query.filter(only_audio=True)
+    video_itag = query.filter(only_video=True).first.itag
+    assert query.get_by_itag(video_itag).itag == video_itag
+    assert audio.get_by_itag(video_itag) is None
+    assert audio[1:].get_by_itag(audio[1].itag) is audio[1]
+    assert query.get_by_itag(1) is None
+
+
+def _eager(raw: dict) -> dict:
+    """Fields as the eager Stream.__init__ computed them before they were read lazily"""
+    mime_type, codecs = extract.mime_type_codec(raw["mimeType"])
+    type_, ext = mime_type.split("/")
+    video = audio = None
+    if len(codecs) % 2 == 0:
+        video, audio = codecs
+    elif type_ == "video":
+        video = codecs[0]
+    elif type_ == "audio":
+        audio = codecs[0]
+    profile = itags.get_format_profile(raw["itag"])
+    color = raw.get("colorInfo") or {}
+    length = int(raw.get("contentLength", 0))
+    return {
+        "average_bitrate": raw.get("averageBitrate"),
+        "mime_type_sourse": raw["mimeType"],
+        "bitrate": raw["bitrate"],
+        "last_modified": raw.get("lastModified"),
+        "quality": raw["quality"],
+        "quality_label": raw.get("qualityLabel"),
+        "video_quality_lable": raw.get("qualityLabel"),
+        "projection_type": raw["projectionType"],
+        "approx_duration": raw.get("approxDurationMs"),
+        "color_info_primaries": color.get("primaries"),
+        "color_info_transfer_characteristics": color.get("transferCharacteristics"),
+        "color_info_matrix_coefficients": color.get("matrixCoefficients"),
+        "fps": raw.get("fps"),
+        "width": raw.get("width"),
+        "height": raw.get("height"),
+        "audio_quality": raw.get("audioQuality"),
+        "audio_channels": raw.get("audioChannels"),
+        "audio_sample_rate": raw.get("audioSampleRate"),
+        "loudness_db": raw.get("loudnessDb"),
+        "mime_type": mime_type,
+        "codecs": codecs,
+        "type": type_,
+        "ext": ext,
+        "video_codec": video,
+        "audio_codec": audio,
+        "_filesize_kb": float(math.ceil(float(length) / 1024 * 1000) / 1000),
+        "_filesize_mb": float(math.ceil(float(length) / 1024 / 1024 * 1000) / 1000),
+        "_filesize_gb": float(math.ceil(float(length) / 1024 / 1024 / 1024 * 1000) / 1000),
+        "is_dash": profile["is_dash"],
+        "abr": profile["abr"],
+        "resolution": profile["resolution"],
+        "is_3d": profile["is_3d"],
+        "is_hdr": profile["is_hdr"],
+        "is_otf": raw.get("is_otf"),
+        "contains_audio_track_info": "audioTrack" in raw,
+    }
+
+
+def _raw(itag: int, mime: str, **extra) -> dict:
+    raw = {
+        "itag": itag,
+        "url": f"https://rr1---sn-test.googlevideo.com/videoplayback?itag={itag}",
+        "mimeType": mime,
+        "bitrate": 1000000,
+        "quality": "medium",
+        "projectionType": "RECTANGULAR",
+    }
+    raw.update(extra)
+    return raw
+
+
+_raws = [
+    _raw(18, 'video/mp4; codecs="avc1.42001E, mp4a.40.2"', contentLength="123456789", qualityLabel="360p"),
+    _raw(43, 'video/webm; codecs="vp8.0, vorbis"'),
+    _raw(137, 'video/mp4; codecs="avc1.640028"', fps=30, width=1920, height=1080,
+         colorInfo={"primaries": "COLOR_PRIMARIES_BT709", "matrixCoefficients": "COLOR_MATRIX_COEFFICIENTS_BT709"}),
+    _raw(337, 'video/webm; codecs="vp9.2"', qualityLabel="2160p60 HDR"),
+    _raw(140, 'audio/mp4; codecs="mp4a.40.2"', audioQuality="AUDIO_QUALITY_MEDIUM", audioChannels=2,
+         audioSampleRate="44100", loudnessDb=-3.5, contentLength="4096"),
+    _raw(251, 'audio/webm; codecs="opus"', audioTrack={"id": "en.4", "displayName": "English", "audioIsDefault": True}),
+    _raw(136, 'video/mp4; codecs="avc1.4d401f"', is_otf=True),
+    _raw(999999, 'video/mp4; codecs="av01.0.08M.08"'),
+]
+
+
+@pytest.mark.parametrize("raw", _raws + [
+    s for s in extract.apply_descrambler(player_response()["streamingData"])
+], ids=lambda raw: f"{raw['itag']}-{raw['mimeType']}")
+def test_lazy_fields_match_eager_values(raw):
+    s = stream.Stream(raw, 1200, "title", None)
+    for name, value in _eager(raw).items():
+        assert getattr(s, name) == value, name
+    track = s.audio_track_info
+    if "audioTrack" in raw:
+        info = raw["audioTrack"]
+        assert (track.id, track.name, track.is_default) == (info["id"], info["displayName"], info["audioIsDefault"])
+    else:
+        assert track is None
+    # the cached mime parse is not shared through the returned list
+    s.codecs.append("changed")
+    assert stream.Stream(raw, 1200, "title", None).codecs == _eager(raw)["codecs"]
+
+
+def _sized(net_obj, itag: int, content_length: int = 0, url: str = None) -> stream.Stream:
+    raw = _raw(itag, 'video/mp4; codecs="avc1.640028"')
+    if url:
+        raw["url"] = url
+    if content_length:
+        raw["contentLength"] = str(content_length)
+    return stream.Stream(raw, 10, "title", net_obj)
+
+
+def test_filesize_and_expires_in():
+    s = _sized(None, 137, 5000, "https://rr1---sn-test.googlevideo.com/videoplayback?itag=137&expire=1900000000")
+    assert s.filesize == s.filesize_approx == 5000
+    assert s.expires_in == pytest.approx(1900000000 - time.time(), abs=5)
+    unknown = _sized(None, 137)
+    assert unknown.filesize == 0
+    # estimated from duration and bitrate
+    assert unknown.filesize_approx == 10 * 1000000 // 8
+    assert unknown.expires_in == math.inf
+
+
+def test_parse_filesize():
+    assert stream.parse_filesize(50) == 50
+    assert stream.parse_filesize("50") == 50
+    assert stream.parse_filesize("2kb") == 2048
+    assert stream.parse_filesize(" 1.5MB ") == int(1.5 * 1024 ** 2)
+    assert stream.parse_filesize("1gb") == 1024 ** 3
+
+
+def test_max_filesize():
+    streams = [_sized(None, 137, size) for size in (1024, 1024 * 1024, 10 * 1024 * 1024)]
+    query = stream.StreamQuery(streams + [_sized(None, 136)], "video_id")
+    assert query.max_filesize("1mb").items == streams[:2]
+    assert query.max_filesize(1023).items == []
+    # the unknown size is estimated as 1.25 MB
+    assert len(query.max_filesize("2mb")) == 3
+
+
+class _CountingServer(MockServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _videoplayback(self, request):
+        if request.query.get("itag") == "404":
+            self._count("missing")
+            return web.Response(status=404)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return await super()._videoplayback(request)
+        finally:
+            self.in_flight -= 1
+
+
+def test_resolve_filesizes():
+    async def main():
+        async with _CountingServer(media_size=4096) as server, server.session_request() as sr:
+            streams = [_sized(sr, itag) for itag in (133, 134, 135, 136, 137)] + [_sized(sr, 404)]
+            streams.append(_sized(sr, 18, 123))
+            query = stream.StreamQuery(streams, "resolve_video_id")
+            try:
+                assert await query.resolve_filesizes(concurrency=2) is query
+                heads = server.requests["videoplayback"]
+                # the second query of the video takes the sizes from the cache
+                again = stream.StreamQuery([_sized(sr, itag) for itag in (133, 134)], "resolve_video_id")
+                await again.resolve_filesizes()
+                with pytest.raises(ValueError):
+                    await query.resolve_filesizes(concurrency=0)
+            finally:
+                stream._filesizes.clear()
+            return server, query, again, heads
+
+    server, query, again, heads = asyncio.run(main())
+    assert [s.filesize for s in query.items] == [4096] * 5 + [0, 123]
+    assert server.max_in_flight <= 2
+    assert server.requests["videoplayback"] == heads
+    assert [s.filesize for s in again.items] == [4096, 4096]
@@ -0,0 +1,81 @@
+import asyncio
+
+from aiohttp import web
+from mock_server import MockServer
+
+import youtube_client_async as yc
+
+_size = 256 * 1024
+
+
+class _ExpiredOnceServer(MockServer):
+    """The first media request is answered with 403, like an url that expired in the queue"""
+
+    async def _videoplayback(self, request):
+        if not self.requests.get("forbidden"):
+            self._count("forbidden")
+            return web.Response(status=403)
+        return await super()._videoplayback(request)
+
+
+async def _handle(server: MockServer, sr: yc.SessionRequest, margin: float = 600.0) -> yc.StreamHandle:
+    video = await yc.get_video(yc.get_video_url(server.video_id), sr, yc.InnerTube(sr))
+    streams = await video.get_streams()
+    return video.get_stream_handle(streams.filter(only_video=True).first, margin)
+
+
+def test_refresh_near_expiration():
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            async with server.session_request() as sr:
+                handle = await _handle(server, sr)
+                players = server.requests["player"]
+                # far from the expiration the url is kept
+                first = await handle.get_stream()
+                assert handle.renewals == 0 and server.requests["player"] == players
+                cached_player = handle.playable._ios_initial_player
+                # a margin longer than the validity of the url renews it
+                handle.margin = handle.expires_in + 60
+                renewed = await handle.get_stream()
+            return server, handle, players, first, renewed, cached_player
+
+    server, handle, players, first, renewed, cached_player = asyncio.run(main())
+    assert handle.renewals == 1
+    assert renewed is not first and renewed.itag == first.itag
+    # the cached player response with the old urls was dropped and requested again
+    assert server.requests["player"] == players + 1
+    assert handle.playable._ios_initial_player is not cached_player
+    # filesize of the old stream is kept
+    assert renewed._content_lenght == first._content_lenght
+
+
+def test_refresh_of_renewed_url_is_skipped():
+    async def main():
+        async with MockServer(media_size=_size) as server:
+            async with server.session_request() as sr:
+                handle = await _handle(server, sr)
+                players = server.requests["player"]
+                current = await handle.refresh("https://rr1---sn-test.googlevideo.com/videoplayback?old=1")
+            return server, handle, players, current
+
+    server, handle, players, current = asyncio.run(main())
+    assert current is handle.stream
+    assert handle.renewals == 0
+    assert server.requests["player"] == players
+
+
+def test_refresh_after_403(tmp_path):
+    async def main():
+        async with _ExpiredOnceServer(media_size=_size) as server:
+            async with server.session_request() as sr:
+                handle = await _handle(server, sr)
+                players = server.requests["player"]
+                filesize = await yc.simple_download(handle, str(tmp_path / "video"), net_obj=sr)
+            return server, handle, players, filesize
+
+    server, handle, players, filesize = asyncio.run(main())
+    assert filesize == _size
+    assert (tmp_path / f"video.{handle.stream.ext}").read_bytes() == server.media
+    assert server.requests["forbidden"] == 1
+    assert handle.renewals == 1
+    assert server.requests["player"] == players + 1
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from youtube_client_async import sink, tracing
+
+
+@pytest.fixture
+def spans():
+    ended = []
+    tracing.set_tracer(tracing.CallbackTracer(on_end=lambda name, attributes, duration, error: ended.append(
+        (name, dict(attributes), error)
+    )))
+    yield ended
+    tracing.set_tracer(None)
+
+
+def test_disabled_span_is_shared():
+    assert tracing.get_tracer() is None
+    assert tracing.span("a", x=1) is tracing.span("b")
+    with tracing.span("a") as sp:
+        sp.set_attribute("key", "value")
+
+
+def test_nested_spans(spans):
+    with tracing.span("outer"):
+        with tracing.span("inner", count=2) as sp:
+            sp.set_attribute("status", 200)
+    assert spans == [
+        ("inner", {"count": 2, "parent": "outer", "status": 200}, None),
+        ("outer", {}, None),
+    ]
+
+
+def test_span_records_error(spans):
+    with pytest.raises(ValueError):
+        with tracing.span("failing"):
+            raise ValueError("boom")
+    assert spans[0][0] == "failing"
+    assert isinstance(spans[0][2], ValueError)
+
+
+def test_tracer_and_sink_are_abstract():
+    with pytest.raises(TypeError):
+        tracing.Tracer()
+    with pytest.raises(TypeError):
+        sink.AsyncSink()
+
+
+def test_make_sink_of_callable():
+    received = []
+
+    async def main():
+        s = sink.make_sink(received.append)
+        await s.write(b"ab")
+        await s.write(b"c")
+        await s.close()
+
+    asyncio.run(main())
+    assert received == [b"ab", b"c"]
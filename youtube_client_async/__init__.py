@@ -15,7 +15,13 @@ from .comment import (
     RepliesResponse,
     RepliesResponseGetter,
 )
+from .decipher_service import DecipherService, get_decipher_service, set_decipher_service
+from .download_manager import DownloadJob, DownloadManager, DownloadProgress, DownloadState, TokenBucket
+from .export import RecordSchema, compile_record, to_records, write_csv, write_ndjson
+from .format_selector import FormatSelector, SelectorSyntaxError, compile_selector
+from .hosts import HostPool
 from .innertube import InnerTube
+from .live_recorder import LiveRecorder, LiveRecordingError, RollingOutput
 from .live_video import (
     LiveChat,
     LiveChatMessage,
@@ -30,7 +36,11 @@ from .live_video import (
     get_live_video,
     get_premiere,
 )
+from .manifest import ManifestResolver, resolve_manifests
+from .metrics import Histogram, Metrics
+from .mux import MuxError, PairDownloadResult, download_pair
 from .net import SessionRequest
+from .player_index import PlayerIndex, get_player_index, set_player_index
 from .playlist import Playlist, get_playlist
 from .post import (
     AnotherVideoPostAttachment,
@@ -54,9 +64,13 @@ from .search import (
     SearchShortInfo,
     SearchVideoInfo,
 )
+from .replay import Cassette, CassetteMissError, RecordingSession, ReplaySession
 from .short import Short, get_short
-from .simple_downloader import simple_download
+from .simple_downloader import RangeTuner, download_to_sink, range_video_stream, simple_download
+from .sink import AsyncSink, make_sink
+from .stream_handle import StreamExpiredError, StreamHandle
 from .thumbnail import Thumbnail, ThumbnailQuery
+from .tracing import CallbackTracer, OpenTelemetryTracer, Tracer, set_tracer
 from .version import __version__
 from .video import Video, get_video, get_video_embed_url, get_video_id, get_video_url
 from .helpers import async_islice
\ No newline at end of file
@@ -1,13 +1,34 @@
 import time
 from abc import ABC
-from typing import Optional
+from typing import Optional, Sequence, Tuple
 from urllib import parse
 
-from . import extract, helpers, innertube, net
+from . import exceptions, extract, helpers, innertube, net, tracing
+
+_logged_out_path = helpers.compile_path("responseContext|mainAppWebResponseContext|loggedOut")
+_request_language_path = helpers.compile_path(
+    "topbar|desktopTopbarRenderer|searchbox|fusionSearchboxRenderer|config|webSearchboxConfig|requestLanguage"
+)
+
+
+def prune(source: dict, paths: Sequence[Tuple[str, ...]]) -> int:
+    """Delete subtrees at paths (tuples of keys) from source, returns count of deleted"""
+    count = 0
+    for path in paths:
+        val = source
+        for key in path[:-1]:
+            val = val.get(key) if isinstance(val, dict) else None
+        if isinstance(val, dict) and val.pop(path[-1], None) is not None:
+            count += 1
+    return count
 
 
 class BaseYoutube(ABC):
     """base class for accessing the youtube object by url"""
+
+    # subtrees of initial_data that no property reads, pruned by release_html
+    _unused_initial_data: Tuple[Tuple[str, ...], ...] = ()
+
     def __init__(
         self,
         url: str,
@@ -29,13 +50,38 @@ class BaseYoutube(ABC):
         self._initial_data: dict = initial_data
         self._ytcfg: dict = ytcfg
 
+    def _get_html(self) -> str:
+        if self.html is None:
+            raise exceptions.HTMLReleasedError(f"html of {self.url} was released")
+        return self.html
+
+    def _extract_from_html(self):
+        """Everything the properties read from html"""
+        self.initial_data
+        try:
+            self.ytcfg
+        except (exceptions.HTMLParseError, exceptions.RegexMatchError):
+            helpers.logger.info(f"no ytcfg in {self.url}")
+
+    def release_html(self, prune_unused: bool = True):
+        """Extract everything that is read from html and drop the html (1-2 MB for a watch page).
+        prune_unused also deletes subtrees of initial_data no property uses, like related videos.
+        Objects kept for long, e.g. thousands of videos of an export, stay small"""
+        if self.html is None:
+            return
+        self._extract_from_html()
+        self.html = None
+        if prune_unused and self._initial_data:
+            prune(self._initial_data, self._unused_initial_data)
+
     @property
     def initial_data(self) -> dict:
         if self._initial_data:
             return self._initial_data
-        html = self.html
+        html = self._get_html()
         current_time = time.time()
-        self._initial_data = extract.initial_data(html)
+        with tracing.span("extract.initial_data"):
+            self._initial_data = extract.initial_data(html)
         delta_time = time.time() - current_time
         helpers.logger.info(f"extracted initial_data in {delta_time:.2f} seconds")
         return self._initial_data
@@ -44,25 +90,21 @@ class BaseYoutube(ABC):
     def ytcfg(self) -> dict:
         if self._ytcfg:
             return self._ytcfg
-        html = self.html
+        html = self._get_html()
         current_time = time.time()
-        self._ytcfg = extract.get_ytcfg(html)
+        with tracing.span("extract.ytcfg"):
+            self._ytcfg = extract.get_ytcfg(html)
         delta_time = time.time() - current_time
         helpers.logger.info(f"extracted ytcfg in {delta_time:.2f} seconds")
         return self._ytcfg
 
     @property
     def logged_in(self) -> bool:
-        return not self.initial_data["responseContext"][
-            "mainAppWebResponseContext"]["loggedOut"]
+        return not _logged_out_path(self.initial_data)
 
     @property
     def res_lang(self) -> str:
-        return helpers.get_from_dict(
-            self.initial_data,
-            "topbar|desktopTopbarRenderer|searchbox|fusionSearchboxRenderer|"
-            + "config|webSearchboxConfig|requestLanguage",
-        )
+        return _request_language_path(self.initial_data)
 
     def __repr__(self) -> str:
         return f"<youtube_client.BaseYoutube {self.url=} >"
@@ -11,20 +11,54 @@ This module is responsible for (1) finding these "transformations
 functions" (2) sends them to be interpreted by jsinterp.py
 """
 import re
+import threading
+from typing import Optional
 
+from . import tracing
 from .exceptions import RegexMatchError
 from .helpers import logger
 from .jsinterp import JSInterpreter
 
 
 class Cipher:
-    def __init__(self, js: str, js_url: str):
-        self.signature_function_name = get_initial_function_name(js, js_url)
-        self.throttling_function_name = get_throttling_function_name(js, js_url)
+    def __init__(self, js: str, js_url: str, index_entry: Optional[dict] = None):
+        """index_entry is a saved to_index() of the same player, it replaces the search in js"""
+        if index_entry:
+            self.signature_function_name = index_entry["signature_function_name"]
+            self.throttling_function_name = index_entry["throttling_function_name"]
+            self.js_interpreter = JSInterpreter(
+                js, function_code=index_entry["functions"], object_code=index_entry["objects"]
+            )
+        else:
+            with tracing.span("cipher.discover", js_url=js_url):
+                self.signature_function_name = get_initial_function_name(js, js_url)
+                self.throttling_function_name = get_throttling_function_name(js, js_url)
+            self.js_interpreter = JSInterpreter(js)
 
         self.calculated_n = None
 
-        self.js_interpreter = JSInterpreter(js)
+        # the interpreter keeps state between calls, one call at a time when used from threads
+        self._lock = threading.Lock()
+        self._indexed = self._index_size() if index_entry else 0
+
+    def _index_size(self) -> int:
+        return len(self.js_interpreter.function_code) + len(self.js_interpreter.object_code)
+
+    @property
+    def index_changed(self) -> bool:
+        """Whether functions were found since the Cipher was created or to_index was called"""
+        return self._index_size() != self._indexed
+
+    def to_index(self) -> dict:
+        """Function names and the code found so far, for PlayerIndex"""
+        with self._lock:
+            self._indexed = self._index_size()
+            return {
+                "signature_function_name": self.signature_function_name,
+                "throttling_function_name": self.throttling_function_name,
+                "functions": dict(self.js_interpreter.function_code),
+                "objects": dict(self.js_interpreter.object_code),
+            }
 
     def get_throttling(self, n: str):
         """Interpret the function that throttles download speed.
@@ -34,7 +68,8 @@ class Cipher:
         :returns:
             Returns the transformed value "n".
         """
-        return self.js_interpreter.call_function(self.throttling_function_name, n)
+        with self._lock:
+            return self.js_interpreter.call_function(self.throttling_function_name, n)
 
     def get_signature(self, ciphered_signature: str) -> str:
         """interprets the function that signs the streams.
@@ -45,7 +80,8 @@ class Cipher:
         :returns:
            Returns the correct stream signature.
         """
-        return self.js_interpreter.call_function(self.signature_function_name, ciphered_signature)
+        with self._lock:
+            return self.js_interpreter.call_function(self.signature_function_name, ciphered_signature)
 
 
 def get_initial_function_name(js: str, js_url: str) -> str:
@@ -0,0 +1,147 @@
+"""Deciphering in worker processes.
+
+Signatures and n values are deciphered by interpreting the player js in
+pure python, which holds the GIL: many get_streams at once block the event
+loop and use one core. DecipherService runs the Ciphers in a process pool.
+Every worker keeps the Ciphers of the players it has seen, so the player js
+is sent to a worker and parsed there only once.
+
+Installed by set_decipher_service it is used by get_streams and
+ManifestResolver:
+
+    async with yc.DecipherService() as service:
+        yc.set_decipher_service(service)
+        streams = await video.get_streams()
+"""
+import asyncio
+import concurrent.futures
+import multiprocessing.context
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import extract, player_index, tracing
+from .helpers import logger
+
+_service: Optional["DecipherService"] = None
+
+
+def _init_worker(index_directory: Optional[str]):
+    """Runs in every new worker, spawned workers do not inherit the installed PlayerIndex"""
+    if index_directory is not None:
+        player_index.set_player_index(player_index.PlayerIndex(index_directory))
+
+
+def _decipher_warm(
+    url_js: str, js: Optional[str], signatures: List[str], n_values: List[str]
+) -> Optional[Tuple[Dict[str, str], Dict[str, str]]]:
+    """Runs in the worker. None when js is needed but was not sent"""
+    if js is None:
+        if url_js not in extract._ciphers:
+            return None
+        js = ""  # the cached Cipher does not read it
+    return extract.decipher(js, url_js, signatures, n_values)
+
+
+class DecipherService:
+    """Pool of processes deciphering signatures and n values.
+
+    :param int workers:
+        count of processes, by default count of cpus
+    :param int chunk_size:
+        count of values deciphered by one call of a worker
+    :param mp_context:
+        multiprocessing context of the pool, e.g. multiprocessing.get_context("spawn")
+    :param executor:
+        executor of the calls instead of an own process pool, it is not shut down by close
+
+    Workers of the own pool use the PlayerIndex installed when the service is created.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = 32,
+        mp_context: Optional[multiprocessing.context.BaseContext] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ):
+        self.chunk_size: int = chunk_size
+        self._own_executor: bool = executor is None
+        if executor is None:
+            index = player_index.get_player_index()
+            executor = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context, initializer=_init_worker, initargs=(index.directory if index else None,)
+            )
+        self.executor: concurrent.futures.Executor = executor
+        self.calls: int = 0
+        self.js_sent: int = 0
+        self._players: set = set()
+        self._futures: set = set()
+
+    def _submit(self, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().run_in_executor(self.executor, _decipher_warm, *args)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    async def _call(self, js: str, url_js: str, signatures: List[str], n_values: List[str]):
+        self.calls += 1
+        # the worker is not known in advance, js of a new player goes with every call,
+        # later only to the workers that miss it
+        if url_js not in self._players:
+            self.js_sent += 1
+            return await self._submit(url_js, js, signatures, n_values)
+        result = await self._submit(url_js, None, signatures, n_values)
+        if result is None:
+            self.js_sent += 1
+            result = await self._submit(url_js, js, signatures, n_values)
+        return result
+
+    async def decipher(
+        self, js: str, url_js: str, signatures: Iterable[str], n_values: Iterable[str]
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Same as extract.decipher, values are split into chunks of chunk_size over the workers"""
+        signatures = list(signatures)
+        n_values = list(n_values)
+        size = self.chunk_size
+        with tracing.span("cipher.service", signatures=len(signatures), n=len(n_values)):
+            results = await asyncio.gather(*(
+                [self._call(js, url_js, signatures[i:i + size], []) for i in range(0, len(signatures), size)]
+                + [self._call(js, url_js, [], n_values[i:i + size]) for i in range(0, len(n_values), size)]
+            ))
+        self._players.add(url_js)
+        deciphered_signatures: Dict[str, str] = {}
+        deciphered_n: Dict[str, str] = {}
+        for chunk_signatures, chunk_n in results:
+            deciphered_signatures.update(chunk_signatures)
+            deciphered_n.update(chunk_n)
+        return deciphered_signatures, deciphered_n
+
+    def close(self):
+        global _service
+        if _service is self:
+            _service = None
+        # cancelling the loop futures cancels the calls still waiting in the pool,
+        # shutdown(cancel_futures=True) needs python 3.9
+        for future in list(self._futures):
+            future.cancel()
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+        logger.debug(f"decipher service closed after {self.calls} calls, js sent {self.js_sent} times")
+
+    async def __aenter__(self) -> "DecipherService":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<DecipherService calls={self.calls} js_sent={self.js_sent}/>"
+
+
+def set_decipher_service(service: Optional[DecipherService]):
+    """Decipher with service in get_streams and ManifestResolver. None deciphers in the event loop again"""
+    global _service
+    _service = service
+
+
+def get_decipher_service() -> Optional[DecipherService]:
+    return _service
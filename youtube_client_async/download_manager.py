@@ -0,0 +1,326 @@
+"""Coordinated download of many streams.
+
+    async with yc.DownloadManager(sr, max_bandwidth=20 * 1024 * 1024, max_files=8) as manager:
+        for s in streams:
+            manager.add(s, f"out/{s.itag}", priority=s.bitrate)
+        await manager.join()
+        print(manager.progress())
+
+Jobs added as StreamHandle (video.get_stream_handle) renew the url when it expires
+while they wait in the queue or download.
+
+Jobs with higher priority start first. Bandwidth is shared by all jobs,
+connections to one googlevideo host are limited by max_per_host.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Union
+from urllib import parse
+
+
+from . import net, stream, tracing
+from .helpers import logger
+from .hosts import HostPool
+from .simple_downloader import DownloadingLiveError, RangeTuner, otf_video_stream, range_video_stream
+from .stream_handle import StreamHandle
+
+
+class TokenBucket:
+    """Rate limit in bytes per second shared by many consumers.
+    capacity is the burst size, a quarter of second of rate by default"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity else rate / 4
+        self._tokens: float = self.capacity
+        self._last: float = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def consume(self, amount: int):
+        """Take amount of bytes, sleeping while the bucket is in debt"""
+        self._refill()
+        self._tokens -= amount
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+class DownloadState(Enum):
+    queued = 0
+    running = 1
+    done = 2
+    failed = 3
+    cancelled = 4
+
+
+class DownloadJob:
+    def __init__(
+        self, stream: stream.Stream, filepath: str, priority: int, index: int, handle: Optional[StreamHandle] = None
+    ):
+        self.stream: stream.Stream = stream
+        self.handle: Optional[StreamHandle] = handle
+        self.filepath: str = filepath
+        self.priority: int = priority
+        self.index: int = index
+        self.state: DownloadState = DownloadState.queued
+        self.filesize: Optional[int] = None
+        self.downloaded: int = 0
+        self.error: Optional[BaseException] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.done: asyncio.Event = asyncio.Event()
+
+    @property
+    def path(self) -> str:
+        """filepath with extension"""
+        return f"{self.filepath}.{self.stream.ext}"
+
+    def cancel(self):
+        if self.state == DownloadState.queued:
+            self.state = DownloadState.cancelled
+            self.done.set()
+        elif self.task:
+            self.task.cancel()
+
+    async def wait(self) -> "DownloadJob":
+        await self.done.wait()
+        return self
+
+    def __lt__(self, other: "DownloadJob") -> bool:
+        return (-self.priority, self.index) < (-other.priority, other.index)
+
+    def __repr__(self) -> str:
+        return f"<DownloadJob itag={self.stream.itag} {self.state.name} {self.downloaded}/{self.filesize}/>"
+
+
+@dataclass(frozen=True)
+class DownloadProgress:
+    jobs: int
+    queued: int
+    running: int
+    done: int
+    failed: int
+    cancelled: int
+    downloaded: int
+    total: int  # known filesizes only
+    speed: float  # bytes per second over the last progress_interval
+
+    @property
+    def percent(self) -> float:
+        return self.downloaded / self.total * 100 if self.total else 0.0
+
+
+class DownloadManager:
+    """Queue of downloads.
+
+    :param float max_bandwidth:
+        bytes per second for all jobs together, None is unlimited
+    :param int max_files:
+        count of jobs downloaded at once
+    :param int max_per_host:
+        count of simultaneous range requests to one host
+    :param bool adaptive:
+        size range requests of every job by its measured throughput (RangeTuner)
+    :param HostPool hosts:
+        move failed and slow ranges to mirror hosts, statistics are shared by all jobs
+    :param on_progress:
+        called with DownloadProgress every progress_interval seconds while jobs are running
+    """
+
+    def __init__(
+        self,
+        net_obj: Optional[net.SessionRequest] = None,
+        max_bandwidth: Optional[float] = None,
+        max_files: int = 4,
+        max_per_host: int = 2,
+        url_chunk_size: int = 1024 * 1024 * 10,
+        chunk_size: int = 1024 * 64,
+        max_retries: int = 1,
+        timeout: int = 10,
+        adaptive: bool = False,
+        hosts: Optional[HostPool] = None,
+        on_progress: Optional[Callable[[DownloadProgress], None]] = None,
+        progress_interval: float = 1.0,
+    ):
+        self.net_obj: Optional[net.SessionRequest] = net_obj
+        self.bandwidth: Optional[TokenBucket] = TokenBucket(max_bandwidth) if max_bandwidth else None
+        self.max_files: int = max_files
+        self.max_per_host: int = max_per_host
+        self.url_chunk_size: int = url_chunk_size
+        self.chunk_size: int = chunk_size
+        self.max_retries: int = max_retries
+        self.timeout: int = timeout
+        self.adaptive: bool = adaptive
+        self.hosts: Optional[HostPool] = hosts
+        self.on_progress: Optional[Callable[[DownloadProgress], None]] = on_progress
+        self.progress_interval: float = progress_interval
+        self.jobs: List[DownloadJob] = []
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._reporter: Optional[asyncio.Task] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._speed: float = 0.0
+
+    def add(self, stream: Union[stream.Stream, StreamHandle], filepath: str, priority: int = 0) -> DownloadJob:
+        """filepath is path to filename without extension. Starts the manager if it is not started"""
+        if isinstance(stream, StreamHandle):
+            job = DownloadJob(stream.stream, filepath, priority, len(self.jobs), stream)
+        else:
+            job = DownloadJob(stream, filepath, priority, len(self.jobs))
+        self.jobs.append(job)
+        self.start()
+        self._queue.put_nowait(job)
+        return job
+
+    def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.max_files)]
+        if self.on_progress:
+            self._reporter = asyncio.ensure_future(self._report())
+
+    async def join(self) -> List[DownloadJob]:
+        """Wait for all added jobs"""
+        for job in list(self.jobs):
+            await job.wait()
+        return self.jobs
+
+    async def close(self):
+        """Cancel running and queued jobs and stop the manager"""
+        for job in self.jobs:
+            job.cancel()
+        tasks = self._workers + ([self._reporter] if self._reporter else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *(job.task for job in self.jobs if job.task), return_exceptions=True)
+        self._queue = None
+        self._workers = []
+        self._reporter = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def progress(self) -> DownloadProgress:
+        counts = {state: 0 for state in DownloadState}
+        downloaded = 0
+        total = 0
+        for job in self.jobs:
+            counts[job.state] += 1
+            downloaded += job.downloaded
+            total += job.filesize or 0
+        return DownloadProgress(
+            jobs=len(self.jobs),
+            queued=counts[DownloadState.queued],
+            running=counts[DownloadState.running],
+            done=counts[DownloadState.done],
+            failed=counts[DownloadState.failed],
+            cancelled=counts[DownloadState.cancelled],
+            downloaded=downloaded,
+            total=total,
+            speed=self._speed,
+        )
+
+    async def _report(self):
+        last = self.progress().downloaded
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            progress = self.progress()
+            self._speed = (progress.downloaded - last) / self.progress_interval
+            last = progress.downloaded
+            if progress.running or progress.queued:
+                self.on_progress(self.progress())
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Semaphore of the host url is sent to, taken for every request"""
+        host = parse.urlsplit(url).netloc
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    async def _worker(self):
+        while True:
+            job: DownloadJob = await self._queue.get()
+            if job.state != DownloadState.queued:
+                continue
+            job.task = asyncio.ensure_future(self._download(job))
+            try:
+                # unlike await job.task, a cancelled job does not raise in the worker,
+                # only the cancellation of the worker itself does
+                await asyncio.wait([job.task])
+            except asyncio.CancelledError:
+                job.task.cancel()
+                raise
+            finally:
+                job.done.set()
+
+    async def _download(self, job: DownloadJob):
+        job.state = DownloadState.running
+        job.started = time.monotonic()
+        net_obj = self.net_obj if self.net_obj else job.stream.net_obj
+        try:
+            if job.handle:
+                job.stream = await job.handle.get_stream()
+            if job.stream.is_live:
+                raise DownloadingLiveError()
+            with tracing.span("download", itag=job.stream.itag, priority=job.priority) as sp:
+                if job.stream.is_otf:
+                    # size of an OTF stream is a request per segment, it is known after the download
+                    job.filesize = job.stream.filesize or None
+                else:
+                    async with self._host_limit(job.stream.url):
+                        job.filesize = await job.stream.get_filesize()
+                sp.set_attribute("filesize", job.filesize)
+                with open(job.path, "wb") as file:
+                    if job.stream.is_otf:
+                        await self._download_otf(job, net_obj, file)
+                        job.filesize = job.downloaded
+                    else:
+                        await self._download_ranges(job, net_obj, file)
+            job.state = DownloadState.done
+        except asyncio.CancelledError:
+            job.state = DownloadState.cancelled
+            raise
+        except Exception as e:
+            logger.warning(f"download of itag={job.stream.itag} to {job.path} failed: {e}")
+            job.state = DownloadState.failed
+            job.error = e
+        finally:
+            job.finished = time.monotonic()
+        if net_obj.metrics and job.state == DownloadState.done:
+            net_obj.metrics.observe_download(job.downloaded, job.finished - job.started)
+
+    async def _write(self, job: DownloadJob, file, data: bytes):
+        if self.bandwidth:
+            await self.bandwidth.consume(len(data))
+        file.write(data)
+        job.downloaded += len(data)
+
+    async def _download_ranges(self, job: DownloadJob, net_obj: net.SessionRequest, file):
+        async for chunk in range_video_stream(
+            job.stream.url, net_obj, job.filesize, job.downloaded, self.max_retries, self.timeout,
+            self.url_chunk_size, self.chunk_size, RangeTuner() if self.adaptive else None,
+            handle=job.handle, hosts=self.hosts, host_limit=self._host_limit,
+        ):
+            await self._write(job, file, chunk)
+
+    async def _download_otf(self, job: DownloadJob, net_obj: net.SessionRequest, file):
+        async for segment in otf_video_stream(
+            job.stream.url, net_obj, self.max_retries, self.timeout, handle=job.handle, hosts=self.hosts,
+            host_limit=self._host_limit,
+        ):
+            await self._write(job, file, segment)
+
+    def __repr__(self) -> str:
+        return f"<DownloadManager jobs={len(self.jobs)}/>"
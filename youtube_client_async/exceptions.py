@@ -11,6 +11,10 @@ class HTMLParseError(YoutubeClientError):
     """HTML could not be parsed"""
 
 
+class HTMLReleasedError(YoutubeClientError):
+    """Something not extracted before release_html needs the html"""
+
+
 class ExtractError(YoutubeClientError):
     """Data extraction based exception."""
 
@@ -0,0 +1,153 @@
+"""Flat records of playable objects for exports.
+
+Reading many properties of a video walks initial_player and initial_data
+from the top for every property. A record schema merges the paths of the
+requested fields into one tree per source document and walks every document
+once, missing values are None or the default of the property, e.g. [] of keywords.
+
+    record = video.to_record(["video_id", "title", "lenght", "view_count", "likes_count"])
+    with open("videos.ndjson", "w") as f:
+        yc.write_ndjson(videos, f, fields=["video_id", "title", "owner_id"])
+
+Field names are property names and values are the values of the properties,
+except the fields that end with _raw: publish_date_raw, upload_date_raw,
+start_live_raw and end_live_raw are the iso strings the datetime properties
+are parsed from. Every class lists the fields of its properties in its
+record_fields, built with field() from the path constants the properties
+read, subclasses extend the dict of the base class. Requested names that are
+not in record_fields are read as attributes of the object.
+"""
+import csv
+import itertools
+import json
+from functools import lru_cache
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .helpers import DictPath
+
+# (source document, keys of the path, convert, default factory)
+RecordField = Tuple[str, Tuple[Union[str, int], ...], Optional[Callable[[Any], Any]], Optional[Callable[[], Any]]]
+
+
+def field(
+    source: str,
+    *paths: DictPath,
+    convert: Optional[Callable[[Any], Any]] = None,
+    default: Optional[Callable[[], Any]] = None,
+) -> RecordField:
+    """Field read from the source document by paths walked one after another.
+    default is called for the value when the path is missing, None otherwise"""
+    keys = tuple(key if index is None else index for path in paths for key, index in path.keys)
+    return source, keys, convert, default
+
+
+def default_fields(cls: type) -> Tuple[str, ...]:
+    """video_id and record_fields of the class"""
+    return ("video_id",) + tuple(cls.record_fields)
+
+
+def _freeze(node: dict) -> tuple:
+    """{"leaves": [...], "children": {key: node}} to (leaves, ((key, node), ...)) for the walk"""
+    return tuple(node["leaves"]), tuple((key, _freeze(child)) for key, child in node["children"].items())
+
+
+def _walk(node: tuple, val: Any, out: list):
+    leaves, children = node
+    for position, convert in leaves:
+        out[position] = convert(val) if convert is not None else val
+    for key, child in children:
+        if isinstance(val, dict):
+            nxt = val.get(key if isinstance(key, str) else str(key))
+        elif isinstance(val, list) and isinstance(key, int):
+            nxt = val[key] if key < len(val) else None
+        else:
+            continue
+        if nxt is not None:
+            _walk(child, nxt, out)
+
+
+class RecordSchema:
+    """Fields of record_fields compiled into one path tree per source document, use compile_record"""
+
+    def __init__(self, fields: Sequence[str], record_fields: Dict[str, RecordField]):
+        self.fields: Tuple[str, ...] = tuple(fields)
+        trees: Dict[str, dict] = {}
+        self._attributes: List[Tuple[int, str]] = []
+        self._defaults: List[Tuple[int, Callable[[], Any]]] = []
+        for position, name in enumerate(self.fields):
+            if name not in record_fields:
+                self._attributes.append((position, name))
+                continue
+            source, keys, convert, default = record_fields[name]
+            node = trees.setdefault(source, {"leaves": [], "children": {}})
+            for key in keys:
+                node = node["children"].setdefault(key, {"leaves": [], "children": {}})
+            node["leaves"].append((position, convert))
+            if default is not None:
+                self._defaults.append((position, default))
+        self._trees: Tuple[Tuple[str, tuple], ...] = tuple((source, _freeze(tree)) for source, tree in trees.items())
+
+    def values(self, playable) -> list:
+        out: list = [None] * len(self.fields)
+        for position, default in self._defaults:
+            out[position] = default()
+        for source, tree in self._trees:
+            _walk(tree, getattr(playable, source), out)
+        for position, name in self._attributes:
+            out[position] = getattr(playable, name)
+        return out
+
+    def record(self, playable) -> Dict[str, Any]:
+        return dict(zip(self.fields, self.values(playable)))
+
+    def __repr__(self) -> str:
+        return f"<RecordSchema {', '.join(self.fields)}/>"
+
+
+@lru_cache(maxsize=64)
+def compile_record(cls: type, fields: Optional[Tuple[str, ...]] = None) -> RecordSchema:
+    """Schema of fields of objects of cls, by default of default_fields(cls)"""
+    return RecordSchema(fields if fields else default_fields(cls), cls.record_fields)
+
+
+def to_records(
+    playables: Iterable, fields: Optional[Sequence[str]] = None, as_tuple: bool = False
+) -> Iterator[Union[Dict[str, Any], tuple]]:
+    """Record of every playable, dicts or tuples in the order of fields.
+    Without fields every record has the default fields of its class"""
+    fields = tuple(fields) if fields else None
+    for playable in playables:
+        schema = compile_record(type(playable), fields)
+        yield tuple(schema.values(playable)) if as_tuple else schema.record(playable)
+
+
+def write_ndjson(playables: Iterable, file: IO[str], fields: Optional[Sequence[str]] = None) -> int:
+    """One json object per line, returns count of records"""
+    count = 0
+    for record in to_records(playables, fields):
+        file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(
+    playables: Iterable, file: IO[str], fields: Optional[Sequence[str]] = None, header: bool = True
+) -> int:
+    """Csv rows with a header of field names, lists and dicts are written as json.
+    Without fields the columns are the default fields of the class of the first playable.
+    file should be opened with newline="". Returns count of records"""
+    playables = iter(playables)
+    first = next(playables, None)
+    if first is None:
+        return 0
+    fields = tuple(fields) if fields else default_fields(type(first))
+    writer = csv.writer(file)
+    if header:
+        writer.writerow(fields)
+    count = 0
+    for values in to_records(itertools.chain((first,), playables), fields, as_tuple=True):
+        writer.writerow([
+            json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v for v in values
+        ])
+        count += 1
+    return count
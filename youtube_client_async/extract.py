@@ -1,8 +1,9 @@
 import re
 from collections import OrderedDict
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
 from urllib import parse
 
+from . import decipher_service, player_index, tracing
 from .cipher import Cipher
 from .exceptions import HTMLParseError, RegexMatchError
 from .helpers import (
@@ -419,19 +420,36 @@ def initial_player_response(watch_html: str) -> str:
 def signature_timestamp(js: str) -> str:
     return regex_search(r"signatureTimestamp:(\d*)", js, group=1)
 
-def apply_signature(stream_manifest: Dict, vid_info: Dict, js: str, url_js: str) -> None:
-    """Apply the decrypted signature to the stream manifest.
+# Cipher for every seen player js url. Finding the functions and parsing the js is the
+# slow part of apply_signature, the same player is used for many videos and renewals.
+# Across processes the found functions are kept by the installed player_index.PlayerIndex.
+_ciphers: "OrderedDict[str, Cipher]" = OrderedDict()
+max_cached_ciphers = 8
 
-    :param dict stream_manifest:
-        Details of the media streams available.
-    :param str js:
-        The contents of the base.js asset file.
-    :param str url_js:
-        Full base.js url
 
-    """
-    cipher = Cipher(js=js, js_url=url_js)
-    discovered_n = dict()
+def get_cipher(js: str, url_js: str) -> Cipher:
+    cipher = _ciphers.get(url_js)
+    if cipher is None:
+        index = player_index.get_player_index()
+        cipher = _ciphers[url_js] = Cipher(js=js, js_url=url_js, index_entry=index.load(url_js) if index else None)
+        if len(_ciphers) > max_cached_ciphers:
+            _ciphers.popitem(last=False)
+    else:
+        _ciphers.move_to_end(url_js)
+    return cipher
+
+
+class SignedUrl(NamedTuple):
+    """Stream url of the manifest split for deciphering"""
+    index: int
+    parsed_url: parse.ParseResult
+    query_params: Dict[str, str]
+    signature: Optional[str]  # ciphered signature, None when the url is pre-signed
+
+
+def prepare_signature(stream_manifest: List[Dict], vid_info: Dict) -> List[SignedUrl]:
+    """Urls of stream_manifest with what has to be deciphered in them"""
+    prepared = []
     for i, stream in enumerate(stream_manifest):
         try:
             url: str = stream["url"]
@@ -459,32 +477,84 @@ def apply_signature(stream_manifest: Dict, vid_info: Dict, js: str, url_js: str)
             # which case there's no real magic to download them and we can skip
             # the whole signature descrambling entirely.
             logger.debug("signature found, skip decipher")
-
+            signature = None
         else:
-            signature = cipher.get_signature(ciphered_signature=stream["s"])
-
+            signature = stream["s"]
+        prepared.append(SignedUrl(i, parsed_url, query_params, signature))
+    return prepared
+
+
+def decipher(
+    js: str, url_js: str, signatures: Iterable[str], n_values: Iterable[str]
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Deciphered signatures and n values by the player. Module level and picklable,
+    so it can run in a process pool, ciphers stay cached in every process"""
+    cipher = get_cipher(js, url_js)
+    deciphered_signatures = {}
+    for signature in signatures:
+        with tracing.span("cipher.signature"):
+            deciphered_signatures[signature] = cipher.get_signature(ciphered_signature=signature)
+    # For WEB-based clients, YouTube sends an "n" parameter that throttles download speed.
+    # To decipher the value of "n", we must interpret the player's JavaScript.
+    deciphered_n = {}
+    for n in n_values:
+        with tracing.span("cipher.n"):
+            deciphered_n[n] = cipher.get_throttling(n)
+    index = player_index.get_player_index()
+    if index is not None and cipher.index_changed:
+        index.save(url_js, cipher.to_index())
+    return deciphered_signatures, deciphered_n
+
+
+def finish_signature(
+    stream_manifest: List[Dict], prepared: List[SignedUrl], signatures: Dict[str, str], n_values: Dict[str, str]
+) -> None:
+    """Put deciphered signatures and n values into the urls of stream_manifest"""
+    for signed in prepared:
+        query_params = signed.query_params
+        if signed.signature is not None:
+            query_params['sig'] = signatures[signed.signature]
             logger.debug(
-                "finished descrambling signature for itag=%s", stream["itag"]
+                "finished descrambling signature for itag=%s", stream_manifest[signed.index]["itag"]
             )
+        if 'n' in query_params:
+            query_params['n'] = n_values[query_params['n']]
+        parsed_url = signed.parsed_url
+        url = f'{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}?{parse.urlencode(query_params)}'  # noqa:E501
 
-            query_params['sig'] = signature
-
-        if 'n' in query_params.keys():
-            # For WEB-based clients, YouTube sends an "n" parameter that throttles download speed.
-            # To decipher the value of "n", we must interpret the player's JavaScript.
-
-            initial_n = query_params['n']
+        stream_manifest[signed.index]["url"] = url
 
-            # Check if any previous stream decrypted the parameter
-            if initial_n not in discovered_n:
-                discovered_n[initial_n] = cipher.get_throttling(initial_n)
 
-            new_n = discovered_n[initial_n]
-            query_params['n'] = new_n
+def apply_signature(stream_manifest: Dict, vid_info: Dict, js: str, url_js: str) -> None:
+    """Apply the decrypted signature to the stream manifest.
 
-        url = f'{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}?{parse.urlencode(query_params)}'  # noqa:E501
+    :param dict stream_manifest:
+        Details of the media streams available.
+    :param str js:
+        The contents of the base.js asset file.
+    :param str url_js:
+        Full base.js url
 
-        stream_manifest[i]["url"] = url
+    """
+    prepared = prepare_signature(stream_manifest, vid_info)
+    # every n value and signature is deciphered once, streams often share them
+    signatures = {p.signature for p in prepared if p.signature is not None}
+    n_values = {p.query_params["n"] for p in prepared if "n" in p.query_params}
+    deciphered_signatures, deciphered_n = decipher(js, url_js, signatures, n_values)
+    finish_signature(stream_manifest, prepared, deciphered_signatures, deciphered_n)
+
+
+async def async_apply_signature(stream_manifest: Dict, vid_info: Dict, js: str, url_js: str) -> None:
+    """apply_signature through the installed DecipherService, in place when there is none"""
+    service = decipher_service.get_decipher_service()
+    if service is None:
+        apply_signature(stream_manifest, vid_info, js, url_js)
+        return
+    prepared = prepare_signature(stream_manifest, vid_info)
+    signatures = {p.signature for p in prepared if p.signature is not None}
+    n_values = {p.query_params["n"] for p in prepared if "n" in p.query_params}
+    deciphered_signatures, deciphered_n = await service.decipher(js, url_js, signatures, n_values)
+    finish_signature(stream_manifest, prepared, deciphered_signatures, deciphered_n)
 
 
 def apply_descrambler(stream_data: Dict) -> Optional[List[Dict]]:
@@ -0,0 +1,333 @@
+"""Selection of streams by a compact expression.
+
+    bv[height<=1080][tbr<8M][vcodec^=vp9]/bv[height<=1080][vcodec^=avc1]
+    (bv[height<=1080][vcodec^=vp9]/bv[height<=1080][vcodec^=avc1])+ba[acodec=opus][default]
+    b[ext=mp4]/b
+
+Selectors:
+    b, best      best stream with video and audio     w, worst     worst of them
+    bv           best video only stream               wv           worst video only
+    ba           best audio only stream               wa           worst audio only
+Video is ranked by height, fps and bitrate, audio by bitrate.
+
+Filters in brackets:
+    [field op value]  op is one of = != < <= > >= ^= (starts with) $= (ends with) *= (contains)
+    [flag] [!flag]
+numeric fields: height width fps tbr (bitrate, bits per second) abr (average bitrate)
+    asr (audio sample rate) filesize itag; values take k, M and G suffixes (8M, 128k)
+string fields: ext vcodec acodec mime quality track (audio track id) lang (audio track name)
+flags: default (default audio track) hdr otf 3d dash
+
+A/B takes the first alternative that matched, A+B is a pair of streams, parentheses
+group. Expressions are compiled once (compile_selector is cached) and a compiled
+selector finds all its candidates in one pass over the streams:
+
+    selector = compile_selector("bv[height<=720]+ba/b")
+    video, audio = selector.select(streams)
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+from .exceptions import YoutubeClientError
+
+
+class SelectorSyntaxError(YoutubeClientError):
+    def __init__(self, expression: str, position: int, message: str):
+        super().__init__(f"{message} at {position} in {expression!r}")
+        self.expression = expression
+        self.position = position
+
+
+def _sample_rate(s) -> Optional[int]:
+    return int(s.audio_sample_rate) if s.audio_sample_rate else None
+
+
+# Stream fields are properties over Stream.raw, the hot ones are read from raw directly
+_numeric_fields = {
+    "height": lambda s: s.raw.get("height"),
+    "width": lambda s: s.raw.get("width"),
+    "fps": lambda s: s.raw.get("fps"),
+    "tbr": lambda s: s.raw.get("bitrate"),
+    "abr": lambda s: s.raw.get("averageBitrate"),
+    "asr": _sample_rate,
+    "filesize": lambda s: s._content_lenght or None,
+    "itag": lambda s: int(s.itag),
+}
+_string_fields = {
+    "ext": lambda s: s._mime_info[3],
+    "vcodec": lambda s: s._mime_info[4],
+    "acodec": lambda s: s._mime_info[5],
+    "mime": lambda s: s._mime_info[0],
+    "quality": lambda s: s.quality_label,
+    "track": lambda s: s.audio_track_info.id if s.audio_track_info else None,
+    "lang": lambda s: s.audio_track_info.name if s.audio_track_info else None,
+}
+_flags = {
+    # a stream without audio tracks is the only, so the default, track
+    "default": lambda s: s.audio_track_info.is_default if s.audio_track_info else True,
+    "hdr": lambda s: s.is_hdr,
+    "otf": lambda s: bool(s.is_otf),
+    "3d": lambda s: s.is_3d,
+    "dash": lambda s: s.is_dash,
+}
+_suffixes = {"k": 1e3, "K": 1e3, "m": 1e6, "M": 1e6, "g": 1e9, "G": 1e9}
+
+_numeric_ops = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+_string_ops = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "^=": lambda a, b: a.startswith(b),
+    "$=": lambda a, b: a.endswith(b),
+    "*=": lambda a, b: b in a,
+}
+
+
+def _video_key(s) -> tuple:
+    raw = s.raw
+    return (raw.get("height") or 0, raw.get("fps") or 0, raw.get("bitrate") or 0)
+
+
+def _audio_key(s) -> tuple:
+    return (s.raw.get("bitrate") or 0, _sample_rate(s) or 0)
+
+
+def _muxed(s) -> bool:
+    mime = s._mime_info  # (mime_type, codecs, type, ext, video_codec, audio_codec)
+    return mime[4] is not None and mime[5] is not None
+
+
+def _video_only(s) -> bool:
+    mime = s._mime_info  # (mime_type, codecs, type, ext, video_codec, audio_codec)
+    return mime[4] is not None and mime[5] is None
+
+
+def _audio_only(s) -> bool:
+    mime = s._mime_info  # (mime_type, codecs, type, ext, video_codec, audio_codec)
+    return mime[5] is not None and mime[4] is None
+
+
+# name: (kind check, ranking key, worst)
+_bases = {
+    "b": (_muxed, _video_key, False),
+    "w": (_muxed, _video_key, True),
+    "bv": (_video_only, _video_key, False),
+    "wv": (_video_only, _video_key, True),
+    "ba": (_audio_only, _audio_key, False),
+    "wa": (_audio_only, _audio_key, True),
+}
+_bases.update({
+    "best": _bases["b"],
+    "worst": _bases["w"],
+    "bestvideo": _bases["bv"],
+    "worstvideo": _bases["wv"],
+    "bestaudio": _bases["ba"],
+    "worstaudio": _bases["wa"],
+})
+
+_base_regex = re.compile(r"[a-z]+")
+_filter_regex = re.compile(r"\[\s*(!?)([\w]+)\s*(?:(!=|<=|>=|\^=|\$=|\*=|=|<|>)\s*([^\]]*?)\s*)?\]")
+
+
+class _Leaf:
+    __slots__ = ("index", "checks", "key", "worst")
+
+    def __init__(self, index: int, checks: List[Callable[[Any], bool]], key: Callable, worst: bool):
+        self.index = index
+        self.checks = checks
+        self.key = key
+        self.worst = worst
+
+    def resolve(self, found: list):
+        return found[self.index]
+
+
+class _Alternatives:
+    __slots__ = ("options",)
+
+    def __init__(self, options: list):
+        self.options = options
+
+    def resolve(self, found: list):
+        for option in self.options:
+            result = option.resolve(found)
+            if result is not None:
+                return result
+        return None
+
+
+class _Pair:
+    __slots__ = ("video", "audio")
+
+    def __init__(self, video, audio):
+        self.video = video
+        self.audio = audio
+
+    def resolve(self, found: list):
+        video = self.video.resolve(found)
+        if video is None:
+            return None
+        audio = self.audio.resolve(found)
+        if audio is None:
+            return None
+        return video, audio
+
+
+def _contains_pair(node) -> bool:
+    if isinstance(node, _Pair):
+        return True
+    if isinstance(node, _Alternatives):
+        return any(_contains_pair(option) for option in node.options)
+    return False
+
+
+def _compare(getter: Callable, op: Callable, value: Union[float, str]) -> Callable[[Any], bool]:
+    """Streams without the field never match"""
+    def check(s) -> bool:
+        v = getter(s)
+        return v is not None and op(v, value)
+    return check
+
+
+class _Parser:
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.position = 0
+        self.leaves: List[_Leaf] = []
+
+    def error(self, message: str):
+        raise SelectorSyntaxError(self.expression, self.position, message)
+
+    def skip_spaces(self):
+        while self.position < len(self.expression) and self.expression[self.position].isspace():
+            self.position += 1
+
+    def peek(self) -> str:
+        self.skip_spaces()
+        return self.expression[self.position] if self.position < len(self.expression) else ""
+
+    def parse(self):
+        node = self.alternatives()
+        if self.peek():
+            self.error(f"unexpected {self.peek()!r}")
+        return node
+
+    def alternatives(self):
+        options = [self.pair()]
+        while self.peek() == "/":
+            self.position += 1
+            options.append(self.pair())
+        return options[0] if len(options) == 1 else _Alternatives(options)
+
+    def pair(self):
+        video = self.atom()
+        if self.peek() != "+":
+            return video
+        self.position += 1
+        audio = self.atom()
+        if self.peek() == "+":
+            self.error("only two streams can be paired")
+        if _contains_pair(video) or _contains_pair(audio):
+            self.error("a pair can not contain a pair")
+        return _Pair(video, audio)
+
+    def atom(self):
+        if self.peek() == "(":
+            self.position += 1
+            node = self.alternatives()
+            if self.peek() != ")":
+                self.error("expected ')'")
+            self.position += 1
+            return node
+        return self.leaf()
+
+    def leaf(self) -> _Leaf:
+        self.skip_spaces()
+        match = _base_regex.match(self.expression, self.position)
+        if not match or match.group() not in _bases:
+            self.error("expected selector like b, bv or ba")
+        kind, key, worst = _bases[match.group()]
+        self.position = match.end()
+        checks = [kind]
+        while self.peek() == "[":
+            checks.append(self.filter())
+        leaf = _Leaf(len(self.leaves), checks, key, worst)
+        self.leaves.append(leaf)
+        return leaf
+
+    def filter(self) -> Callable[[Any], bool]:
+        match = _filter_regex.match(self.expression, self.position)
+        if not match:
+            self.error("bad filter")
+        negate, name, op, value = match.groups()
+        if op is None:
+            flag = _flags.get(name)
+            if flag is None:
+                self.error(f"unknown flag {name!r}")
+            self.position = match.end()
+            return (lambda s: not flag(s)) if negate else flag
+        if negate:
+            self.error("! is only for flags")
+        if name in _numeric_fields:
+            if op not in _numeric_ops:
+                self.error(f"{op} is not for numbers")
+            number = value[:-1] if value[-1:] == "p" else value
+            multiplier = _suffixes.get(number[-1:], 1)
+            try:
+                number = float(number[:-1] if multiplier != 1 else number) * multiplier
+            except ValueError:
+                self.error(f"{value!r} is not a number")
+            check = _compare(_numeric_fields[name], _numeric_ops[op], number)
+        elif name in _string_fields:
+            if op not in _string_ops:
+                self.error(f"{op} is not for strings")
+            check = _compare(_string_fields[name], _string_ops[op], value)
+        else:
+            self.error(f"unknown field {name!r}")
+        self.position = match.end()
+        return check
+
+
+class FormatSelector:
+    """Compiled selector expression, use compile_selector"""
+
+    def __init__(self, expression: str):
+        parser = _Parser(expression)
+        self.expression: str = expression
+        self._root = parser.parse()
+        self._leaves: Tuple[Tuple[int, Tuple[Callable, ...], Callable, bool], ...] = tuple(
+            (leaf.index, tuple(leaf.checks), leaf.key, leaf.worst) for leaf in parser.leaves
+        )
+
+    def select(self, streams) -> Union[None, Any, Tuple[Any, Any]]:
+        """Best stream, (video, audio) for pair selectors, None when nothing matched"""
+        count = len(self._leaves)
+        found: list = [None] * count
+        keys: list = [None] * count
+        for s in streams:
+            for index, checks, key, worst in self._leaves:
+                for check in checks:
+                    if not check(s):
+                        break
+                else:
+                    k = key(s)
+                    current = keys[index]
+                    if current is None or (k < current if worst else k > current):
+                        found[index] = s
+                        keys[index] = k
+        return self._root.resolve(found)
+
+    def __repr__(self) -> str:
+        return f"<FormatSelector {self.expression}/>"
+
+
+@lru_cache(maxsize=256)
+def compile_selector(expression: str) -> FormatSelector:
+    return FormatSelector(expression)
@@ -5,6 +5,7 @@ import os
 import re
 import sys
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from random import choice
 from string import ascii_lowercase, ascii_uppercase
@@ -284,6 +285,69 @@ def can_convert_to_int(s):
         return False
 
 
+class DictPath:
+    """Path of get_from_dict split once, use compile_path to get the cached one.
+
+    title = compile_path("videoDetails|title")
+    title(initial_player) == get_from_dict(initial_player, "videoDetails|title")"""
+
+    __slots__ = ("path", "keys", "_subscripts")
+
+    def __init__(self, path: str, separator: str = "|", int_include: bool = False):
+        self.path: str = path
+        # (key, list index or None)
+        self.keys: tuple = tuple(
+            (x, int(x) if int_include and x.lstrip("-").isdigit() else None)
+            for x in path.split(separator.strip())
+        )
+        # plain subscripts, source["videoDetails"]["title"], when no key is a list index
+        self._subscripts: Optional[tuple] = (
+            tuple(key for key, _ in self.keys) if all(index is None for _, index in self.keys) else None
+        )
+
+    def get(self, source: dict, default: Any = None, throw_ex: bool = True) -> Any:
+        if self._subscripts is not None:
+            val = source
+            try:
+                for key in self._subscripts:
+                    val = val[key]
+                return val
+            except (KeyError, TypeError, IndexError):
+                pass
+        val = source
+        for i, (key, index) in enumerate(self.keys):
+            if index is not None and isinstance(val, list):
+                val = val[index] if -len(val) <= index < len(val) else NoneDictElement
+            elif isinstance(val, dict):
+                val = val.get(key, NoneDictElement)
+            else:
+                # None or a list on the way is a missing key
+                val = NoneDictElement
+            if val is NoneDictElement:
+                if not throw_ex:
+                    return default
+                self._raise(i)
+        return val
+
+    __call__ = get
+
+    def _raise(self, i: int):
+        path_r = [key for key, _ in self.keys]
+        last_last_val = '["' + path_r[i - 1] + '"]' if i - 1 >= 0 else None
+        raise KeyError(
+            f"helper.get_from_dict {last_last_val if last_last_val else str() }\n"
+            + str(path_r)
+        )
+
+    def __repr__(self) -> str:
+        return f"<DictPath {self.path}/>"
+
+
+@lru_cache(maxsize=1024)
+def compile_path(path: str, separator: str = "|", int_include: bool = False) -> DictPath:
+    return DictPath(path, separator, int_include)
+
+
 def get_from_dict(
     source: dict,
     path: str,
@@ -292,20 +356,4 @@ def get_from_dict(
     throw_ex: bool = True,
     int_include: bool = False,
 ) -> Any:
-    path_r = path.split(separator.strip())
-    val = source
-    for i, x in enumerate(path_r):
-        if isinstance(val, list) and int_include:
-            val = val[int(x)]
-        else:
-            val = val.get(x, NoneDictElement)
-        if val == NoneDictElement:
-            if not throw_ex:
-                return default
-            # last_val = '"[' + path_r[i] + '"]'
-            last_last_val = '["' + path_r[i - 1] + '"]' if i - 1 >= 0 else None
-            raise KeyError(
-                f"helper.get_from_dict {last_last_val if last_last_val else str() }\n"
-                + str(path_r)
-            )
-    return val
\ No newline at end of file
+    return compile_path(path, separator, int_include).get(source, default, throw_ex)
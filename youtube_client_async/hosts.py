@@ -0,0 +1,158 @@
+"""Failover between googlevideo cache hosts.
+
+A stream url is served by one edge (rr3---sn-4g5ednsz.googlevideo.com), but
+its query names the mirrors that hold the same media: mn is the list of
+server names, fvip and mvi the replica numbers. Any of
+rr{fvip}---{mn}.googlevideo.com accepts the same signed url.
+
+HostPool measures throughput and errors of every host. A range that fails or
+runs much slower than the best known host is retried on another one from the
+already received offset.
+
+    pool = yc.HostPool()
+    await yc.simple_download(stream, "out/video", hosts=pool)
+    print(pool.to_dict())
+"""
+import time
+from typing import Dict, List, Optional
+from urllib import parse
+
+
+class HostStats:
+    __slots__ = ("host", "bytes", "seconds", "ranges", "errors", "throughput", "failed_at")
+
+    def __init__(self, host: str):
+        self.host: str = host
+        self.bytes: int = 0
+        self.seconds: float = 0.0
+        self.ranges: int = 0
+        self.errors: int = 0
+        self.throughput: Optional[float] = None  # smoothed bytes per second
+        self.failed_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "ranges": self.ranges,
+            "errors": self.errors,
+            "throughput": self.throughput,
+        }
+
+    def __repr__(self) -> str:
+        return f"<HostStats {self.host} throughput={self.throughput} errors={self.errors}/>"
+
+
+def alternate_hosts(url: str) -> List[str]:
+    """Host of url followed by the mirrors from its mn, fvip and mvi parameters"""
+    split_url = parse.urlsplit(url)
+    hosts = [split_url.netloc]
+    if not split_url.netloc.endswith(".googlevideo.com"):
+        return hosts
+    query = parse.parse_qs(split_url.query)
+    names = [name for value in query.get("mn", []) for name in value.split(",") if name]
+    replicas = [r for r in (query.get("fvip", [None])[0], query.get("mvi", [None])[0]) if r and r.isdigit()]
+    for replica in replicas:
+        for name in names:
+            host = f"rr{replica}---{name}.googlevideo.com"
+            if host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+def with_host(url: str, host: str) -> str:
+    return parse.urlsplit(url)._replace(netloc=host).geturl()
+
+
+class HostPool:
+    """Statistics of googlevideo hosts shared by downloads.
+
+    :param float min_throughput:
+        bytes per second under which a range is moved to another host,
+        by default a range is slow when it is under slow_ratio of the best host
+    :param float slow_after:
+        seconds a range runs before its speed is judged
+    :param float cooldown:
+        seconds a failed host is not chosen while other hosts are available
+    """
+
+    def __init__(
+        self,
+        min_throughput: Optional[float] = None,
+        slow_ratio: float = 0.25,
+        slow_after: float = 3.0,
+        cooldown: float = 30.0,
+        smoothing: float = 0.3,
+    ):
+        self.min_throughput: Optional[float] = min_throughput
+        self.slow_ratio: float = slow_ratio
+        self.slow_after: float = slow_after
+        self.cooldown: float = cooldown
+        self.smoothing: float = smoothing
+        self.hosts: Dict[str, HostStats] = {}
+        self._candidates: Dict[str, List[str]] = {}
+
+    def stats(self, host: str) -> HostStats:
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = HostStats(host)
+        return stats
+
+    def candidates(self, url: str) -> List[str]:
+        # every range of a download has the same url, only the range changes
+        hosts = self._candidates.get(url)
+        if hosts is None:
+            if len(self._candidates) > 64:
+                self._candidates.clear()
+            hosts = self._candidates[url] = alternate_hosts(url)
+        return hosts
+
+    def _cooling(self, stats: HostStats, now: float) -> bool:
+        return stats.failed_at is not None and now - stats.failed_at < self.cooldown
+
+    def choose(self, url: str) -> str:
+        """url on the fastest host that did not fail recently, the original host is tried first"""
+        hosts = self.candidates(url)
+        if len(hosts) == 1:
+            return url
+        now = time.monotonic()
+        available = [self.stats(h) for h in hosts if not self._cooling(self.stats(h), now)]
+        if not available:
+            # everything failed recently, the host that failed longest ago gets the next try
+            available = [min((self.stats(h) for h in hosts), key=lambda s: s.failed_at)]
+        best = max(available, key=lambda s: s.throughput or 0.0)
+        return url if best.host == hosts[0] else with_host(url, best.host)
+
+    def observe(self, url: str, size: int, duration: float):
+        stats = self.stats(parse.urlsplit(url).netloc)
+        stats.ranges += 1
+        stats.bytes += size
+        stats.seconds += duration
+        if size <= 0 or duration <= 0:
+            return
+        throughput = size / duration
+        if stats.throughput is None:
+            stats.throughput = throughput
+        else:
+            stats.throughput += self.smoothing * (throughput - stats.throughput)
+
+    def fail(self, url: str):
+        stats = self.stats(parse.urlsplit(url).netloc)
+        stats.errors += 1
+        stats.failed_at = time.monotonic()
+
+    def is_slow(self, url: str, received: int, elapsed: float) -> bool:
+        """Whether a range running for elapsed seconds should be moved to another host"""
+        if elapsed < self.slow_after or len(self.candidates(url)) == 1:
+            return False
+        throughput = received / elapsed
+        if self.min_throughput:
+            return throughput < self.min_throughput
+        best = max((s.throughput or 0.0 for s in self.hosts.values()), default=0.0)
+        return throughput < best * self.slow_ratio
+
+    def to_dict(self) -> dict:
+        return {host: stats.to_dict() for host, stats in self.hosts.items()}
+
+    def __repr__(self) -> str:
+        return f"<HostPool hosts={len(self.hosts)}/>"
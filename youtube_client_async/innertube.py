@@ -3,7 +3,7 @@ import os
 import time
 from typing import Optional
 
-from . import helpers, net
+from . import helpers, net, tracing
 from .helpers import logger  # TODO logging innertube
 
 # YouTube on TV client secrets
@@ -552,7 +552,8 @@ class InnerTube:
 
             headers["Authorization"] = f"Bearer {self.access_token}"
         headers.update(self.header)
-        res = await self.net_obj.post_json(endpoint, query, data, headers)
+        with tracing.span("innertube." + endpoint.rsplit("/", 1)[-1]):
+            res = await self.net_obj.post_json(endpoint, query, data, headers)
         return res
 
     async def browse(self, browse_id=None, continuation=None) -> dict:
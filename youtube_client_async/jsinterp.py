@@ -446,9 +446,13 @@ class JSInterpreter:
         'y': 4096,  # Perform a "sticky" search that matches starting at the current position in the target string
     }
 
-    def __init__(self, code, objects=None):
+    def __init__(self, code, objects=None, function_code=None, object_code=None):
         self.code, self._functions = code, {}
         self._objects = {} if objects is None else objects
+        # sources found in code by name, searching megabytes of code is the slow part
+        # of every call_function; the maps can be saved and passed to a new interpreter
+        self.function_code = {} if function_code is None else function_code
+        self.object_code = {} if object_code is None else object_code
 
     class Exception(Exception):
         def __init__(self, msg, expr=None, *args, **kwargs):
@@ -1028,16 +1032,18 @@ class JSInterpreter:
     def extract_object(self, objname):
         _FUNC_NAME_RE = r'''(?:[a-zA-Z$0-9]+|"[a-zA-Z$0-9]+"|'[a-zA-Z$0-9]+')'''
         obj = {}
-        obj_m = re.search(
-            r'''(?x)
-                (?<!\.)%s\s*=\s*{\s*
-                    (?P<fields>(%s\s*:\s*function\s*\(.*?\)\s*{.*?}(?:,\s*)?)*)
-                }\s*;
-            ''' % (re.escape(objname), _FUNC_NAME_RE),
-            self.code)
-        if not obj_m:
-            raise self.Exception(f'Could not find object {objname}')
-        fields = obj_m.group('fields')
+        fields = self.object_code.get(objname)
+        if fields is None:
+            obj_m = re.search(
+                r'''(?x)
+                    (?<!\.)%s\s*=\s*{\s*
+                        (?P<fields>(%s\s*:\s*function\s*\(.*?\)\s*{.*?}(?:,\s*)?)*)
+                    }\s*;
+                ''' % (re.escape(objname), _FUNC_NAME_RE),
+                self.code)
+            if not obj_m:
+                raise self.Exception(f'Could not find object {objname}')
+            fields = self.object_code[objname] = obj_m.group('fields')
         # Currently, it only supports function definitions
         r = r'''(?x)
                 (?P<key>%s)\s*:\s*function\s*\((?P<args>(?:%s|,)*)\){(?P<code>[^}]+)}
@@ -1052,6 +1058,9 @@ class JSInterpreter:
 
     def extract_function_code(self, funcname):
         """ @returns argnames, code """
+        found = self.function_code.get(funcname)
+        if found is not None:
+            return found
         func_m = re.search(
             r'''(?xs)
                 (?:
@@ -1065,7 +1074,8 @@ class JSInterpreter:
         if func_m is None:
             raise self.Exception(f'Could not find JS function "{funcname}"')
         code, _ = self._separate_at_paren(func_m.group('code'))
-        return [x.strip() for x in func_m.group('args').split(',')], code
+        found = self.function_code[funcname] = ([x.strip() for x in func_m.group('args').split(',')], code)
+        return found
 
     def extract_function(self, funcname):
         return function_with_repr(
@@ -0,0 +1,265 @@
+"""Recording of live streams by sq segments.
+
+Live streams are served by segments like OTF streams, but new segments keep
+appearing. Every segment response has X-Head-Seqnum header with the number
+of the newest segment (live edge), the recorder follows it.
+
+    live = await yc.get_live_video(url, sr, it)
+    stream = (await live.get_streams()).filter(only_audio=True).first
+    recorder = live.get_recorder(stream, rewind=100)  # 100 segments back, needs DVR
+    with yc.RollingOutput("records/live", stream.ext, max_bytes=512 * 1024 * 1024) as output:
+        await recorder.record(output)  # until stream ends or recorder.stop()
+
+Recordings longer than the validity of the url need a StreamHandle instead of
+the stream, live.get_recorder(live.get_stream_handle(stream)), the url is then
+renewed before it expires or after 403.
+"""
+import asyncio
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+
+from . import exceptions, net, stream, tracing
+from .helpers import logger
+from .stream_handle import StreamHandle
+
+
+class LiveRecordingError(exceptions.YoutubeClientError):
+    """Live stream can not be recorded"""
+
+
+class RollingOutput:
+    """Writes segments to "{path}.{ext}" or, with max_bytes, to numbered files
+    "{path}.{part}.{ext}" starting a new file when the current is over max_bytes.
+    With keep only the last keep files are left on disk."""
+
+    def __init__(self, path: str, ext: str, max_bytes: Optional[int] = None, keep: Optional[int] = None):
+        self.path: str = path
+        self.ext: str = ext
+        self.max_bytes: Optional[int] = max_bytes
+        self.keep: Optional[int] = keep
+        self.files: List[str] = []
+        self.written: int = 0
+        self._file = None
+        self._file_bytes: int = 0
+
+    def _open_next(self):
+        if self._file:
+            self._file.close()
+        if self.max_bytes:
+            name = f"{self.path}.{len(self.files):05}.{self.ext}"
+        else:
+            name = f"{self.path}.{self.ext}"
+        self._file = open(name, "wb")
+        self._file_bytes = 0
+        self.files.append(name)
+        if self.keep and len(self.files) > self.keep:
+            old = self.files[-self.keep - 1]
+            if os.path.exists(old):
+                os.remove(old)
+
+    def write(self, data: bytes):
+        """Segments are never split between files"""
+        if self._file is None or (self.max_bytes and self._file_bytes >= self.max_bytes):
+            self._open_next()
+        self._file.write(data)
+        self._file_bytes += len(data)
+        self.written += len(data)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<RollingOutput {self.path} files={len(self.files)} written={self.written}/>"
+
+
+class LiveRecorder:
+    """Follows the live edge of a live stream.
+
+    :param stream:
+        stream or StreamHandle, the url of a handle is renewed during long recordings
+    :param int readahead:
+        count of segments fetched at once
+    :param int rewind:
+        count of segments before the live edge to start from (DVR)
+    :param float idle_timeout:
+        seconds without new segments after which the stream is considered ended
+    """
+
+    def __init__(
+        self,
+        stream: Union[stream.Stream, StreamHandle],
+        net_obj: Optional[net.SessionRequest] = None,
+        readahead: int = 3,
+        rewind: int = 0,
+        segment_duration: Optional[float] = None,
+        idle_timeout: float = 60.0,
+        timeout: int = 10,
+        max_retries: int = 3,
+    ):
+        self.handle: Optional[StreamHandle] = stream if isinstance(stream, StreamHandle) else None
+        self.stream: stream.Stream = self.handle.stream if self.handle else stream
+        self.net_obj: net.SessionRequest = net_obj if net_obj else self.stream.net_obj
+        self.readahead: int = max(1, readahead)
+        self.rewind: int = rewind
+        self.segment_duration: float = (
+            segment_duration if segment_duration else float(stream.raw.get("targetDurationSec", 5))
+        )
+        self.idle_timeout: float = idle_timeout
+        self.timeout: int = timeout
+        self.max_retries: int = max_retries
+        self.head_seq: Optional[int] = None
+        self.next_seq: Optional[int] = None
+        self.recorded_segments: int = 0
+        self.recorded_bytes: int = 0
+        self._stopped: bool = False
+
+    def stop(self):
+        """Stop after the current segment"""
+        self._stopped = True
+
+    def _update_head(self, headers):
+        value = headers.get("X-Head-Seqnum")
+        if value is not None and value.isdigit():
+            head = int(value)
+            if self.head_seq is None or head > self.head_seq:
+                self.head_seq = head
+
+    async def _current_url(self) -> str:
+        if self.handle:
+            self.stream = await self.handle.get_stream()
+        return self.stream.url
+
+    async def _probe_head(self) -> int:
+        await self._current_url()
+        try:
+            self._update_head(await self.net_obj._get_headers("HEAD", self.stream.url))
+        except aiohttp.ClientResponseError:
+            pass
+        if self.head_seq is None:
+            headers = await self.net_obj._get_headers("GET", net.seq_url(self.stream.url, 0))
+            self._update_head(headers)
+        if self.head_seq is None:
+            raise LiveRecordingError(f"itag {self.stream.itag} has no X-Head-Seqnum, is it a live stream?")
+        return self.head_seq
+
+    async def _fetch(self, seq_num: int) -> Optional[bytes]:
+        """Segment or None if it is not available yet"""
+        retries = 0
+        renewed = False
+        while True:
+            url = await self._current_url()
+            try:
+                with tracing.span("live.segment", activate=False, sq=seq_num, attempt=retries):
+                    response = await self.net_obj._send("GET", net.seq_url(url, seq_num), timeout=self.timeout)
+                    try:
+                        self._update_head(response.headers)
+                        if response.status in (204, 404, 416):
+                            return None
+                        data = await response.content.read()
+                    finally:
+                        response.close()
+                if self.net_obj.metrics:
+                    self.net_obj.metrics.observe_bytes_in("GET", url, len(data))
+                return data if data else None
+            except aiohttp.ClientResponseError as e:
+                if e.status in (404, 416):
+                    return None
+                if e.status != 403 or not self.handle or renewed:
+                    raise
+                renewed = True
+                self.stream = await self.handle.refresh(url)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                retries += 1
+                if retries > self.max_retries:
+                    raise
+
+    async def segments(self) -> AsyncIterator[Tuple[int, bytes]]:
+        """Yield (sq, segment) in order until the stream ends or stop() is called"""
+        head = await self._probe_head()
+        self.next_seq = max(0, head - self.rewind)
+        logger.info(f"live itag={self.stream.itag} head={head} starting from {self.next_seq}")
+        loop = asyncio.get_running_loop()
+        pending: Dict[int, asyncio.Future] = {}
+        launched = self.next_seq
+        idle_since = loop.time()
+        # the request of next_seq was sent after it was found missing
+        fresh = False
+        try:
+            while not self._stopped:
+                # Segments up to one after the known head are requested, the head moves
+                # forward from the headers of every response.
+                while len(pending) < self.readahead and launched <= self.head_seq + 1:
+                    if launched not in pending:
+                        pending[launched] = asyncio.ensure_future(self._fetch(launched))
+                    launched += 1
+                if self.next_seq not in pending:
+                    pending[self.next_seq] = asyncio.ensure_future(self._fetch(self.next_seq))
+                    launched = max(launched, self.next_seq + 1)
+                data = await pending.pop(self.next_seq)
+                if data is None:
+                    if not fresh:
+                        # prefetched before it was published, it may be there by now
+                        fresh = True
+                        continue
+                    if loop.time() - idle_since > self.idle_timeout:
+                        logger.info(f"live itag={self.stream.itag} no new segments, stream ended")
+                        return
+                    await asyncio.sleep(self.segment_duration)
+                    # Prefetches that found nothing before the wait are requested again
+                    # together instead of each costing another wait.
+                    for seq in [seq for seq, task in pending.items() if _found_nothing(task)]:
+                        del pending[seq]
+                    launched = self.next_seq
+                    continue
+                fresh = False
+                idle_since = loop.time()
+                self.recorded_segments += 1
+                self.recorded_bytes += len(data)
+                yield self.next_seq, data
+                self.next_seq += 1
+        finally:
+            _drop(pending)
+
+    async def record(self, output: RollingOutput, max_segments: Optional[int] = None) -> int:
+        """Write segments to output, returns count of written bytes"""
+        written = 0
+        segments = self.segments()
+        with tracing.span("live.record", itag=self.stream.itag) as sp:
+            try:
+                async for _, data in segments:
+                    output.write(data)
+                    written += len(data)
+                    if max_segments and self.recorded_segments >= max_segments:
+                        break
+            finally:
+                await segments.aclose()
+            sp.set_attribute("segments", self.recorded_segments)
+        return written
+
+    def __repr__(self) -> str:
+        return f"<LiveRecorder itag={self.stream.itag} next={self.next_seq} head={self.head_seq}/>"
+
+
+def _found_nothing(task: asyncio.Future) -> bool:
+    return task.done() and not task.cancelled() and task.exception() is None and task.result() is None
+
+
+def _drop(pending: Dict[int, asyncio.Future]):
+    for task in pending.values():
+        if task.done():
+            # errors of prefetches that are not needed anymore are not reported
+            if not task.cancelled():
+                task.exception()
+        else:
+            task.cancel()
+    pending.clear()
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 from urllib import parse
 
-from . import extract, helpers, innertube, net, thumbnail, video
+from . import extract, helpers, innertube, live_recorder, net, stream, stream_handle, thumbnail, video
 
 
 def get_live_url(id: str) -> str:
@@ -196,7 +196,17 @@ class LiveVideo(video.VideoBase):
 
     @property
     def live_chunk_readahead(self) -> Optional[int]:
-        return self.initial_player["videoDetails"]["liveChunkReadahead"]
+        return self.initial_player["videoDetails"].get("liveChunkReadahead")
+
+    def get_recorder(
+        self, stream: Union[stream.Stream, stream_handle.StreamHandle], rewind: int = 0, **kwargs
+    ) -> live_recorder.LiveRecorder:
+        """Recorder of stream from get_streams() or of its get_stream_handle(). rewind is
+        count of segments before the live edge to start from, it needs DVR"""
+        if rewind and not self.is_dvr_enabled:
+            raise live_recorder.LiveRecordingError(f"{self.video_id} has no DVR, rewind is not possible")
+        kwargs.setdefault("readahead", self.live_chunk_readahead or 3)
+        return live_recorder.LiveRecorder(stream, self.net_obj, rewind=rewind, **kwargs)
 
     @property
     def is_low_latency(self) -> bool:
@@ -0,0 +1,250 @@
+"""Stream manifests of many videos at once.
+
+get_streams of every video makes its own player request and deciphers its
+own signatures. ManifestResolver makes the player requests concurrently,
+groups the videos by player js and deciphers all signatures and n values
+of a group together, every distinct value once. Deciphering runs in a
+DecipherService on the given executor, with a ProcessPoolExecutor it uses all
+cores, or in the installed DecipherService when no executor is given.
+
+    with ProcessPoolExecutor() as pool:
+        resolver = yc.ManifestResolver(sr, executor=pool)
+        manifests = await resolver.resolve(video_ids)
+    for video_id, streams in manifests.items():
+        if isinstance(streams, Exception):
+            continue
+        print(video_id, streams.select("bv+ba"))
+"""
+import asyncio
+import concurrent.futures
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib import parse
+
+from . import decipher_service, exceptions, extract, innertube, net, playable, stream, tracing
+from .helpers import logger
+from .video import get_video_url
+
+
+class _Pending:
+    """Video in the batch"""
+    __slots__ = ("video_id", "playable", "player", "js_url", "manifest", "prepared")
+
+    def __init__(self, video_id: str, playable_obj: Optional[playable.PlayableBase]):
+        self.video_id: str = video_id
+        self.playable: Optional[playable.PlayableBase] = playable_obj
+        self.player: Optional[dict] = None
+        self.js_url: Optional[str] = None
+        self.manifest: Optional[List[dict]] = None
+        self.prepared: Optional[List[extract.SignedUrl]] = None
+
+
+def _video_id(video: str) -> str:
+    if "/" not in video:
+        return video
+    parsed_url = parse.urlparse(video)
+    return extract.video_id(parsed_url, parse.parse_qs(parsed_url.query))
+
+
+class ManifestResolver:
+    """Resolver of stream manifests for batches of videos.
+
+    :param int concurrency:
+        count of player requests at once
+    :param executor:
+        executor for deciphering, None is the installed DecipherService or
+        the default thread pool of the loop
+    :param int chunk_size:
+        count of values deciphered by one executor call
+    :param str js_url:
+        player js for all videos given by id, by default it is taken from the
+        watch page of one video of every batch. Videos whose deciphering with
+        it fails are retried with the js of their own watch page, the player changed
+    """
+
+    def __init__(
+        self,
+        net_obj: net.SessionRequest,
+        it: Optional[innertube.InnerTube] = None,
+        concurrency: int = 8,
+        executor: Optional[concurrent.futures.Executor] = None,
+        chunk_size: int = 64,
+        js_url: Optional[str] = None,
+    ):
+        self.net_obj: net.SessionRequest = net_obj
+        # streams of get_streams come from the IOS client
+        if it:
+            self.it = innertube.InnerTube(net_obj, "IOS", it.use_oauth, it.use_oauth, it.token_file, it.gl, it.hl)
+        else:
+            self.it = innertube.InnerTube(net_obj, "IOS")
+        self.concurrency: int = concurrency
+        self.executor: Optional[concurrent.futures.Executor] = executor
+        self.chunk_size: int = chunk_size
+        self.js_url: Optional[str] = js_url
+        self._js: Dict[str, str] = {}
+        # keeps the players whose js was sent to the executor, its workers keep the Ciphers
+        self._service: Optional[decipher_service.DecipherService] = (
+            decipher_service.DecipherService(chunk_size=chunk_size, executor=executor) if executor else None
+        )
+
+    async def resolve(
+        self, videos: Iterable[Union[str, playable.PlayableBase]]
+    ) -> Dict[str, Union[stream.StreamQuery, Exception]]:
+        """StreamQuery or the error for every video id (or url, or playable object).
+        Playable objects keep the player response, so their get_streams does not request it again"""
+        pending = [
+            _Pending(v.video_id, v) if isinstance(v, playable.PlayableBase) else _Pending(_video_id(v), None)
+            for v in videos
+        ]
+        results: Dict[str, Union[stream.StreamQuery, Exception]] = {}
+        with tracing.span("manifest.resolve", count=len(pending)):
+            semaphore = asyncio.Semaphore(self.concurrency)
+            batch_js_url: List[asyncio.Future] = []
+
+            async def load(p: _Pending):
+                async with semaphore:
+                    await self._load_player(p)
+                    p.js_url = await self._get_js_url(p, batch_js_url)
+
+            loaded = await asyncio.gather(*(load(p) for p in pending), return_exceptions=True)
+            groups: Dict[str, List[_Pending]] = {}
+            for p, error in zip(pending, loaded):
+                if isinstance(error, Exception):
+                    results[p.video_id] = error
+                    continue
+                try:
+                    with tracing.span("extract.descrambler"):
+                        p.manifest = extract.apply_descrambler(p.player["streamingData"])
+                    if p.manifest is None:
+                        raise exceptions.VideoUnavailable(p.video_id)
+                    p.prepared = extract.prepare_signature(p.manifest, p.player)
+                except Exception as e:
+                    results[p.video_id] = e
+                    continue
+                groups.setdefault(p.js_url, []).append(p)
+
+            failed = await self._decipher_groups(groups, results)
+            if failed:
+                # the player changed since the batch js url was read, every video gets its own
+                await asyncio.gather(*(self._retry_own_js_url(p, semaphore) for p in failed))
+                groups = {}
+                for p in failed:
+                    if p.js_url is not None:
+                        groups.setdefault(p.js_url, []).append(p)
+                await self._decipher_groups(groups, results)
+        return results
+
+    async def _decipher_groups(
+        self, groups: Dict[str, List[_Pending]], results: Dict[str, Union[stream.StreamQuery, Exception]]
+    ) -> List[_Pending]:
+        """Results of the groups, returns videos of failed groups whose js url was read for the batch"""
+        deciphered = await asyncio.gather(
+            *(self._decipher_group(js_url, group) for js_url, group in groups.items()), return_exceptions=True
+        )
+        failed = []
+        for group, error in zip(groups.values(), deciphered):
+            for p in group:
+                if not isinstance(error, Exception):
+                    results[p.video_id] = self._build(p)
+                    continue
+                results[p.video_id] = error
+                if p.playable is None and self.js_url is None and p.js_url is not None:
+                    failed.append(p)
+        return failed
+
+    async def _retry_own_js_url(self, p: _Pending, semaphore: asyncio.Semaphore):
+        """js_url of the own watch page, None when it is the same player or it can not be read"""
+        batch_js_url = p.js_url
+        try:
+            async with semaphore:
+                p.js_url = await self._page_js_url(p.video_id)
+        except Exception as e:
+            logger.warning(f"js url of {p.video_id} is not readable: {e}")
+            p.js_url = None
+        if p.js_url == batch_js_url:
+            p.js_url = None
+
+    async def _load_player(self, p: _Pending):
+        if p.playable is not None and p.playable._ios_initial_player:
+            p.player = p.playable._ios_initial_player
+            return
+        p.player = await self.it.player(p.video_id)
+        if "streamingData" not in p.player:
+            raise exceptions.VideoUnavailable(p.video_id)
+        if p.playable is not None:
+            p.playable._ios_initial_player = p.player
+
+    async def _get_js_url(self, p: _Pending, batch_js_url: List[asyncio.Future]) -> str:
+        if p.playable is not None:
+            return p.playable._get_js_url()
+        if self.js_url is not None:
+            return self.js_url
+        # the first video of the batch reads the js url for all of them
+        if not batch_js_url:
+            batch_js_url.append(asyncio.ensure_future(self._page_js_url(p.video_id)))
+        try:
+            return await asyncio.shield(batch_js_url[0])
+        except Exception:
+            return await self._page_js_url(p.video_id)
+
+    async def _page_js_url(self, video_id: str) -> str:
+        with tracing.span("extract.js_url"):
+            return extract.js_url(await self.net_obj.get_text(get_video_url(video_id)))
+
+    async def _get_js(self, js_url: str, group: List[_Pending]) -> str:
+        js = self._js.get(js_url)
+        if js is None:
+            js = next((p.playable._js_obj for p in group if p.playable is not None and p.playable._js_obj), None)
+            if js is None:
+                js = await self.net_obj.get_text(js_url)
+            for p in group:
+                if p.playable is not None and not p.playable._js_obj:
+                    p.playable._js_obj = js
+            self._js = {js_url: js}  # one player is current at a time, older ones are not kept
+        return js
+
+    async def _decipher_group(self, js_url: str, group: List[_Pending]):
+        signatures = set()
+        n_values = set()
+        for p in group:
+            for signed in p.prepared:
+                if signed.signature is not None:
+                    signatures.add(signed.signature)
+                if "n" in signed.query_params:
+                    n_values.add(signed.query_params["n"])
+        js = await self._get_js(js_url, group)
+        with tracing.span("manifest.decipher", videos=len(group), signatures=len(signatures), n=len(n_values)):
+            deciphered_signatures, deciphered_n = await self._decipher(js, js_url, list(signatures), list(n_values))
+        logger.info(
+            f"deciphered {len(signatures)} signatures and {len(n_values)} n of {len(group)} videos with {js_url}"
+        )
+        for p in group:
+            extract.finish_signature(p.manifest, p.prepared, deciphered_signatures, deciphered_n)
+
+    async def _decipher(
+        self, js: str, js_url: str, signatures: List[str], n_values: List[str]
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        service = self._service if self._service else decipher_service.get_decipher_service()
+        if service is not None:
+            return await service.decipher(js, js_url, signatures, n_values)
+        return await asyncio.get_running_loop().run_in_executor(None, extract.decipher, js, js_url, signatures, n_values)
+
+    def _build(self, p: _Pending) -> stream.StreamQuery:
+        details = p.player.get("videoDetails", {})
+        duration = int(details.get("lengthSeconds", 0))
+        title = details.get("title")
+        with tracing.span("stream.build", count=len(p.manifest)):
+            return stream.StreamQuery(
+                [stream.Stream(s_raw, duration, title, self.net_obj) for s_raw in p.manifest], p.video_id
+            )
+
+    def __repr__(self) -> str:
+        return f"<ManifestResolver js_url={self.js_url}/>"
+
+
+async def resolve_manifests(
+    videos: Iterable[Union[str, playable.PlayableBase]],
+    net_obj: net.SessionRequest,
+    **kwargs,
+) -> Dict[str, Union[stream.StreamQuery, Exception]]:
+    """ManifestResolver(net_obj, **kwargs).resolve(videos)"""
+    return await ManifestResolver(net_obj, **kwargs).resolve(videos)
@@ -0,0 +1,351 @@
+"""Request-level metrics collected by net.SessionRequest.
+
+Counters and latency histograms are kept per (method, endpoint) and can be
+read as python objects (Metrics.snapshot) or rendered in the prometheus
+text exposition format (Metrics.to_prometheus).
+"""
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib import parse
+
+import aiohttp
+
+default_latency_buckets = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+default_throughput_buckets = tuple(
+    1024 * 1024 * x for x in (0.125, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+)  # bytes per second
+default_range_size_buckets = tuple(
+    1024 * 1024 * x for x in (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)  # bytes
+
+
+def default_endpoint_key(url: str) -> str:
+    """Collapse url to a low cardinality label.
+    Query string is dropped and all googlevideo cache hosts are merged into one."""
+    split_url = parse.urlsplit(url)
+    host = split_url.hostname or ""
+    if host.endswith(".googlevideo.com"):
+        host = "googlevideo.com"
+    return host + split_url.path
+
+
+class Histogram:
+    """Cumulative bucket histogram with quantile estimation.
+
+    Quantiles are interpolated linearly inside the bucket that contains them,
+    values above the last bucket are bounded by the max observed value."""
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: Iterable[float] = default_latency_buckets):
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.min: float = math.inf
+        self.max: float = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count == 0:
+                continue
+            if cumulative + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                if upper <= lower:
+                    return upper
+                return lower + (upper - lower) * ((rank - cumulative) / bucket_count)
+            cumulative += bucket_count
+        return self.max
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self.quantile(0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.quantile(0.95)
+
+    @property
+    def p99(self) -> Optional[float]:
+        return self.quantile(0.99)
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """(upper bound, cumulative count) pairs, last bound is +Inf"""
+        res = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += bucket_count
+            res.append((bound, cumulative))
+        return res
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.p50,
+            "p95": self.p95,
+            "p99": self.p99,
+        }
+
+    def __repr__(self) -> str:
+        return f"<Histogram count={self.count} p50={self.p50} p95={self.p95} p99={self.p99}/>"
+
+
+class EndpointMetrics:
+    __slots__ = (
+        "requests",
+        "errors",
+        "retries",
+        "bytes_in",
+        "bytes_out",
+        "status_codes",
+        "latency",
+    )
+
+    def __init__(self, latency_buckets: Iterable[float]):
+        self.requests: int = 0
+        self.errors: int = 0
+        self.retries: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+        self.status_codes: Dict[int, int] = {}
+        self.latency: Histogram = Histogram(latency_buckets)
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "status_codes": dict(self.status_codes),
+            "latency": self.latency.to_dict(),
+        }
+
+
+class DownloadMetrics:
+    __slots__ = ("downloads", "bytes", "seconds", "throughput", "ranges", "range_size", "range_duration")
+
+    def __init__(self, throughput_buckets: Iterable[float], latency_buckets: Iterable[float] = default_latency_buckets):
+        self.downloads: int = 0
+        self.bytes: int = 0
+        self.seconds: float = 0.0
+        self.throughput: Histogram = Histogram(throughput_buckets)
+        self.ranges: int = 0
+        self.range_size: Histogram = Histogram(default_range_size_buckets)
+        self.range_duration: Histogram = Histogram(latency_buckets)
+
+    @property
+    def average_throughput(self) -> Optional[float]:
+        """bytes per second over all finished downloads"""
+        if self.seconds <= 0:
+            return None
+        return self.bytes / self.seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "downloads": self.downloads,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "average_throughput": self.average_throughput,
+            "throughput": self.throughput.to_dict(),
+            "ranges": self.ranges,
+            "range_size": self.range_size.to_dict(),
+            "range_duration": self.range_duration.to_dict(),
+        }
+
+
+class Metrics:
+    """Metrics storage. Pass it to net.SessionRequest(metrics=...).
+
+    Retries are counted by SessionRequest for every session with aiohttp_retry
+    retry options, its own or passed by you. Request body sizes are reported by
+    aiohttp tracing, SessionRequest adds trace_config() automatically to the
+    session it creates. If you pass your own session, add metrics.trace_config()
+    to its trace_configs."""
+
+    def __init__(
+        self,
+        latency_buckets: Iterable[float] = default_latency_buckets,
+        throughput_buckets: Iterable[float] = default_throughput_buckets,
+        endpoint_key: Callable[[str], str] = default_endpoint_key,
+    ):
+        self.latency_buckets: Tuple[float, ...] = tuple(latency_buckets)
+        self.endpoint_key: Callable[[str], str] = endpoint_key
+        self.endpoints: Dict[Tuple[str, str], EndpointMetrics] = {}
+        self.download: DownloadMetrics = DownloadMetrics(throughput_buckets, self.latency_buckets)
+
+    def get_endpoint(self, method: str, url: str) -> EndpointMetrics:
+        key = (method.upper(), self.endpoint_key(str(url)))
+        em = self.endpoints.get(key)
+        if em is None:
+            em = self.endpoints[key] = EndpointMetrics(self.latency_buckets)
+        return em
+
+    def observe_request(self, method: str, url: str, status: int, latency: float):
+        em = self.get_endpoint(method, url)
+        em.requests += 1
+        em.status_codes[status] = em.status_codes.get(status, 0) + 1
+        em.latency.observe(latency)
+
+    def observe_error(self, method: str, url: str, latency: float):
+        em = self.get_endpoint(method, url)
+        em.requests += 1
+        em.errors += 1
+        em.latency.observe(latency)
+
+    def observe_bytes_in(self, method: str, url: str, count: int):
+        self.get_endpoint(method, url).bytes_in += count
+
+    def observe_bytes_out(self, method: str, url: str, count: int):
+        self.get_endpoint(method, url).bytes_out += count
+
+    def observe_retry(self, method: str, url: str):
+        self.get_endpoint(method, url).retries += 1
+
+    def observe_download(self, count: int, seconds: float):
+        self.download.downloads += 1
+        self.download.bytes += count
+        self.download.seconds += seconds
+        if seconds > 0:
+            self.download.throughput.observe(count / seconds)
+
+    def observe_range(self, size: int, seconds: float):
+        """One range request of a download: received bytes and time until its last byte"""
+        self.download.ranges += 1
+        self.download.range_size.observe(size)
+        self.download.range_duration.observe(seconds)
+
+    def reset(self):
+        self.endpoints.clear()
+        self.download = DownloadMetrics(self.download.throughput.buckets, self.latency_buckets)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """aiohttp trace config that counts request body bytes"""
+        async def on_request_chunk_sent(session, ctx, params: aiohttp.TraceRequestChunkSentParams):
+            self.observe_bytes_out(params.method, str(params.url), len(params.chunk))
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        return trace_config
+
+    def snapshot(self) -> dict:
+        return {
+            "endpoints": {
+                f"{method} {endpoint}": em.to_dict()
+                for (method, endpoint), em in self.endpoints.items()
+            },
+            "download": self.download.to_dict(),
+        }
+
+    def to_prometheus(self, prefix: str = "youtube_client") -> str:
+        """Render metrics in the prometheus text exposition format"""
+        lines = []
+
+        def header(name: str, mtype: str, help_text: str):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {mtype}")
+
+        def labels(**kwargs) -> str:
+            return "{" + ",".join(f'{k}="{_escape_label(str(v))}"' for k, v in kwargs.items()) + "}"
+
+        items = sorted(self.endpoints.items())
+        for name, attr, help_text in (
+            ("requests_total", "requests", "Requests sent"),
+            ("request_errors_total", "errors", "Requests failed without response"),
+            ("request_retries_total", "retries", "Retried attempts"),
+            ("response_bytes_total", "bytes_in", "Bytes received"),
+            ("request_bytes_total", "bytes_out", "Bytes sent in request bodies"),
+        ):
+            header(name, "counter", help_text)
+            for (method, endpoint), em in items:
+                lines.append(f"{prefix}_{name}{labels(method=method, endpoint=endpoint)} {getattr(em, attr)}")
+
+        header("responses_total", "counter", "Responses by status code")
+        for (method, endpoint), em in items:
+            for status, count in sorted(em.status_codes.items()):
+                lines.append(
+                    f"{prefix}_responses_total{labels(method=method, endpoint=endpoint, status=status)} {count}"
+                )
+
+        header("request_duration_seconds", "histogram", "Time until response headers")
+        for (method, endpoint), em in items:
+            for bound, count in em.latency.cumulative_counts():
+                le = "+Inf" if bound == math.inf else _format_float(bound)
+                lines.append(
+                    f"{prefix}_request_duration_seconds_bucket"
+                    f"{labels(method=method, endpoint=endpoint, le=le)} {count}"
+                )
+            lines.append(f"{prefix}_request_duration_seconds_sum{labels(method=method, endpoint=endpoint)} "
+                         f"{_format_float(em.latency.sum)}")
+            lines.append(f"{prefix}_request_duration_seconds_count{labels(method=method, endpoint=endpoint)} "
+                         f"{em.latency.count}")
+
+        header("request_latency_seconds", "summary", "Estimated latency quantiles")
+        for (method, endpoint), em in items:
+            for q in (0.5, 0.95, 0.99):
+                value = em.latency.quantile(q)
+                lines.append(
+                    f"{prefix}_request_latency_seconds{labels(method=method, endpoint=endpoint, quantile=q)} "
+                    f"{'NaN' if value is None else _format_float(value)}"
+                )
+            lines.append(f"{prefix}_request_latency_seconds_sum{labels(method=method, endpoint=endpoint)} "
+                         f"{_format_float(em.latency.sum)}")
+            lines.append(f"{prefix}_request_latency_seconds_count{labels(method=method, endpoint=endpoint)} "
+                         f"{em.latency.count}")
+
+        download = self.download
+        header("downloads_total", "counter", "Finished downloads")
+        lines.append(f"{prefix}_downloads_total {download.downloads}")
+        header("download_bytes_total", "counter", "Bytes written by downloads")
+        lines.append(f"{prefix}_download_bytes_total {download.bytes}")
+        header("download_seconds_total", "counter", "Time spent in downloads")
+        lines.append(f"{prefix}_download_seconds_total {_format_float(download.seconds)}")
+        header("download_throughput_bytes_per_second", "histogram", "Throughput of finished downloads")
+        for bound, count in download.throughput.cumulative_counts():
+            le = "+Inf" if bound == math.inf else _format_float(bound)
+            lines.append(f"{prefix}_download_throughput_bytes_per_second_bucket{labels(le=le)} {count}")
+        lines.append(f"{prefix}_download_throughput_bytes_per_second_sum {_format_float(download.throughput.sum)}")
+        lines.append(f"{prefix}_download_throughput_bytes_per_second_count {download.throughput.count}")
+        for name, histogram, help_text in (
+            ("download_range_size_bytes", download.range_size, "Size of range requests"),
+            ("download_range_duration_seconds", download.range_duration, "Duration of range requests"),
+        ):
+            header(name, "histogram", help_text)
+            for bound, count in histogram.cumulative_counts():
+                le = "+Inf" if bound == math.inf else _format_float(bound)
+                lines.append(f"{prefix}_{name}_bucket{labels(le=le)} {count}")
+            lines.append(f"{prefix}_{name}_sum {_format_float(histogram.sum)}")
+            lines.append(f"{prefix}_{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def __repr__(self) -> str:
+        return f"<Metrics endpoints={len(self.endpoints)} downloads={self.download.downloads}/>"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
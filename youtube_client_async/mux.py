@@ -0,0 +1,163 @@
+"""Concurrent download of an adaptive video+audio pair.
+
+Both streams are downloaded at once under one bandwidth budget and piped
+straight into ffmpeg through two os pipes, which copies them into one file
+without reencoding. Without ffmpeg (or on windows, where
+pipes can not be passed to a subprocess) the streams are saved to two files.
+
+    streams = await video.get_streams()
+    result = await yc.download_pair(
+        streams.filter(only_video=True).order_by("resolution").last,
+        streams.filter(only_audio=True).order_by("bitrate").last,
+        "out/video",
+    )
+    print(result.path or result.parts)
+"""
+import asyncio
+import os
+import shutil
+from typing import List, NamedTuple, Optional, Sequence
+
+from . import exceptions, net, stream, tracing
+from .download_manager import TokenBucket
+from .helpers import logger
+from .simple_downloader import download_to_sink
+from .sink import AsyncSink, FileSink, StreamWriterSink, ThrottledSink
+
+
+class MuxError(exceptions.YoutubeClientError):
+    """ffmpeg failed"""
+
+
+class PairDownloadResult(NamedTuple):
+    path: Optional[str]  # muxed file, None when ffmpeg was not used
+    parts: List[str]  # separate video and audio files when ffmpeg was not used
+    video_bytes: int
+    audio_bytes: int
+
+
+def _container(video: stream.Stream, audio: stream.Stream) -> str:
+    if video.ext == "mp4" and audio.ext == "mp4":
+        return "mp4"
+    if video.ext == "webm" and audio.ext == "webm":
+        return "webm"
+    return "mkv"
+
+
+async def _pipe_writer(fd: int) -> asyncio.StreamWriter:
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.connect_write_pipe(
+        # StreamReaderProtocol, unlike FlowControlMixin, supports StreamWriter.wait_closed
+        lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()),
+        os.fdopen(fd, "wb", buffering=0),
+    )
+    return asyncio.StreamWriter(transport, protocol, None, loop)
+
+
+async def _download_both(
+    video: stream.Stream,
+    audio: stream.Stream,
+    video_sink: AsyncSink,
+    audio_sink: AsyncSink,
+    net_obj: Optional[net.SessionRequest],
+    bucket: Optional[TokenBucket],
+    adaptive: bool,
+) -> List[int]:
+    if bucket:
+        video_sink = ThrottledSink(video_sink, bucket)
+        audio_sink = ThrottledSink(audio_sink, bucket)
+    tasks = [
+        asyncio.ensure_future(download_to_sink(video, video_sink, net_obj, adaptive=adaptive)),
+        asyncio.ensure_future(download_to_sink(audio, audio_sink, net_obj, adaptive=adaptive)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # a failed download stops the other one, it would keep writing to a dead pipe
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in done:
+        if task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+async def download_pair(
+    video: stream.Stream,
+    audio: stream.Stream,
+    filepath: str,
+    net_obj: Optional[net.SessionRequest] = None,
+    max_bandwidth: Optional[float] = None,
+    ffmpeg: Optional[str] = "ffmpeg",
+    ffmpeg_args: Sequence[str] = (),
+    adaptive: bool = False,
+) -> PairDownloadResult:
+    """filepath is path to filename without extension.
+
+    :param float max_bandwidth:
+        bytes per second for both streams together, None is unlimited
+    :param str ffmpeg:
+        ffmpeg executable, None saves the streams to two files without muxing
+    :param ffmpeg_args:
+        extra output arguments, e.g. ("-movflags", "+faststart")
+    """
+    if video.video_codec is None or audio.audio_codec is None:
+        raise ValueError("video must be a stream with video and audio a stream with audio")
+    bucket = TokenBucket(max_bandwidth) if max_bandwidth else None
+    ffmpeg_path = shutil.which(ffmpeg) if ffmpeg else None
+    if ffmpeg_path is None or os.name == "nt":
+        if ffmpeg:
+            logger.warning(f"{ffmpeg} is not available, video and audio are saved to separate files")
+        parts = [f"{filepath}.video.{video.ext}", f"{filepath}.audio.{audio.ext}"]
+        with open(parts[0], "wb") as video_file, open(parts[1], "wb") as audio_file:
+            video_bytes, audio_bytes = await _download_both(
+                video, audio, FileSink(video_file), FileSink(audio_file), net_obj, bucket, adaptive
+            )
+        return PairDownloadResult(None, parts, video_bytes, audio_bytes)
+
+    path = f"{filepath}.{_container(video, audio)}"
+    video_read, video_write = os.pipe()
+    audio_read, audio_write = os.pipe()
+    # pass_fds keeps the descriptor numbers in ffmpeg, so they are referenced as pipe:N
+    args = [
+        ffmpeg_path, "-y", "-loglevel", "error",
+        "-i", f"pipe:{video_read}", "-i", f"pipe:{audio_read}",
+        "-map", "0:v:0", "-map", "1:a:0", "-c", "copy", *ffmpeg_args, path,
+    ]
+    with tracing.span("download.pair", video_itag=video.itag, audio_itag=audio.itag):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                pass_fds=(video_read, audio_read),
+                stdin=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except BaseException:
+            os.close(video_write)
+            os.close(audio_write)
+            raise
+        finally:
+            os.close(video_read)
+            os.close(audio_read)
+        video_writer = await _pipe_writer(video_write)
+        audio_writer = await _pipe_writer(audio_write)
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        pipe_error = None
+        try:
+            video_bytes, audio_bytes = await _download_both(
+                video, audio, StreamWriterSink(video_writer), StreamWriterSink(audio_writer), net_obj, bucket, adaptive
+            )
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # ffmpeg exited before reading everything, its stderr tells why
+            pipe_error = e
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            raise
+        finally:
+            returncode = await process.wait()
+            stderr = await stderr_task
+    if returncode != 0 or pipe_error:
+        raise MuxError(f"ffmpeg exited with {returncode}: {stderr.decode(errors='replace').strip()}") from pipe_error
+    return PairDownloadResult(path, [], video_bytes, audio_bytes)
@@ -1,24 +1,41 @@
 import asyncio
+import copy
 import json
+import logging
 import random
 import re
 import time
 from functools import lru_cache
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 from urllib import parse
 
 import aiohttp
 import multidict
-from aiohttp_retry import ExponentialRetry, RetryClient
+from aiohttp_retry import ExponentialRetry, RetryClient, RetryOptionsBase
 
-from . import exceptions, helpers
+from . import exceptions, helpers, tracing
 from .helpers import logger
+from .metrics import Metrics
 
 default_range_size = 9437184  # 9MB
 languages = {"EN": "en-US,en"}
 base_user_agent = "Mozilla/5.0"
 
 
+def _counted_retry_options(options: RetryOptionsBase, on_retry: Callable[[], None]) -> RetryOptionsBase:
+    """Copy of options that calls on_retry before every retry.
+    RetryClient asks get_timeout only when it is going to send the request again"""
+    counted = copy.copy(options)
+    get_timeout = options.get_timeout
+
+    def counted_get_timeout(attempt: int, response=None) -> float:
+        on_retry()
+        return get_timeout(attempt=attempt, response=response)
+
+    counted.get_timeout = counted_get_timeout
+    return counted
+
+
 class SessionRequest:
     __slots__ = (
         "raise_ex_if_status",
@@ -29,7 +46,9 @@ class SessionRequest:
         "proxy",
         "timeout",
         "retry_options",
-        "print_traffic"
+        "print_traffic",
+        "metrics",
+        "rewrite_url"
     )
 
     def __init__(
@@ -42,25 +61,32 @@ class SessionRequest:
         proxy: Optional[str] = None,
         retry_count: int = 3,
         timeout: int = 30,
-        print_traffic: bool = False
+        print_traffic: bool = False,
+        metrics: Optional[Metrics] = None,
+        rewrite_url: Optional[Callable[[str], str]] = None
     ):
+        """rewrite_url is applied to every url before sending,
+        e.g. to send all traffic to a local mock server"""
 
         self.proxy = proxy
         self.raise_ex_if_status: bool = bool(raise_ex_if_status)
         self.encoding: str = encoding
         self.timeout = aiohttp.ClientTimeout(total=timeout)
         self.retry_options = ExponentialRetry(attempts=retry_count)
+        self.metrics: Optional[Metrics] = metrics
         self.session: aiohttp.ClientSession = (
             session
             if session
             else RetryClient(
                 timeout=self.timeout,
-                retry_options=self.retry_options
+                retry_options=self.retry_options,
+                trace_configs=[metrics.trace_config()] if metrics else None
             )
         )
         self.lang: str = lang if lang else languages["EN"]
         self.user_agent: str = user_agent if user_agent else base_user_agent
         self.print_traffic: bool = print_traffic
+        self.rewrite_url: Optional[Callable[[str], str]] = rewrite_url
 
     async def __aenter__(self):
         await self.session.__aenter__()
@@ -90,34 +116,54 @@ class SessionRequest:
         if headers:
             cheaders.update(headers)
         lm = method.lower()
-        traffic_message = (
-            f"{method} {url}\n"
-            f"{url_params=}\n"
-            f"{data=}\n"
-            f"{headers=}\n"
-        )
-        if self.print_traffic:
-            print(traffic_message)
-        logger.info(traffic_message)
-        resp = None
-        if lm == "get":
-            resp = await self.session.get(
-                url, json=data, headers=cheaders, params=url_params, proxy=self.proxy, timeout=timeout
+        if self.rewrite_url:
+            url = self.rewrite_url(url)
+        log_traffic = logger.isEnabledFor(logging.INFO)
+        if self.print_traffic or log_traffic:
+            traffic_message = (
+                f"{method} {url}\n"
+                f"{url_params=}\n"
+                f"{data=}\n"
+                f"{headers=}\n"
             )
+            if self.print_traffic:
+                print(traffic_message)
+            logger.info(traffic_message)
+        if lm == "get":
+            send = self.session.get
         elif lm == "post":
-            resp = await self.session.post(
-                url, json=data, headers=cheaders, params=url_params, proxy=self.proxy, timeout=timeout
-            )
+            send = self.session.post
         elif lm == "head":
-            resp = await self.session.head(
-                url, json=data, headers=cheaders, params=url_params, proxy=self.proxy, timeout=timeout
-            )
+            send = self.session.head
         else:
             raise Exception(f"not supported method {method}. Only get post and head")
-        logger.info(
-            f"{lm} {url} status code {resp.status}, byte lenght {resp.headers.get('Content-Length',None)}"
-        )
-        
+        metrics = self.metrics
+        kwargs = {}
+        if metrics:
+            current_time = time.perf_counter()
+            # retries are counted for any session with aiohttp_retry options, not only the own one
+            retry_options = getattr(self.session, "retry_options", None)
+            if isinstance(retry_options, RetryOptionsBase):
+                kwargs["retry_options"] = _counted_retry_options(
+                    retry_options, lambda: metrics.observe_retry(method, url)
+                )
+        with tracing.span("http.request", method=method, url=url) as sp:
+            try:
+                resp = await send(
+                    url, json=data, headers=cheaders, params=url_params, proxy=self.proxy, timeout=timeout, **kwargs
+                )
+            except Exception:
+                if metrics:
+                    metrics.observe_error(method, url, time.perf_counter() - current_time)
+                raise
+            sp.set_attribute("http.status_code", resp.status)
+        if metrics:
+            metrics.observe_request(method, url, resp.status, time.perf_counter() - current_time)
+        if log_traffic:
+            logger.info(
+                f"{lm} {url} status code {resp.status}, byte lenght {resp.headers.get('Content-Length',None)}"
+            )
+
         if self.raise_ex_if_status:
             resp.raise_for_status()
         return resp
@@ -136,6 +182,8 @@ class SessionRequest:
         delta_time = time.time() - current_time
         if not resp.closed:
             resp.close()
+        if self.metrics:
+            self.metrics.observe_bytes_in(method, url, len(result))
         logger.info(f"{method} {url}\ndownloaded bytes {len(result)} in {delta_time:.2f} sec")
         return result
 
@@ -152,9 +200,13 @@ class SessionRequest:
         current_time = time.time()
         resp = await self._send(method, url, url_params, data, headers)
         result = await resp.text(encoding_resp)
+        # the body is kept by the response, count it decoded like _get_bytes_resp
+        body = await resp.read()
         delta_time = time.time() - current_time
         if not resp.closed:
             resp.close()
+        if self.metrics:
+            self.metrics.observe_bytes_in(method, url, len(body))
         logger.info(f"{method} {url}\ndownloaded text {len(result)=} in {delta_time:.2f} sec")
         return result
 
@@ -169,7 +221,8 @@ class SessionRequest:
 
         current_time = time.time()
         resp_bytes = await self._get_bytes_resp(method, url, url_params, data, headers)
-        result = json.loads(resp_bytes)
+        with tracing.span("json.decode", size=len(resp_bytes)):
+            result = json.loads(resp_bytes)
         delta_time = time.time() - current_time
         logger.info(f"{method} {url}\ndownload and parsed json in {delta_time:.2f} sec")
         return result
@@ -277,50 +330,77 @@ class SessionRequest:
 
         return await self._get_json_resp("post", url, url_params, data, headers)
 
-    async def seq_filesize(self, url):
+    async def seq_filesize(self, url: str, concurrency: int = 16, sample: Optional[int] = None) -> int:
         """Fetch size in bytes of file at given URL from sequential requests
 
         :param str url: The URL to get the size of
+        :param int concurrency: Max count of simultaneous HEAD requests to the segments
+        :param int sample: Estimate the size from this count of evenly spread
+            segments instead of requesting every segment
         :returns: int: size in bytes of remote file
         """
-        total_filesize = 0
-        # YouTube expects a request sequence number as part of the parameters.
-        split_url = parse.urlsplit(url)
-        base_url = f'{split_url.scheme}://{split_url.netloc}/{split_url.path}?'
-        querys = dict(parse.parse_qsl(split_url.query))
-
         # The 0th sequential request provides the file headers, which tell us
         #  information about how the file is segmented.
-        querys['sq'] = 0
-        url = base_url + parse.urlencode(querys)
-        response = await self._send("GET", url)
-
-        response_value = response.read()
-        # The file header must be added to the total filesize
-        total_filesize += len(response_value)
-
-        # We can then parse the header to find the number of segments
-        segment_count = 0
-        stream_info = response_value.split(b'\r\n')
-        segment_regex = b'Segment-Count: (\\d+)'
-        for line in stream_info:
-            # One of the lines should contain the segment count, but we don't know
-            #  which, so we need to iterate through the lines to find it
-            try:
-                segment_count = int(helpers.regex_search(segment_regex, line, 1))
-            except exceptions.RegexMatchError:
-                pass
-
-        if segment_count == 0:
-            raise exceptions.RegexMatchError('seq_filesize', segment_regex)
-
-        # We make HEAD requests to the segments sequentially to find the total filesize.
-        seq_num = 1
-        while seq_num <= segment_count:
-            # Create sequential request URL
-            querys['sq'] = seq_num
-            url = base_url + parse.urlencode(querys)
-
-            total_filesize += await self.get_lenght(url)
-            seq_num += 1
-        return total_filesize
+        # The file header must be added to the total filesize.
+        response = await self._send("GET", seq_url(url, 0))
+        header_size = 0
+        segment_count = None
+        tail = b""
+        try:
+            async for chunk in response.content.iter_any():
+                header_size += len(chunk)
+                if segment_count is None:
+                    tail = tail[-32:] + chunk
+                    match = _segment_count_regex.search(tail)
+                    if match:
+                        segment_count = int(match.group(1))
+                if segment_count is not None and response.content_length is not None:
+                    # the rest of the header is not needed
+                    header_size = response.content_length
+                    break
+        finally:
+            response.close()
+        if self.metrics:
+            self.metrics.observe_bytes_in("GET", url, header_size)
+        if segment_count is None:
+            raise exceptions.RegexMatchError("seq_filesize", _segment_count_regex.pattern)
+
+        seq_nums = list(range(1, segment_count + 1))
+        if sample and sample < segment_count:
+            # The last segment is usually shorter, so it is always requested
+            step = (segment_count - 1) / sample
+            seq_nums = sorted({1 + int(i * step) for i in range(sample)} | {segment_count})
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def segment_size(seq_num: int) -> int:
+            async with semaphore:
+                size = await self.get_lenght(seq_url(url, seq_num))
+            if size is None:
+                raise exceptions.YoutubeClientError(f"segment {seq_num} has no Content-Length")
+            return size
+
+        sizes = await asyncio.gather(*(segment_size(x) for x in seq_nums))
+        if len(seq_nums) == segment_count:
+            return header_size + sum(sizes)
+        full_sizes = sizes[:-1]
+        return header_size + round(sum(full_sizes) / len(full_sizes) * (segment_count - 1)) + sizes[-1]
+
+
+_segment_count_regex = re.compile(rb"Segment-Count: (\d+)\r?\n")
+
+
+def get_segment_count(header: bytes) -> int:
+    """Count of segments of an OTF stream from its header (response to sq=0)"""
+    match = _segment_count_regex.search(header)
+    if not match:
+        raise exceptions.RegexMatchError("get_segment_count", _segment_count_regex.pattern)
+    return int(match.group(1))
+
+
+def seq_url(url: str, seq_num: int) -> str:
+    """URL of the segment seq_num of an OTF stream. YouTube expects it as the sq parameter"""
+    split_url = parse.urlsplit(url)
+    querys = [(k, v) for k, v in parse.parse_qsl(split_url.query, keep_blank_values=True) if k != "sq"]
+    querys.append(("sq", str(seq_num)))
+    return parse.urlunsplit((split_url.scheme, split_url.netloc, split_url.path, parse.urlencode(querys), ""))
@@ -1,26 +1,117 @@
 import time
 from abc import ABC
+from collections import OrderedDict
 from datetime import datetime
 from functools import cached_property
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 from . import (
     base_youtube,
     caption,
     chapter,
     comment,
+    exceptions,
+    export,
     extract,
     helpers,
     innertube,
     net,
     stream,
+    stream_handle,
     thumbnail,
+    tracing,
+)
+from .base_youtube import prune
+from .helpers import compile_path
+
+# paths of the properties, split once
+_is_owner_viewing_path = compile_path("videoDetails|isOwnerViewing")
+_status_path = compile_path("playabilityStatus|status")
+_playable_in_embed_path = compile_path("playabilityStatus|playableInEmbed")
+_reason_path = compile_path("playabilityStatus|reason")
+_embed_path = compile_path("microformat|playerMicroformatRenderer|embed")
+_title_path = compile_path("videoDetails|title")
+_short_description_path = compile_path("videoDetails|shortDescription")
+_view_count_path = compile_path("microformat|playerMicroformatRenderer|viewCount")
+_is_shorts_eligible_path = compile_path("microformat|playerMicroformatRenderer|isShortsEligible")
+_is_private_path = compile_path("videoDetails|isPrivate")
+_length_seconds_path = compile_path("videoDetails|lengthSeconds")
+_author_path = compile_path("videoDetails|author")
+_owner_profile_url_path = compile_path("microformat|playerMicroformatRenderer|ownerProfileUrl")
+_external_channel_id_path = compile_path("microformat|playerMicroformatRenderer|externalChannelId")
+_allow_ratings_path = compile_path("videoDetails|allowRatings")
+_category_path = compile_path("microformat|playerMicroformatRenderer|category")
+_keywords_path = compile_path("videoDetails|keywords")
+_is_family_safe_path = compile_path("microformat|playerMicroformatRenderer|isFamilySafe")
+_available_countries_path = compile_path("microformat|playerMicroformatRenderer|availableCountries")
+_is_unplugged_corpus_path = compile_path("videoDetails|isUnpluggedCorpus")
+_is_crawlable_path = compile_path("videoDetails|isCrawlable")
+_is_unlisted_path = compile_path("microformat|playerMicroformatRenderer|isUnlisted")
+_has_ypc_metadata_path = compile_path("microformat|playerMicroformatRenderer|hasYpcMetadata")
+_publish_date_path = compile_path("microformat|playerMicroformatRenderer|publishDate")
+_upload_date_path = compile_path("microformat|playerMicroformatRenderer|uploadDate")
+_start_timestamp_path = compile_path("microformat|playerMicroformatRenderer|liveBroadcastDetails|startTimestamp")
+_end_timestamp_path = compile_path("microformat|playerMicroformatRenderer|liveBroadcastDetails|endTimestamp")
+_is_live_content_path = compile_path("videoDetails|isLiveContent")
+_thumbnails_path = compile_path("videoDetails|thumbnail|thumbnails")
+_translation_languages_path = compile_path("playerCaptionsTracklistRenderer|translationLanguages")
+_caption_tracks_path = compile_path("playerCaptionsTracklistRenderer|captionTracks")
+
+
+# player js by url, shared by all objects of the player
+_js_texts: "OrderedDict[str, str]" = OrderedDict()
+max_cached_js = 4
+
+# player response parts for the web player that no property reads
+_unused_initial_player = (
+    ("storyboards",),
+    ("playbackTracking",),
+    ("playerAds",),
+    ("adPlacements",),
+    ("adSlots",),
+    ("attestation",),
+    ("annotations",),
+    ("heartbeatParams",),
+    ("playerConfig",),
+    ("messages",),
 )
-from .helpers import get_from_dict
 
 
 class PlayableBase(base_youtube.BaseYoutube, ABC):
     """objects contains video_id like video shorts live"""
+
+    # export fields of the properties below, read by the same paths
+    record_fields: Dict[str, export.RecordField] = {
+        "is_owner_view": export.field("initial_player", _is_owner_viewing_path),
+        "playability_status": export.field("initial_player", _status_path),
+        "playable_in_embed": export.field("initial_player", _playable_in_embed_path),
+        "error_reason": export.field("initial_player", _reason_path),
+        "title": export.field("initial_player", _title_path),
+        "description": export.field("initial_player", _short_description_path),
+        "view_count": export.field("initial_player", _view_count_path),
+        "is_shorts_eligible": export.field("initial_player", _is_shorts_eligible_path, default=bool),
+        "is_private": export.field("initial_player", _is_private_path),
+        "lenght": export.field("initial_player", _length_seconds_path, convert=int),
+        "owner_name": export.field("initial_player", _author_path),
+        "owner_url": export.field("initial_player", _owner_profile_url_path),
+        "owner_id": export.field("initial_player", _external_channel_id_path),
+        "allow_rating": export.field("initial_player", _allow_ratings_path),
+        "category": export.field("initial_player", _category_path),
+        "keywords": export.field("initial_player", _keywords_path, default=list),
+        "is_family_safe": export.field("initial_player", _is_family_safe_path),
+        "available_countries": export.field("initial_player", _available_countries_path, default=list),
+        "is_unplugged_corpus": export.field("initial_player", _is_unplugged_corpus_path),
+        "is_crawlable": export.field("initial_player", _is_crawlable_path),
+        "is_unlisted": export.field("initial_player", _is_unlisted_path),
+        "has_ypc_metadata": export.field("initial_player", _has_ypc_metadata_path),
+        # iso strings, the properties without _raw parse them to datetime
+        "publish_date_raw": export.field("initial_player", _publish_date_path),
+        "upload_date_raw": export.field("initial_player", _upload_date_path),
+        "start_live_raw": export.field("initial_player", _start_timestamp_path),
+        "end_live_raw": export.field("initial_player", _end_timestamp_path),
+        "is_live_content": export.field("initial_player", _is_live_content_path),
+    }
+
     def __init__(
         self,
         url: str,
@@ -37,6 +128,8 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
         base_youtube.BaseYoutube.__init__(self, url, html, net_obj, it, initial_data, ytcfg)
         self._initial_player: Optional[dict] = initial_player
         self._js_obj: Optional[str] = js if js else None
+        # js was taken from the shared cache by _get_js, not passed by the caller
+        self._js_cached: bool = False
         self._js_url_obj: Optional[str] = js_url if js_url else None
         self.video_id = extract.video_id(self.parsed_url, self.parsed_query)
         self._signature_timestamp = None
@@ -47,9 +140,10 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
     def initial_player(self):
         if self._initial_player:
             return self._initial_player
-        html = self.html
+        html = self._get_html()
         current_time = time.time()
-        self._initial_player = extract.get_ytplayer_config(html)
+        with tracing.span("extract.initial_player"):
+            self._initial_player = extract.get_ytplayer_config(html)
         delta_time = time.time() - current_time
         helpers.logger.info(f"loaded initial_player in {delta_time:.2f} seconds")
         return self._initial_player
@@ -59,30 +153,65 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
             return self._js_url_obj
         # if self.age_restricted:
         #     self._js_url = extract.js_url(self.embed_html)
-        self._js_url_obj = extract.js_url(self.html)
+        with tracing.span("extract.js_url"):
+            try:
+                self._js_url_obj = extract.js_url(self._get_html())
+            except (exceptions.HTMLReleasedError, exceptions.HTMLParseError, exceptions.RegexMatchError):
+                # ytcfg names the player too and is kept after release_html
+                js_path = self._ytcfg.get("PLAYER_JS_URL") if self._ytcfg else None
+                if not js_path:
+                    raise
+                self._js_url_obj = "https://youtube.com" + js_path
         return self._js_url_obj
 
+    def _extract_from_html(self):
+        super()._extract_from_html()
+        self.initial_player
+        try:
+            self._get_js_url()
+        except (exceptions.HTMLParseError, exceptions.RegexMatchError):
+            helpers.logger.info(f"no js url in {self.url}")
+
     async def _get_js(self) -> str:
         if self._js_obj:
             return self._js_obj
-        self._js_obj = await self.net_obj.get_text(self._get_js_url())
+        js_url = self._get_js_url()
+        # the same player serves many videos, they share one copy of its js
+        js = _js_texts.get(js_url)
+        if js is None:
+            js = _js_texts[js_url] = await self.net_obj.get_text(js_url)
+            if len(_js_texts) > max_cached_js:
+                _js_texts.popitem(last=False)
+        else:
+            _js_texts.move_to_end(js_url)
+        self._js_obj = js
+        self._js_cached = True
         return self._js_obj
 
+    def release_html(self, prune_unused: bool = True):
+        super().release_html(prune_unused)
+        # the js stays in the shared cache while it is used, js passed by the caller is kept
+        if self._js_cached:
+            self._js_obj = None
+            self._js_cached = False
+        if prune_unused and self._initial_player:
+            prune(self._initial_player, _unused_initial_player)
+
     @property
     def is_owner_view(self) -> bool:
-        return get_from_dict(self.initial_player, "videoDetails|isOwnerViewing")
+        return _is_owner_viewing_path(self.initial_player)
 
     @property
     def playability_status(self) -> str:
-        return get_from_dict(self.initial_player, "playabilityStatus|status")
+        return _status_path(self.initial_player)
 
     @property
     def playable_in_embed(self) -> bool:
-        return get_from_dict(self.initial_player, "playabilityStatus|playableInEmbed")
+        return _playable_in_embed_path(self.initial_player)
 
     @property
     def error_reason(self) -> Optional[str]:
-        return self.initial_player["playabilityStatus"].get("reason")
+        return _reason_path.get(self.initial_player, throw_ex=False)
 
     @property
     def embed_info(self) -> dict:
@@ -93,128 +222,91 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
             "width":1280,
             "height":720
         }"""
-        return get_from_dict(self.initial_player, "microformat|playerMicroformatRenderer|embed")
+        return _embed_path(self.initial_player)
 
     @property
     def title(self) -> str:
-        return get_from_dict(self.initial_player, "videoDetails|title")
+        return _title_path(self.initial_player)
 
     @property
     def description(self) -> str:
-        return get_from_dict(self.initial_player, "videoDetails|shortDescription")
+        return _short_description_path(self.initial_player)
 
     @property
     def view_count(self) -> str:
         """view count in str not int"""
-        return get_from_dict(self.initial_player, "microformat|playerMicroformatRenderer|viewCount")
+        return _view_count_path(self.initial_player)
 
     @property
     def is_shorts_eligible(self) -> bool:
-        return self.initial_player["microformat"]["playerMicroformatRenderer"].get("isShortsEligible", False)
+        return _is_shorts_eligible_path.get(self.initial_player, default=False, throw_ex=False)
 
     @property
     def is_private(self) -> bool:
-        return get_from_dict(self.initial_player, "videoDetails|isPrivate")
+        return _is_private_path(self.initial_player)
 
     @property
     def lenght(self) -> int:
         """Lenght of video in seconds"""
-        return int(get_from_dict(self.initial_player, "videoDetails|lengthSeconds"))
+        return int(_length_seconds_path(self.initial_player))
 
     @property
     def owner_name(self) -> str:
-        return get_from_dict(self.initial_player, "videoDetails|author")
+        return _author_path(self.initial_player)
 
     @property
     def owner_url(self) -> str:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|ownerProfileUrl"
-        )
+        return _owner_profile_url_path(self.initial_player)
 
     @property
     def owner_id(self) -> str:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|externalChannelId",
-        )
+        return _external_channel_id_path(self.initial_player)
 
     @property
     def allow_rating(self) -> bool:
-        return get_from_dict(self.initial_player, "videoDetails|allowRatings")
+        return _allow_ratings_path(self.initial_player)
 
     @property
     def category(self) -> str:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|category"
-        )
+        return _category_path(self.initial_player)
 
     @property
     def keywords(self) -> List[str]:
-        return get_from_dict(
-            self.initial_player,
-            "videoDetails|keywords",
-            default=[],
-            throw_ex=False
-        )
+        return _keywords_path.get(self.initial_player, default=[], throw_ex=False)
 
     @property
     def is_family_safe(self) -> bool:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|isFamilySafe"
-        )
+        return _is_family_safe_path(self.initial_player)
 
     @property
     def available_countries(self) -> List[str]:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|availableCountries",
-            throw_ex=False,
-            default=[],
-        )
+        return _available_countries_path.get(self.initial_player, default=[], throw_ex=False)
 
     # TODO here
     @property
     def is_unplugged_corpus(self) -> bool:
-        return get_from_dict(
-            self.initial_player,
-            "videoDetails|isUnpluggedCorpus"
-        )
+        return _is_unplugged_corpus_path(self.initial_player)
 
     @property
     def is_crawlable(self) -> bool:
-        return get_from_dict(self.initial_player, "videoDetails|isCrawlable")
+        return _is_crawlable_path(self.initial_player)
 
     @property
     def is_unlisted(self) -> bool:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|isUnlisted"
-        )
+        return _is_unlisted_path(self.initial_player)
 
     @property
     def has_ypc_metadata(self) -> bool:
-        return get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|hasYpcMetadata"
-        )
+        return _has_ypc_metadata_path(self.initial_player)
 
     @property
     def publish_date(self) -> datetime:
-        text = get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|publishDate"
-        )
+        text = _publish_date_path(self.initial_player)
         return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S%z")
 
     @property
     def upload_date(self) -> datetime:
-        text = get_from_dict(
-            self.initial_player,
-            "microformat|playerMicroformatRenderer|uploadDate"
-        )
+        text = _upload_date_path(self.initial_player)
         return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S%z")
 
     @property
@@ -223,7 +315,7 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
 
     @property
     def is_live_content(self) -> bool:
-        return self.initial_player["videoDetails"]["isLiveContent"]
+        return _is_live_content_path(self.initial_player)
 
     @property
     def is_live_now(self) -> bool:
@@ -232,7 +324,7 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
     @property
     def start_live(self) -> Optional[datetime]:
         if self.was_live:
-            text = self.initial_player["microformat"]["playerMicroformatRenderer"]["liveBroadcastDetails"].get("startTimestamp")
+            text = _start_timestamp_path.get(self.initial_player, throw_ex=False)
             if text:
                 return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S%z")
         return None
@@ -240,14 +332,14 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
     @property
     def end_live(self) -> Optional[datetime]:
         if self.was_live:
-            text = self.initial_player["microformat"]["playerMicroformatRenderer"]["liveBroadcastDetails"].get("endTimestamp")
+            text = _end_timestamp_path.get(self.initial_player, throw_ex=False)
             if text:
                 return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S%z")
         return None
 
     @property
     def thumbnails(self) -> Optional[thumbnail.ThumbnailQuery]:
-        raw = get_from_dict(self.initial_player, "videoDetails|thumbnail|thumbnails")
+        raw = _thumbnails_path(self.initial_player)
         try:
             raw += self.initial_player["microformat"]["playerMicroformatRenderer"][
                 "thumbnail", "thumbnails"]
@@ -268,7 +360,7 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
         cap = self.initial_player.get("captions")
         if cap is None:
             return dict()
-        for x in get_from_dict(cap, "playerCaptionsTracklistRenderer|translationLanguages"):
+        for x in _translation_languages_path(cap):
             try:
                 translationLanguages[x["languageCode"]] = x["languageName"]["simpleText"]
             except KeyError:
@@ -294,7 +386,7 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
         captions = []
         if cap is None:
             return None
-        for x in get_from_dict(cap, "playerCaptionsTracklistRenderer|captionTracks"):
+        for x in _caption_tracks_path(cap):
             captions.append(caption.Caption(x, self.translation_languages, self.net_obj))
         if len(captions) == 0:
             return None
@@ -318,6 +410,19 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
         return self._signature_timestamp
 
     async def get_streams(self) -> stream.StreamQuery:
+        with tracing.span("get_streams", video_id=self.video_id):
+            return await self._get_streams()
+
+    def to_record(self, fields: Optional[List[str]] = None, as_tuple: bool = False) -> Union[Dict[str, Any], tuple]:
+        """Fields (property names, by default export.default_fields) read in one walk of every json document"""
+        schema = export.compile_record(type(self), tuple(fields) if fields else None)
+        return tuple(schema.values(self)) if as_tuple else schema.record(self)
+
+    def get_stream_handle(self, stream_obj: stream.Stream, margin: float = 600.0) -> stream_handle.StreamHandle:
+        """Handle of stream_obj that renews its url margin seconds before expiration or after 403"""
+        return stream_handle.StreamHandle(self, stream_obj, margin)
+
+    async def _get_streams(self) -> stream.StreamQuery:
         # self.it.innertube_context.update(await self._get_signature_timestamp())
         # new_player_info = await self.it.player(self.video_id)
         ip = None
@@ -335,8 +440,10 @@ class PlayableBase(base_youtube.BaseYoutube, ABC):
             ).player(self.video_id)
             ip = self._ios_initial_player
 
-        stream_manifest = extract.apply_descrambler(ip["streamingData"])
+        with tracing.span("extract.descrambler"):
+            stream_manifest = extract.apply_descrambler(ip["streamingData"])
 
-        extract.apply_signature(stream_manifest, ip, await self._get_js(), self._get_js_url())
-        stream_objs = [stream.Stream(s_raw, self.lenght, self.title, self.net_obj) for s_raw in stream_manifest]
-        return stream.StreamQuery(stream_objs)
+        await extract.async_apply_signature(stream_manifest, ip, await self._get_js(), self._get_js_url())
+        with tracing.span("stream.build", count=len(stream_manifest)):
+            stream_objs = [stream.Stream(s_raw, self.lenght, self.title, self.net_obj) for s_raw in stream_manifest]
+        return stream.StreamQuery(stream_objs, self.video_id)
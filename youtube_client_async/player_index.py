@@ -0,0 +1,76 @@
+"""Index of player js functions on disk.
+
+A Cipher of a new player searches its ~2 MB of js with many regex patterns for
+the signature and n function names, and the interpreter searches it again for
+the code of every function and helper object it calls. PlayerIndex saves what
+was found in one json file per player, so a restarted process or a new worker
+of DecipherService builds the Cipher from the file.
+
+    yc.set_player_index(yc.PlayerIndex("~/.cache/youtube_client_async/players"))
+    streams = await video.get_streams()
+"""
+import json
+import os
+import re
+from typing import Optional
+from urllib import parse
+
+from .helpers import logger
+
+_index: Optional["PlayerIndex"] = None
+
+
+def player_id(js_url: str) -> str:
+    """Player version and variant from the js url,
+    /s/player/6e1dd460/player_ias.vflset/en_US/base.js is 6e1dd460-player_ias.vflset-en_US-base.js"""
+    path = parse.urlsplit(js_url).path
+    match = re.search(r"/s/player/(.+)$", path)
+    return re.sub(r"[^\w.]+", "-", match.group(1) if match else path).strip("-")
+
+
+class PlayerIndex:
+    """Directory of <player id>.json files"""
+
+    version = 1
+
+    def __init__(self, directory: str):
+        self.directory: str = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, js_url: str) -> str:
+        return os.path.join(self.directory, player_id(js_url) + ".json")
+
+    def load(self, js_url: str) -> Optional[dict]:
+        """Saved entry of the player, None when there is none or it is not usable"""
+        try:
+            with open(self.path(js_url), encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"player index of {js_url} is not readable: {e}")
+            return None
+        if entry.get("version") != self.version:
+            return None
+        return entry
+
+    def save(self, js_url: str, entry: dict):
+        """Entry is written to a temporary file and renamed, so workers never read a partial file"""
+        path = self.path(js_url)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**entry, "version": self.version, "js_url": js_url}, f)
+        os.replace(tmp_path, path)
+
+    def __repr__(self) -> str:
+        return f"<PlayerIndex {self.directory}/>"
+
+
+def set_player_index(index: Optional[PlayerIndex]):
+    """Use index for new Ciphers. None disables it"""
+    global _index
+    _index = index
+
+
+def get_player_index() -> Optional[PlayerIndex]:
+    return _index
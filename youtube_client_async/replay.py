@@ -0,0 +1,382 @@
+"""Record and replay of http traffic for offline and load tests.
+
+RecordingSession and ReplaySession replace the aiohttp session used by
+net.SessionRequest, so everything built on top of SessionRequest._send
+(innertube, watch pages, base.js, downloads) works unchanged.
+
+Recording:
+
+    cassette = yc.Cassette("video.jsonl")
+    async with yc.SessionRequest(session=yc.RecordingSession(cassette)) as sr:
+        ...  # cassette is written when the session is closed
+
+Replay with 50 ms latency and 2 MB/sec per response:
+
+    cassette = yc.Cassette.load("video.jsonl")
+    session = yc.ReplaySession(cassette, latency=0.05, bandwidth=2 * 1024 * 1024)
+    async with yc.SessionRequest(session=session) as sr:
+        ...
+
+A cassette file is json lines, one interaction per line, bodies in base64.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib import parse
+
+import aiohttp
+import multidict
+import yarl
+from aiohttp_retry import RetryClient
+
+from . import exceptions
+
+_body_headers = ("content-length", "content-encoding", "transfer-encoding")
+
+
+class CassetteMissError(exceptions.YoutubeClientError):
+    """Request is not recorded in the cassette"""
+    def __init__(self, method: str, url: str):
+        super().__init__(f"{method} {url} is not recorded in the cassette")
+        self.method = method
+        self.url = url
+
+
+def _canonical_url(url: str, params: Optional[Dict] = None) -> str:
+    split_url = parse.urlsplit(str(url))
+    query = parse.parse_qsl(split_url.query, keep_blank_values=True)
+    if params:
+        for key, value in params.items():
+            if isinstance(value, (list, tuple)):
+                query.extend((key, str(x)) for x in value)
+            else:
+                query.append((key, str(value)))
+    query.sort()
+    return parse.urlunsplit((split_url.scheme, split_url.netloc, split_url.path, parse.urlencode(query), ""))
+
+
+def _split_range(canonical_url: str) -> Tuple[str, Optional[Tuple[int, int]]]:
+    """url without range param and (start, end) of the range"""
+    split_url = parse.urlsplit(canonical_url)
+    query = parse.parse_qsl(split_url.query, keep_blank_values=True)
+    byte_range = None
+    rest = []
+    for key, value in query:
+        if key == "range" and "-" in value:
+            start, end = value.split("-", 1)
+            byte_range = (int(start), int(end) if end else -1)
+        else:
+            rest.append((key, value))
+    return parse.urlunsplit((split_url.scheme, split_url.netloc, split_url.path, parse.urlencode(rest), "")), byte_range
+
+
+def request_key(method: str, url: str, params: Optional[Dict] = None, data: Any = None) -> str:
+    key = f"{method.upper()} {_canonical_url(url, params)}"
+    if data is not None:
+        key += " " + hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return key
+
+
+class Interaction:
+    __slots__ = ("key", "method", "url", "status", "headers", "body")
+
+    def __init__(self, key: str, method: str, url: str, status: int, headers: List[Tuple[str, str]], body: bytes):
+        self.key = key
+        self.method = method
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "method": self.method,
+            "url": self.url,
+            "status": self.status,
+            "headers": self.headers,
+            "body": base64.b64encode(self.body).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "Interaction":
+        return cls(
+            raw["key"], raw["method"], raw["url"], raw["status"],
+            [tuple(x) for x in raw["headers"]], base64.b64decode(raw["body"])
+        )
+
+    def __repr__(self) -> str:
+        return f"<Interaction {self.key} status={self.status} len={len(self.body)}/>"
+
+
+class Cassette:
+    """Recorded interactions. Same request recorded several times is replayed in order,
+    the last one is repeated when the recorded ones are over.
+    The order is tracked per ReplaySession, so one cassette can be shared by concurrent sessions."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path: Optional[str] = path
+        self.interactions: List[Interaction] = []
+        self._by_key: Dict[str, List[Interaction]] = {}
+        self._ranges: Dict[str, List[Tuple[Optional[Tuple[int, int]], Interaction]]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls(path)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    cassette.add(Interaction.from_dict(json.loads(line)))
+        return cassette
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if path is None:
+            raise ValueError("cassette path is not set")
+        with open(path, "w", encoding="utf-8") as f:
+            for interaction in self.interactions:
+                f.write(json.dumps(interaction.to_dict()) + "\n")
+
+    def add(self, interaction: Interaction):
+        self.interactions.append(interaction)
+        self._by_key.setdefault(interaction.key, []).append(interaction)
+        if interaction.method == "GET" and interaction.status in (200, 206):
+            base_url, byte_range = _split_range(_canonical_url(interaction.url))
+            self._ranges.setdefault(base_url, []).append((byte_range, interaction))
+
+    def find(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        data: Any = None,
+        played: Optional[Dict[str, int]] = None
+    ) -> Interaction:
+        """played is count of already served responses by key, it is updated"""
+        key = request_key(method, url, params, data)
+        recorded = self._by_key.get(key)
+        if recorded:
+            if played is None:
+                return recorded[0]
+            index = played.get(key, 0)
+            played[key] = index + 1
+            return recorded[min(index, len(recorded) - 1)]
+        found = self._find_by_range(method.upper(), _canonical_url(url, params))
+        if found is None:
+            raise CassetteMissError(method, _canonical_url(url, params))
+        return found
+
+    def _find_by_range(self, method: str, canonical_url: str) -> Optional[Interaction]:
+        """Serve a byte range (or HEAD) from any recorded GET of the same url that contains it"""
+        base_url, byte_range = _split_range(canonical_url)
+        for recorded_range, interaction in self._ranges.get(base_url, []):
+            offset = recorded_range[0] if recorded_range else 0
+            if method == "HEAD" and byte_range is None and recorded_range is None:
+                headers = [(k, v) for k, v in interaction.headers if k.lower() != "content-length"]
+                headers.append(("Content-Length", str(len(interaction.body))))
+                return Interaction(canonical_url, method, canonical_url, interaction.status, headers, b"")
+            if method != "GET" or byte_range is None:
+                continue
+            start, end = byte_range
+            if start < offset:
+                continue
+            end = offset + len(interaction.body) - 1 if end < 0 else end
+            if end >= offset + len(interaction.body) and recorded_range is not None:
+                continue
+            body = interaction.body[start - offset:end - offset + 1]
+            headers = [(k, v) for k, v in interaction.headers if k.lower() != "content-length"]
+            headers.append(("Content-Length", str(len(body))))
+            return Interaction(canonical_url, method, canonical_url, interaction.status, headers, body)
+        return None
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def __repr__(self) -> str:
+        return f"<Cassette {self.path} interactions={len(self.interactions)}/>"
+
+
+class _ReplayContent:
+    """Part of aiohttp.StreamReader interface used by the package"""
+
+    def __init__(self, body: bytes, bandwidth: Optional[float]):
+        self._body = memoryview(body)
+        self._position = 0
+        self._bandwidth = bandwidth
+
+    async def _take(self, n: int) -> bytes:
+        chunk = bytes(self._body[self._position:self._position + n])
+        self._position += len(chunk)
+        if self._bandwidth and chunk:
+            await asyncio.sleep(len(chunk) / self._bandwidth)
+        return chunk
+
+    async def read(self, n: int = -1) -> bytes:
+        if n < 0:
+            n = len(self._body) - self._position
+        return await self._take(n)
+
+    async def readany(self) -> bytes:
+        return await self._take(64 * 1024)
+
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._take(n)
+            if not chunk:
+                return
+            yield chunk
+
+    async def iter_any(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self.readany()
+            if not chunk:
+                return
+            yield chunk
+
+    def at_eof(self) -> bool:
+        return self._position >= len(self._body)
+
+
+class ReplayResponse:
+    """Part of aiohttp.ClientResponse interface used by the package"""
+
+    def __init__(self, interaction: Interaction, method: str, url: str, bandwidth: Optional[float] = None):
+        self.method: str = method
+        self.url: yarl.URL = yarl.URL(url)
+        self.status: int = interaction.status
+        self.reason: str = ""
+        self.headers = multidict.CIMultiDictProxy(multidict.CIMultiDict(interaction.headers))
+        self.content: _ReplayContent = _ReplayContent(interaction.body, bandwidth)
+        self.closed: bool = False
+
+    @property
+    def content_length(self) -> Optional[int]:
+        value = self.headers.get("Content-Length")
+        return int(value) if value is not None else None
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def request_info(self) -> aiohttp.RequestInfo:
+        return aiohttp.RequestInfo(self.url, self.method, multidict.CIMultiDictProxy(multidict.CIMultiDict()), self.url)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(
+                self.request_info, (), status=self.status, message=self.reason, headers=self.headers
+            )
+
+    async def read(self) -> bytes:
+        return await self.content.read()
+
+    async def text(self, encoding: Optional[str] = None) -> str:
+        return (await self.read()).decode(encoding or "utf-8")
+
+    async def json(self, **kwargs) -> Any:
+        return json.loads(await self.read())
+
+    def close(self):
+        self.closed = True
+
+    def release(self):
+        self.closed = True
+
+
+class ReplaySession:
+    """Serves responses from a cassette.
+
+    :param float latency:
+        seconds before response headers are returned
+    :param float bandwidth:
+        bytes per second of each response body, None is unlimited"""
+
+    def __init__(self, cassette: Cassette, latency: float = 0.0, bandwidth: Optional[float] = None):
+        self.cassette: Cassette = cassette
+        self.latency: float = latency
+        self.bandwidth: Optional[float] = bandwidth
+        self.closed: bool = False
+        self._played: Dict[str, int] = {}
+
+    def rewind(self):
+        """Replay the cassette from the beginning"""
+        self._played.clear()
+
+    async def _request(self, method: str, url: str, json: Any = None, params: Optional[Dict] = None,
+                       **kwargs) -> ReplayResponse:
+        interaction = self.cassette.find(method, url, params, json, self._played)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ReplayResponse(interaction, method.upper(), str(url), self.bandwidth)
+
+    async def get(self, url: str, **kwargs) -> ReplayResponse:
+        return await self._request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> ReplayResponse:
+        return await self._request("POST", url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> ReplayResponse:
+        return await self._request("HEAD", url, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        self.closed = True
+
+
+class RecordingSession(ReplaySession):
+    """Sends requests with a real session and records every response into the cassette.
+    The cassette is saved on close when it has a path."""
+
+    def __init__(self, cassette: Cassette, session: Optional[aiohttp.ClientSession] = None):
+        super().__init__(cassette)
+        self.session = session if session else RetryClient()
+
+    @property
+    def retry_options(self):
+        """Retry options of the real session, SessionRequest counts retries with them"""
+        return getattr(self.session, "retry_options", None)
+
+    async def _request(self, method: str, url: str, json: Any = None, params: Optional[Dict] = None,
+                       **kwargs) -> ReplayResponse:
+        send = getattr(self.session, method.lower())
+        resp = await send(url, json=json, params=params, **kwargs)
+        try:
+            body = await resp.read()
+        finally:
+            resp.close()
+        # the body is stored decoded, headers of the encoded body would not match it
+        headers = [
+            (k, v) for k, v in resp.headers.items() if k.lower() not in _body_headers
+        ]
+        if method.upper() != "HEAD":
+            headers.append(("Content-Length", str(len(body))))
+        elif "Content-Length" in resp.headers and "Content-Encoding" not in resp.headers:
+            headers.append(("Content-Length", resp.headers["Content-Length"]))
+        interaction = Interaction(
+            request_key(method, url, params, json),
+            method.upper(),
+            _canonical_url(url, params),
+            resp.status,
+            headers,
+            body,
+        )
+        self.cassette.add(interaction)
+        return ReplayResponse(interaction, method.upper(), str(url))
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def close(self):
+        await self.session.close()
+        if self.cassette.path:
+            self.cassette.save()
+        self.closed = True
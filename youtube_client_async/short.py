@@ -78,11 +78,16 @@ async def get_short(
     initial_data: Optional[dict] = None,
     ytcfg: Optional[dict] = None,
     js_url: Optional[str] = None,
-    js: Optional[str] = None
+    js: Optional[str] = None,
+    lean: bool = False,
 ) -> Short:
+    """lean releases the html after extraction, see BaseYoutube.release_html"""
 
     c_html = html if html else await net_obj.get_text(url)
-    return Short(url, c_html, net_obj, it, initial_player, initial_data, ytcfg, js_url, js)
+    short = Short(url, c_html, net_obj, it, initial_player, initial_data, ytcfg, js_url, js)
+    if lean:
+        short.release_html()
+    return short
 
 
 async def get_video_short(
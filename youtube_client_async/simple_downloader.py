@@ -1,16 +1,100 @@
 import asyncio
+import mmap
 import time
-from typing import Callable, Optional
+from typing import Callable, Dict, Optional, Union
 
 import aiohttp
 
-from . import exceptions, net, stream
+from . import exceptions, net, stream, tracing
+from .sink import make_sink
 from .helpers import logger
+from .hosts import HostPool
+from .stream_handle import StreamHandle
 
 
 class DownloadingLiveError(exceptions.YoutubeClientError):
     def __init__(self, *args):
-        super().__init__("downloading live stream is not supported")
+        super().__init__("downloading live stream is not supported, use LiveVideo.get_recorder")
+
+
+class _SlowHost(Exception):
+    """Range is received much slower than from other hosts"""
+
+
+class RangeTuner:
+    """Adaptive size of range requests.
+
+    Throughput and RTT are measured on every range and smoothed, the next range
+    is sized so that a request takes about target_duration seconds: small ranges
+    waste round trips on fast links, large ranges lose more on failure.
+    Received data is merged into blocks of block_size to cut per-chunk overhead."""
+
+    def __init__(
+        self,
+        target_duration: float = 2.0,
+        initial_size: int = 1024 * 1024 * 2,
+        min_size: int = 1024 * 512,
+        max_size: int = 1024 * 1024 * 64,
+        block_size: int = 1024 * 256,
+        smoothing: float = 0.3,
+    ):
+        self.target_duration: float = target_duration
+        self.initial_size: int = initial_size
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.block_size: int = block_size
+        self.smoothing: float = smoothing
+        self.throughput: Optional[float] = None  # bytes per second
+        self.rtt: Optional[float] = None
+        self.ranges: int = 0
+        self.bytes: int = 0
+
+    def observe(self, size: int, rtt: float, duration: float):
+        """size of received range, rtt is time until headers and duration until the last byte"""
+        self.ranges += 1
+        self.bytes += size
+        if size <= 0:
+            return
+        throughput = size / max(duration - rtt, 1e-3)
+        if self.throughput is None:
+            self.throughput, self.rtt = throughput, rtt
+        else:
+            self.throughput += self.smoothing * (throughput - self.throughput)
+            self.rtt += self.smoothing * (rtt - self.rtt)
+
+    def next_size(self) -> int:
+        if self.throughput is None:
+            return self.initial_size
+        transfer_time = max(self.target_duration - self.rtt, self.target_duration / 2)
+        size = int(self.throughput * transfer_time) // (64 * 1024) * (64 * 1024)
+        return min(max(size, self.min_size), self.max_size)
+
+    def to_dict(self) -> dict:
+        return {
+            "ranges": self.ranges,
+            "bytes": self.bytes,
+            "throughput": self.throughput,
+            "rtt": self.rtt,
+            "next_size": self.next_size(),
+        }
+
+    def __repr__(self) -> str:
+        return f"<RangeTuner ranges={self.ranges} throughput={self.throughput} rtt={self.rtt}/>"
+
+
+async def _read_blocks(content: aiohttp.StreamReader, block_size: int):
+    """Received chunks merged into blocks of at least block_size (the last one can be shorter)"""
+    pieces = []
+    size = 0
+    async for chunk in content.iter_any():
+        pieces.append(chunk)
+        size += len(chunk)
+        if size >= block_size:
+            yield pieces[0] if len(pieces) == 1 else b"".join(pieces)
+            pieces = []
+            size = 0
+    if pieces:
+        yield b"".join(pieces)
 
 
 async def _load_video_stream_part(
@@ -20,24 +104,134 @@ async def _load_video_stream_part(
     net_obj: net.SessionRequest,
     chunk_size: int = 1024*10,
     timeout: int = 10,
-    max_retries: int = 1
+    max_retries: int = 1,
+    tuner: Optional[RangeTuner] = None,
+    raw: bool = False,
+    hosts: Optional[HostPool] = None,
+    host_limit: Optional[Callable[[str], asyncio.Semaphore]] = None,
     ):
+    """raw=True yields chunks as they are received, without re-chunking.
+    With hosts every attempt goes to the best mirror, failed and slow attempts continue on another one.
+    host_limit gives the semaphore of the host an attempt is sent to, it is held until the range is read"""
     retries = 0
     while True:
+        received = 0
+        host_url = hosts.choose(url) if hosts else url
+        limit = host_limit(host_url) if host_limit else None
+        if limit:
+            await limit.acquire()
         try:
             range_param = f"&range={start}-{end}"
-            response = await net_obj._send("GET", url + range_param, timeout=timeout)  # TODO header Range
-            log_str = f"Getting {range_param} len={response.content_length}"
-            logger.info(log_str)
-            async for chunk in response.content.iter_chunked(chunk_size):
-                yield chunk
+            with tracing.span("download.range", activate=False, start=start, end=end, attempt=retries) as sp:
+                request_time = time.perf_counter()
+                response = await net_obj._send("GET", host_url + range_param, timeout=timeout)  # TODO header Range
+                rtt = time.perf_counter() - request_time
+                # a slow host is left only while the range has bytes to come
+                expected = response.content_length or end - start + 1
+                log_str = f"Getting {range_param} len={response.content_length}"
+                logger.info(log_str)
+                if raw:
+                    chunks = response.content.iter_any()
+                elif tuner:
+                    chunks = _read_blocks(response.content, tuner.block_size)
+                else:
+                    chunks = response.content.iter_chunked(chunk_size)
+                try:
+                    async for chunk in chunks:
+                        received += len(chunk)
+                        yield chunk
+                        if (
+                            hosts and received < expected
+                            and hosts.is_slow(host_url, received, time.perf_counter() - request_time)
+                        ):
+                            response.close()
+                            raise _SlowHost()
+                finally:
+                    duration = time.perf_counter() - request_time
+                    sp.set_attribute("received", received)
+                    if net_obj.metrics:
+                        net_obj.metrics.observe_bytes_in("GET", url, received)
+                        net_obj.metrics.observe_range(received, duration)
+                    if tuner:
+                        tuner.observe(received, rtt, duration)
+                    if hosts:
+                        hosts.observe(host_url, received, duration)
             # yield await response.read()
             return
+        except aiohttp.client_exceptions.ClientResponseError as e:
+            # a mirror that does not serve the url or an overloaded host
+            if not hosts or not (e.status >= 500 or (host_url != url and e.status in (403, 404))):
+                raise
+            hosts.fail(host_url)
+            retries += 1
+            if retries > max_retries + 1:
+                raise
+        except _SlowHost:
+            # not counted as a retry, every slow attempt received something
+            hosts.fail(host_url)
+            start += received
+            if start > end:
+                return
         except (aiohttp.client_exceptions.ClientConnectionError, asyncio.TimeoutError):
             # aiohttp.client_exceptions.ClientResponseError 404 ?
+            if hosts:
+                hosts.fail(host_url)
             retries += 1
             if retries > max_retries + 1:
                 raise Exception(f"max retries {retries} from {max_retries}")
+            # already yielded bytes are not requested again
+            start += received
+        finally:
+            if limit:
+                limit.release()
+
+
+async def range_video_stream(
+    url: str,
+    net_obj: net.SessionRequest,
+    filesize: int,
+    start: int = 0,
+    max_retries: int = 1,
+    timeout: int = 10,
+    url_chunk_size: int = 1024*1024*10,
+    chunk_size: int = 1024 * 10,
+    tuner: Optional[RangeTuner] = None,
+    raw: bool = False,
+    handle: Optional[StreamHandle] = None,
+    hosts: Optional[HostPool] = None,
+    host_limit: Optional[Callable[[str], asyncio.Semaphore]] = None,
+    ):
+    """Yield bytes of url from start to filesize by range requests, filesize 0 is unknown size.
+    With tuner url_chunk_size and chunk_size are chosen by the tuner.
+    With handle every range is requested from its current url, a 403 renews the url once per position.
+    Ends at filesize or at an empty range, with unknown size also at a 400"""
+    position = start
+    renewed_at = None
+    while position < filesize if filesize else True:
+        if handle:
+            url = await handle.get_url()
+        range_start = position
+        range_size = tuner.next_size() if tuner else url_chunk_size
+        stop_pos = range_start + range_size if not filesize else min(filesize, range_start + range_size)
+        try:
+            async for chunk in _load_video_stream_part(
+                url, range_start, stop_pos, net_obj, chunk_size, timeout, max_retries, tuner, raw, hosts, host_limit
+            ):
+                if not chunk:
+                    return
+                position += len(chunk)
+                yield chunk
+        except aiohttp.client_exceptions.ClientResponseError as e:
+            if e.status == 400 and not filesize:
+                return
+            if e.status == 403 and handle and renewed_at != position:
+                # url expired or was revoked, continue from position on a renewed one
+                renewed_at = position
+                await handle.refresh(url)
+                continue
+            raise
+        if position == range_start:
+            return
 
 
 async def simple_video_stream(
@@ -47,37 +241,198 @@ async def simple_video_stream(
     timeout: int = 10,
     url_chunk_size: int = 1024*1024*10,
     chunk_size: int = 1024 * 10,
-    filesize: Optional[int] = None
+    filesize: Optional[int] = None,
+    tuner: Optional[RangeTuner] = None,
+    handle: Optional[StreamHandle] = None,
+    hosts: Optional[HostPool] = None,
     ):
+    """range_video_stream of url, filesize is requested when it is None"""
 
     if filesize is None:
-        try:
-            filesize = await net_obj.get_lenght(url)
-        except:
-            filesize = await net_obj.seq_filesize(url)
+        with tracing.span("download.filesize"):
+            try:
+                filesize = await net_obj.get_lenght(url)
+            except:
+                filesize = await net_obj.seq_filesize(url)
+    async for chunk in range_video_stream(
+        url, net_obj, filesize, 0, max_retries, timeout, url_chunk_size, chunk_size, tuner, handle=handle, hosts=hosts
+    ):
+        yield chunk
+
+
+async def _download_into(
+    url: str,
+    view: memoryview,
+    net_obj: net.SessionRequest,
+    max_retries: int = 1,
+    timeout: int = 10,
+    url_chunk_size: int = 1024*1024*10,
+    tuner: Optional[RangeTuner] = None,
+    callback: Optional[Callable[[memoryview, int, int], None]] = None,
+    handle: Optional[StreamHandle] = None,
+    hosts: Optional[HostPool] = None,
+    ) -> int:
+    """Download ranges of url straight into view, len(view) is the filesize.
+    callback gets a memoryview of every written part, valid only during the call"""
+    filesize = len(view)
     downloaded = 0
-    while downloaded < filesize if filesize else True:
-        start_pos = downloaded
-        stop_pos = start_pos + url_chunk_size if filesize == 0 else min(filesize, start_pos + url_chunk_size)
-        first_chunk = None
+    async for chunk in range_video_stream(
+        url, net_obj, filesize, 0, max_retries, timeout, url_chunk_size, tuner=tuner, raw=True, handle=handle,
+        hosts=hosts,
+    ):
+        end = downloaded + len(chunk)
+        if end > filesize:
+            raise exceptions.YoutubeClientError(f"{url} is longer than {filesize} bytes")
+        view[downloaded:end] = chunk
+        downloaded = end
+        if callback:
+            with view[end - len(chunk):end] as part:
+                callback(part, downloaded, filesize)
+    return downloaded
+
+
+def _mmap_output(path: str, filesize: int):
+    """Output file preallocated to filesize and mapped to memory"""
+    file = open(path, "w+b")
+    file.truncate(filesize)
+    return file, mmap.mmap(file.fileno(), filesize)
+
+
+async def _load_segment(
+    url: str,
+    seq_num: int,
+    net_obj: net.SessionRequest,
+    timeout: int = 10,
+    max_retries: int = 1,
+    handle: Optional[StreamHandle] = None,
+    hosts: Optional[HostPool] = None,
+    host_limit: Optional[Callable[[str], asyncio.Semaphore]] = None,
+) -> bytes:
+    retries = 0
+    renewed = False
+    while True:
+        if handle:
+            url = await handle.get_url()
+        host_url = hosts.choose(url) if hosts else url
         try:
-            async for mchunk in _load_video_stream_part(url, start_pos, stop_pos, net_obj, chunk_size, timeout, max_retries):
-                if first_chunk is None:
-                    first_chunk = mchunk
-                    if not first_chunk:
-                        return
-                if not mchunk:
-                    break
-                downloaded += len(mchunk)
-                yield mchunk
+            with tracing.span("download.segment", activate=False, sq=seq_num, attempt=retries):
+                request_time = time.perf_counter()
+                limit = host_limit(host_url) if host_limit else None
+                if limit:
+                    await limit.acquire()
+                try:
+                    response = await net_obj._send("GET", net.seq_url(host_url, seq_num), timeout=timeout)
+                    try:
+                        data = await response.content.read()
+                    finally:
+                        response.close()
+                finally:
+                    if limit:
+                        limit.release()
+            if net_obj.metrics:
+                net_obj.metrics.observe_bytes_in("GET", url, len(data))
+            if hosts:
+                hosts.observe(host_url, len(data), time.perf_counter() - request_time)
+            return data
         except aiohttp.client_exceptions.ClientResponseError as e:
-            if e.status == 400:
-                return
-            raise e
+            if hosts and (e.status >= 500 or (host_url != url and e.status in (403, 404))):
+                hosts.fail(host_url)
+                retries += 1
+                if retries > max_retries + 1:
+                    raise
+                continue
+            if e.status != 403 or not handle or renewed:
+                raise
+            renewed = True
+            await handle.refresh(url)
+        except (aiohttp.client_exceptions.ClientConnectionError, asyncio.TimeoutError):
+            if hosts:
+                hosts.fail(host_url)
+            retries += 1
+            if retries > max_retries + 1:
+                raise Exception(f"max retries {retries} from {max_retries}")
 
 
-async def simple_download(
+async def otf_video_stream(
+    url: str,
+    net_obj: net.SessionRequest,
+    max_retries: int = 1,
+    timeout: int = 10,
+    concurrency: int = 4,
+    handle: Optional[StreamHandle] = None,
+    hosts: Optional[HostPool] = None,
+    host_limit: Optional[Callable[[str], asyncio.Semaphore]] = None,
+    ):
+    """Yield segments of an OTF stream (Stream.is_otf) in order.
+    The header (sq=0) is followed by Segment-Count segments, up to concurrency
+    segments are fetched at once and kept until their turn to be yielded.
+    host_limit gives the semaphore of the host every segment request is sent to"""
+
+    header = await _load_segment(url, 0, net_obj, timeout, max_retries, handle, hosts, host_limit)
+    segment_count = net.get_segment_count(header)
+    yield header
+
+    pending: Dict[int, asyncio.Future] = {}
+    next_seq = 1
+    launched = 1
+    try:
+        while next_seq <= segment_count:
+            while launched <= segment_count and launched < next_seq + concurrency:
+                pending[launched] = asyncio.ensure_future(
+                    _load_segment(url, launched, net_obj, timeout, max_retries, handle, hosts, host_limit)
+                )
+                launched += 1
+            yield await pending.pop(next_seq)
+            next_seq += 1
+    finally:
+        for task in pending.values():
+            task.cancel()
+
+
+async def _download_to_file(
     stream: stream.Stream,
+    path: str,
+    current_net_obj: net.SessionRequest,
+    max_retries: int,
+    timeout: int,
+    url_chunk_size: int,
+    chunk_size: int,
+    callback: Optional[Callable[[bytes, int, int], None]],
+    otf_concurrency: int,
+    tuner: Optional[RangeTuner],
+    filesize: int,
+    handle: Optional[StreamHandle] = None,
+    hosts: Optional[HostPool] = None,
+    ) -> int:
+    downloaded = 0
+    with tracing.span("download", itag=stream.itag, filesize=filesize), open(path, "wb") as file:
+        if stream.is_otf:
+            parts = otf_video_stream(
+                stream.url, current_net_obj, max_retries, timeout, otf_concurrency, handle, hosts
+            )
+        else:
+            parts = simple_video_stream(
+                stream.url,
+                current_net_obj,
+                max_retries,
+                timeout,
+                url_chunk_size,
+                chunk_size,
+                filesize,
+                tuner,
+                handle,
+                hosts,
+            )
+        async for x in parts:
+            file.write(x)
+            downloaded += len(x)
+            if callback:
+                callback(x, downloaded, filesize)
+    return downloaded
+
+
+async def simple_download(
+    stream: Union[stream.Stream, StreamHandle],
     filepath: str,  # TODO helpers.generate_unique_file_name Моржовый  оператор работает 3.8?
     net_obj: Optional[net.SessionRequest] = None,  # TODO send to stream info dict about video (title, lenght, is_live, upload_date, owner_name)
     max_retries: int = 1,
@@ -85,32 +440,126 @@ async def simple_download(
     url_chunk_size: int = 1024 * 1024 * 10,
     chunk_size: int = 1024 * 10,
     callback: Optional[Callable[[bytes, int, int], None]] = None,
+    otf_concurrency: int = 4,
+    adaptive: bool = False,
+    zero_copy: bool = False,
+    hosts: Optional[HostPool] = None,
     ) -> int:
-    """filepath is path to filename without extantion"""
+    """filepath is path to filename without extantion.
+    OTF streams are downloaded by segments, otf_concurrency segments at once.
+    adaptive=True sizes ranges by measured throughput (RangeTuner) instead of url_chunk_size.
+    zero_copy=True writes received data straight into the preallocated output file mapped
+    to memory, callback gets memoryview of the written part (valid only during the call).
+    With StreamHandle instead of stream an expiring url is renewed and the download resumed.
+    With hosts (HostPool) failed or slow ranges continue on mirror hosts of the url"""
+    handle = None
+    if isinstance(stream, StreamHandle):
+        handle = stream
+        stream = await handle.get_stream()
     if stream.is_live:
         raise DownloadingLiveError("cant work on live streams")
     current_net_obj: net.SessionRequest = net_obj if net_obj else stream.net_obj
-    filesize = await stream.get_filesize()
-    filesize_mb = filesize / (1024 * 1024)
-    logger.info(f"stream filesize is {filesize_mb} mb")
+    if stream.is_otf:
+        # size of an OTF stream is a request per segment, it is counted from the written segments
+        filesize = stream.filesize
+    else:
+        with tracing.span("download.filesize"):
+            filesize = await stream.get_filesize()
+        logger.info(f"stream filesize is {filesize / (1024 * 1024)} mb")
     downloaded = 0
+    tuner = RangeTuner() if adaptive else None
     ctime = time.time()
-    with open(f"{filepath}.{stream.ext}","wb") as file:
-        async for x in simple_video_stream(
-            stream.url,
-            current_net_obj,
-            max_retries,
-            timeout,
-            url_chunk_size,
-            chunk_size,
-            filesize
-        ):
-            file.write(x)
-            downloaded += len(x)
-            if callback:
-                callback(x, downloaded, filesize)
+    path = f"{filepath}.{stream.ext}"
+    if zero_copy and filesize and not stream.is_otf:
+        with tracing.span("download", itag=stream.itag, filesize=filesize, zero_copy=True):
+            file, mapped = _mmap_output(path, filesize)
+
+            def written(part: memoryview, done: int, total: int):
+                # counted here, so a failed download keeps the received part of the file
+                nonlocal downloaded
+                downloaded = done
+                if callback:
+                    callback(part, done, total)
+
+            try:
+                with memoryview(mapped) as view:
+                    await _download_into(
+                        stream.url, view, current_net_obj, max_retries, timeout, url_chunk_size, tuner, written,
+                        handle, hosts
+                    )
+                mapped.flush()
+            finally:
+                mapped.close()
+                if downloaded < filesize:
+                    file.truncate(downloaded)
+                file.close()
+    else:
+        downloaded = await _download_to_file(
+            stream, path, current_net_obj, max_retries, timeout, url_chunk_size, chunk_size,
+            callback, otf_concurrency, tuner, filesize, handle, hosts
+        )
     time_delta = time.time() - ctime
+    if stream.is_otf and not filesize:
+        filesize = downloaded
+    filesize_mb = filesize / (1024 * 1024)
+    if current_net_obj.metrics:
+        current_net_obj.metrics.observe_download(downloaded, time_delta)
     logger.info(f"downloaded {downloaded/(1024*1024)} mb  from {filesize_mb} mb")
     logger.info(f"downloaded in {time_delta} seconds")
     logger.info(f"{filesize_mb / time_delta} mb/sec")
+    if tuner:
+        logger.info(f"adaptive ranges {tuner.to_dict()}")
     return filesize
+
+
+async def download_to_sink(
+    stream: Union[stream.Stream, StreamHandle],
+    sink,
+    net_obj: Optional[net.SessionRequest] = None,
+    max_retries: int = 1,
+    timeout: int = 10,
+    url_chunk_size: int = 1024 * 1024 * 10,
+    chunk_size: int = 1024 * 64,
+    otf_concurrency: int = 4,
+    adaptive: bool = False,
+    close: Optional[bool] = None,
+    hosts: Optional[HostPool] = None,
+    ) -> int:
+    """Stream the media into sink as it arrives, without files.
+    sink is anything accepted by sink.make_sink: async or sync callable, asyncio.StreamWriter,
+    subprocess with stdin pipe, io.BytesIO. Next range is not read until sink accepted
+    the previous data. Returns count of written bytes"""
+    handle = None
+    if isinstance(stream, StreamHandle):
+        handle = stream
+        stream = await handle.get_stream()
+    if stream.is_live:
+        raise DownloadingLiveError("cant work on live streams")
+    current_net_obj: net.SessionRequest = net_obj if net_obj else stream.net_obj
+    target = make_sink(sink, close)
+    tuner = RangeTuner() if adaptive else None
+    downloaded = 0
+    ctime = time.time()
+    with tracing.span("download", itag=stream.itag, sink=type(target).__name__):
+        try:
+            if stream.is_otf:
+                parts = otf_video_stream(
+                    stream.url, current_net_obj, max_retries, timeout, otf_concurrency, handle, hosts
+                )
+            else:
+                with tracing.span("download.filesize"):
+                    filesize = await stream.get_filesize()
+                parts = simple_video_stream(
+                    stream.url, current_net_obj, max_retries, timeout, url_chunk_size, chunk_size, filesize, tuner,
+                    handle, hosts
+                )
+            async for x in parts:
+                await target.write(x)
+                downloaded += len(x)
+        finally:
+            await target.close()
+    time_delta = time.time() - ctime
+    if current_net_obj.metrics:
+        current_net_obj.metrics.observe_download(downloaded, time_delta)
+    logger.info(f"streamed {downloaded/(1024*1024)} mb to {type(target).__name__} in {time_delta} seconds")
+    return downloaded
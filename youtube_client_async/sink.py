@@ -0,0 +1,106 @@
+"""Destinations for streamed downloads.
+
+make_sink wraps what data should go to into an AsyncSink:
+    async callable          awaited for every chunk, its speed is the backpressure
+    sync callable           called for every chunk
+    asyncio.StreamWriter    written and drained
+    asyncio.subprocess.Process
+                            written to its stdin (e.g. ffmpeg -i pipe:0)
+    object with write()     io.BytesIO, opened files
+"""
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+
+class AsyncSink(ABC):
+    """Destination of download_to_sink. write is awaited, so a slow sink slows the download"""
+
+    @abstractmethod
+    async def write(self, data: bytes):
+        pass
+
+    async def close(self):
+        pass
+
+
+class CallableSink(AsyncSink):
+    def __init__(self, func):
+        self.func = func
+        self.is_async: bool = inspect.iscoroutinefunction(func)
+
+    async def write(self, data: bytes):
+        result = self.func(data)
+        if self.is_async or inspect.isawaitable(result):
+            await result
+
+
+class StreamWriterSink(AsyncSink):
+    """asyncio.StreamWriter, e.g. stdin of a subprocess or a socket"""
+
+    def __init__(self, writer: asyncio.StreamWriter, close: bool = True):
+        self.writer: asyncio.StreamWriter = writer
+        self._close: bool = close
+
+    async def write(self, data: bytes):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def close(self):
+        if self._close:
+            if self.writer.can_write_eof():
+                self.writer.write_eof()
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+class FileSink(AsyncSink):
+    """Object with sync write() like io.BytesIO or an opened file"""
+
+    def __init__(self, file, close: bool = False):
+        self.file = file
+        self._close: bool = close
+
+    async def write(self, data: bytes):
+        self.file.write(data)
+
+    async def close(self):
+        if self._close:
+            self.file.close()
+
+
+class ThrottledSink(AsyncSink):
+    """Takes written bytes from a bandwidth budget (download_manager.TokenBucket) before passing them on"""
+
+    def __init__(self, sink: AsyncSink, bucket):
+        self.sink: AsyncSink = sink
+        self.bucket = bucket
+
+    async def write(self, data: bytes):
+        await self.bucket.consume(len(data))
+        await self.sink.write(data)
+
+    async def close(self):
+        await self.sink.close()
+
+
+def make_sink(target: Any, close: Optional[bool] = None) -> AsyncSink:
+    """close is whether closing the sink closes the target, by default only
+    stream writers and subprocess stdin are closed (it is the end of input for them)"""
+    if isinstance(target, AsyncSink):
+        return target
+    if isinstance(target, asyncio.subprocess.Process):
+        if target.stdin is None:
+            raise ValueError("subprocess is started without stdin=asyncio.subprocess.PIPE")
+        return StreamWriterSink(target.stdin, True if close is None else close)
+    if isinstance(target, asyncio.StreamWriter):
+        return StreamWriterSink(target, True if close is None else close)
+    if hasattr(target, "write"):
+        return FileSink(target, bool(close))
+    if callable(target):
+        return CallableSink(target)
+    raise TypeError(f"{type(target)} can not be used as a sink")
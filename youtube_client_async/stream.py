@@ -1,12 +1,17 @@
+import asyncio
 import math
+import time
+from collections import OrderedDict
 from collections.abc import Sequence
 from datetime import datetime
-from typing import Callable, List, Optional, TypeVar, Union, overload
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar, Union, overload
 from urllib import parse
 
 from aiohttp.http_exceptions import HttpProcessingError
 
-from . import extract, itags, net
+from . import extract, format_selector, itags, net, tracing
+from .helpers import logger
 
 default_range_size = 9437184
 
@@ -20,7 +25,66 @@ class AudioTrackInfo:
         return f"<AudioTrack {self.name}/>"
 
 
+@lru_cache(maxsize=512)
+def _parse_mime(mime_type_sourse: str) -> tuple:
+    """(mime_type, codecs, type, ext, video_codec, audio_codec), every manifest repeats
+    the same dozen of mime strings, so they are parsed once"""
+    # 'video/webm; codecs="vp8, vorbis"' -> 'video/webm', ['vp8', 'vorbis']
+    mime_type, codecs = extract.mime_type_codec(mime_type_sourse)
+    # 'video/webm' -> 'video', 'webm'
+    type, ext = mime_type.split("/")
+    # ['vp8', 'vorbis'] -> video_codec: vp8, audio_codec: vorbis. DASH
+    # streams return NoneType for audio/video depending.
+    video = None
+    audio = None
+    if not len(codecs) % 2:
+        video, audio = codecs
+    elif type == "video":
+        video = codecs[0]
+    elif type == "audio":
+        audio = codecs[0]
+    return mime_type, tuple(codecs), type, ext, video, audio
+
+
+_format_profile = lru_cache(maxsize=None)(itags.get_format_profile)
+
+# sizes from StreamQuery.resolve_filesizes by (video_id, itag, audio track id)
+_filesizes: "OrderedDict[tuple, int]" = OrderedDict()
+max_cached_filesizes = 4096
+
+_filesize_units = {"b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+
+
+def parse_filesize(filesize: Union[int, str]) -> int:
+    """50 -> 50, "50mb" -> 52428800"""
+    if isinstance(filesize, int):
+        return filesize
+    value = filesize.strip().lower()
+    for unit in ("kb", "mb", "gb", "b"):
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * _filesize_units[unit])
+    return int(value)
+
+
+_unset = object()
+
+
 class Stream:
+    """Format of the manifest. Fields are read from raw when they are used,
+    derived ones (codecs, itag profile) are computed once on first use."""
+    __slots__ = (
+        "net_obj",
+        "duration",
+        "title",
+        "raw",
+        "itag",
+        "url",
+        "_content_lenght",
+        "_lparsed_url",
+        "_mime",
+        "_audio_track_info",
+    )
+
     def __init__(self, raw, duration, title, net_obj: net.SessionRequest):
         self.net_obj: net.SessionRequest = net_obj
         self.duration = duration
@@ -28,64 +92,167 @@ class Stream:
         self.raw = raw
         self.itag = raw["itag"]
         self.url: str = raw["url"]
-        self._content_lenght: str = int(raw.get("contentLength",0))
-        self.average_bitrate: int = raw.get("averageBitrate",None)
-        self.mime_type_sourse: str = raw["mimeType"]
-        self.bitrate: int = raw["bitrate"]
-        self.last_modified: str = raw.get("lastModified")
-        self.quality: str = raw["quality"]
-        self.quality_label: str = raw.get("qualityLabel")
-        self.projection_type: str = raw["projectionType"]
-        self.approx_duration: str = raw.get("approxDurationMs")
-        
-        self.color_info_matrix_coefficients: str = None
-        self.color_info_primaries: str = None
-        self.color_info_transfer_characteristics: str = None
-        _color_info = raw.get("colorInfo")
-        if _color_info:
-            self.color_info_primaries = _color_info.get("primaries")
-            self.color_info_transfer_characteristics = _color_info.get("transferCharacteristics")
-            self.color_info_matrix_coefficients = _color_info.get("matrixCoefficients")
-        
-        self.fps: float = raw.get("fps",None)
-        self.width: int = raw.get("width",None)
-        self.height: int = raw.get("height",None)
-        self.video_quality_lable = raw.get("qualityLabel")
-
-        self.audio_quality: str = raw.get("audioQuality")
-        self.audio_channels: int = raw.get("audioChannels")
-        self.audio_sample_rate: str = raw.get("audioSampleRate")
-        self.loudness_db: float = raw.get("loudnessDb")
-
-        # 'video/webm; codecs="vp8, vorbis"' -> 'video/webm', ['vp8', 'vorbis']
-        self.mime_type, self.codecs = extract.mime_type_codec(self.mime_type_sourse)
-        # 'video/webm' -> 'video', 'webm'
-        self.type, self.ext = self.mime_type.split("/")
-
-        # ['vp8', 'vorbis'] -> video_codec: vp8, audio_codec: vorbis. DASH
-        # streams return NoneType for audio/video depending.
-        self.video_codec, self.audio_codec = self.parse_codecs()
-
-        self._filesize_kb: Optional[float] = float(math.ceil(float(self._content_lenght) / 1024 * 1000) / 1000)
-        self._filesize_mb: Optional[float] = float(math.ceil(float(self._content_lenght) / 1024 / 1024 * 1000) / 1000)
-        self._filesize_gb: Optional[float] = float(math.ceil(float(self._content_lenght) / 1024 / 1024 / 1024 * 1000) / 1000)
-
-        # Additional information about the stream format, such as resolution,
-        # frame rate, and whether the stream is live (HLS) or 3D.
-        itag_profile = itags.get_format_profile(self.itag)
-        self.is_dash = itag_profile["is_dash"]
-        self.abr = itag_profile["abr"]  # average bitrate (audio streams only)
-        self.resolution = itag_profile[
-            "resolution"
-        ]  # resolution (e.g.: "480p")
-        self.is_3d: bool = itag_profile["is_3d"]
-        self.is_hdr: bool = itag_profile["is_hdr"]
-        # self.is_live:bool = itag_profile["is_live"] # not true
-        self.is_otf: bool = raw.get("is_otf", None)
+        self._content_lenght: int = int(raw.get("contentLength", 0))
         self._lparsed_url = None
+        self._mime: Optional[tuple] = None
+        self._audio_track_info = _unset
+
+    @property
+    def average_bitrate(self) -> Optional[int]:
+        return self.raw.get("averageBitrate")
+
+    @property
+    def mime_type_sourse(self) -> str:
+        return self.raw["mimeType"]
+
+    @property
+    def bitrate(self) -> int:
+        return self.raw.get("bitrate")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.raw.get("lastModified")
+
+    @property
+    def quality(self) -> str:
+        return self.raw.get("quality")
+
+    @property
+    def quality_label(self) -> Optional[str]:
+        return self.raw.get("qualityLabel")
+
+    video_quality_lable = quality_label
+
+    @property
+    def projection_type(self) -> str:
+        return self.raw.get("projectionType")
+
+    @property
+    def approx_duration(self) -> Optional[str]:
+        return self.raw.get("approxDurationMs")
+
+    @property
+    def color_info_primaries(self) -> Optional[str]:
+        return self.raw.get("colorInfo", {}).get("primaries")
+
+    @property
+    def color_info_transfer_characteristics(self) -> Optional[str]:
+        return self.raw.get("colorInfo", {}).get("transferCharacteristics")
+
+    @property
+    def color_info_matrix_coefficients(self) -> Optional[str]:
+        return self.raw.get("colorInfo", {}).get("matrixCoefficients")
+
+    @property
+    def fps(self) -> Optional[float]:
+        return self.raw.get("fps")
+
+    @property
+    def width(self) -> Optional[int]:
+        return self.raw.get("width")
+
+    @property
+    def height(self) -> Optional[int]:
+        return self.raw.get("height")
+
+    @property
+    def audio_quality(self) -> Optional[str]:
+        return self.raw.get("audioQuality")
+
+    @property
+    def audio_channels(self) -> Optional[int]:
+        return self.raw.get("audioChannels")
+
+    @property
+    def audio_sample_rate(self) -> Optional[str]:
+        return self.raw.get("audioSampleRate")
+
+    @property
+    def loudness_db(self) -> Optional[float]:
+        return self.raw.get("loudnessDb")
+
+    @property
+    def _mime_info(self) -> tuple:
+        mime = self._mime
+        if mime is None:
+            mime = self._mime = _parse_mime(self.raw["mimeType"])
+        return mime
+
+    @property
+    def mime_type(self) -> str:
+        return self._mime_info[0]
+
+    @property
+    def codecs(self) -> List[str]:
+        return list(self._mime_info[1])
+
+    @property
+    def type(self) -> str:
+        return self._mime_info[2]
+
+    @property
+    def ext(self) -> str:
+        return self._mime_info[3]
+
+    @property
+    def video_codec(self) -> Optional[str]:
+        return self._mime_info[4]
+
+    @property
+    def audio_codec(self) -> Optional[str]:
+        return self._mime_info[5]
+
+    @property
+    def _filesize_kb(self) -> float:
+        return float(math.ceil(float(self._content_lenght) / 1024 * 1000) / 1000)
+
+    @property
+    def _filesize_mb(self) -> float:
+        return float(math.ceil(float(self._content_lenght) / 1024 / 1024 * 1000) / 1000)
+
+    @property
+    def _filesize_gb(self) -> float:
+        return float(math.ceil(float(self._content_lenght) / 1024 / 1024 / 1024 * 1000) / 1000)
+
+    # Additional information about the stream format, such as resolution,
+    # frame rate, and whether the stream is live (HLS) or 3D.
+    @property
+    def is_dash(self) -> bool:
+        return _format_profile(self.itag)["is_dash"]
+
+    @property
+    def abr(self) -> Optional[str]:
+        """average bitrate (audio streams only)"""
+        return _format_profile(self.itag)["abr"]
+
+    @property
+    def resolution(self) -> Optional[str]:
+        """resolution (e.g.: "480p")"""
+        return _format_profile(self.itag)["resolution"]
 
-        self.contains_audio_track_info: bool = "audioTrack" in raw
-        self.audio_track_info: Optional[AudioTrackInfo] = AudioTrackInfo(raw["audioTrack"]) if self.contains_audio_track_info else None
+    @property
+    def is_3d(self) -> bool:
+        return _format_profile(self.itag)["is_3d"]
+
+    @property
+    def is_hdr(self) -> bool:
+        return _format_profile(self.itag)["is_hdr"]
+
+    # is_live of the itag profile is not true, see is_live from url
+    @property
+    def is_otf(self) -> Optional[bool]:
+        return self.raw.get("is_otf", None)
+
+    @property
+    def contains_audio_track_info(self) -> bool:
+        return "audioTrack" in self.raw
+
+    @property
+    def audio_track_info(self) -> Optional[AudioTrackInfo]:
+        info = self._audio_track_info
+        if info is _unset:
+            info = self._audio_track_info = AudioTrackInfo(self.raw["audioTrack"]) if "audioTrack" in self.raw else None
+        return info
 
     #From url
     @property
@@ -101,6 +268,14 @@ class Stream:
         expire = self._parsed_url["expire"][0]
         return datetime.utcfromtimestamp(int(expire))
 
+    @property
+    def expires_in(self) -> float:
+        """Seconds until the url expires, inf for urls without expire"""
+        expire = self._parsed_url.get("expire")
+        if not expire:
+            return math.inf
+        return int(expire[0]) - time.time()
+
     @property
     def current_ip(self) -> str:
         return self._parsed_url['ip'][0]
@@ -181,7 +356,10 @@ class Stream:
         :returns:
             Filesize (in bytes) of the stream.
         """
-        if self._content_lenght == 0:
+        if self._content_lenght == 0 and self.is_otf:
+            # OTF has no single file to ask for Content-Length, only segments
+            self._content_lenght = await self.net_obj.seq_filesize(self.url)
+        elif self._content_lenght == 0:
             try:
                 self._content_lenght = await self.net_obj.get_lenght(self.url)
             except HttpProcessingError as e:
@@ -191,15 +369,24 @@ class Stream:
         return self._content_lenght
         # TODO kb, mb, gb
 
+    @property
+    def filesize(self) -> int:
+        """Known file size in bytes, 0 until get_filesize or StreamQuery.resolve_filesizes
+        when the manifest has no contentLength"""
+        return self._content_lenght or 0
+
     @property
     def filesize_approx(self) -> int:
         """Get approximate filesize of the video
 
-        Falls back to HTTP call if there is not sufficient information to approximate
+        The exact size when it is known, else estimated from duration and bitrate,
+        else 0 (use get_filesize or StreamQuery.resolve_filesizes)
 
         :rtype: int
         :returns: size of video in bytes
         """
+        if self._content_lenght:
+            return self._content_lenght
         if self.duration and self.bitrate:
             return int(
                 (int(self.duration) * self.bitrate) / 8
@@ -227,7 +414,7 @@ class Stream:
         """
         # if codecs has two elements (e.g.: ['vp8', 'vorbis']): 2 % 2 = 0
         # if codecs has one element (e.g.: ['vp8']) 1 % 2 = 1
-        return bool(len(self.codecs) % 2)
+        return bool(len(self._mime_info[1]) % 2)
         # return self.raw["is_adaptive"]
 
     @property
@@ -275,15 +462,7 @@ class Stream:
             A two element tuple with audio and video codecs.
 
         """
-        video = None
-        audio = None
-        if not self.is_adaptive:
-            video, audio = self.codecs
-        elif self.includes_video:
-            video = self.codecs[0]
-        elif self.includes_audio:
-            audio = self.codecs[0]
-        return video, audio
+        return self.video_codec, self.audio_codec
 
     def __repr__(self) -> str:
         parts = ['itag="{s.itag}"', 'mime_type="{s.mime_type}"']
@@ -303,20 +482,67 @@ class Stream:
 
 StreamQueryType = TypeVar("StreamQueryType",bound="StreamQuery")
 class StreamQuery(Sequence):
-    def __init__(self, streams:List[Stream]):
+    """Streams with indexes by itag, resolution, mime type, extension, codecs and
+    audio track id. Lookups by these keys and filters combining them do not scan all streams.
+    The indexes are built on the first lookup and only for the root query (the one of
+    get_streams), queries derived by filters, order_by and slicing look up in its indexes."""
+    def __init__(self, streams:List[Stream], video_id: Optional[str] = None, root: Optional["StreamQuery"] = None):
         self.items: List[Stream] = streams
+        self.video_id: Optional[str] = video_id
         self.current_index = 0
-    def get_by_itag(self, itag) -> Stream:
-        for x in self.items:
-            if int(x.itag) == int(itag):
-                return x
-        return None
-
-    def _filter(self, filters: [Callable[[Stream], bool]]) -> StreamQueryType:
-        fmt_streams = self.items
-        for filter_lambda in filters:
-            fmt_streams = filter(filter_lambda, fmt_streams)
-        return StreamQuery(list(fmt_streams))
+        self._root: StreamQuery = root if root is not None else self
+        # value: streams, streams with several audio tracks share the itag
+        self._indexes: Optional[Dict[str, Dict[Any, List[Stream]]]] = None
+
+    def _derive(self, streams: List[Stream]) -> StreamQueryType:
+        return StreamQuery(streams, self.video_id, self._root)
+
+    def _get_indexes(self) -> Dict[str, Dict[Any, List[Stream]]]:
+        root = self._root
+        if root._indexes is None:
+            indexes: Dict[str, Dict[Any, List[Stream]]] = {
+                "itag": {},
+                "resolution": {},
+                "mime_type": {},
+                "type": {},
+                "ext": {},
+                "video_codec": {},
+                "audio_codec": {},
+                "audio_track_id": {},
+            }
+            for s in root.items:
+                for key, index in indexes.items():
+                    if key == "itag":
+                        value = int(s.itag)
+                    elif key == "audio_track_id":
+                        value = s.audio_track_info.id if s.audio_track_info else None
+                    else:
+                        value = getattr(s, key)
+                    if value is not None:
+                        index.setdefault(value, []).append(s)
+            root._indexes = indexes
+        return root._indexes
+
+    def get_by_itag(self, itag) -> Optional[Stream]:
+        found = self._get_indexes()["itag"].get(int(itag))
+        if not found or self._root is self:
+            return found[0] if found else None
+        ids = {id(s) for s in found}
+        return next((s for s in self.items if id(s) in ids), None)
+
+    def _lookup(self, key: str, values) -> Set[int]:
+        """ids of the streams with any of values"""
+        index = self._get_indexes()[key]
+        if not isinstance(values, (list, tuple, set, frozenset)):
+            values = (values,)
+        return {id(s) for value in values for s in index.get(value, ())}
+
+    def _filter(self, filters: [Callable[[Stream], bool]], ids: Optional[Set[int]] = None) -> StreamQueryType:
+        """ids (of streams found in the indexes) narrow the streams before filters, in the order of items"""
+        fmt_streams = self.items if ids is None else [s for s in self.items if id(s) in ids]
+        if filters:
+            fmt_streams = [s for s in fmt_streams if all(f(s) for f in filters)]
+        return self._derive(list(fmt_streams))
     def filter(
         self,
         fps=None,
@@ -341,60 +567,60 @@ class StreamQuery(Sequence):
         contains_audio_track_info:bool=None,
         audio_track_id:str=None,
         custom_filter_functions=None,
+        itag=None,
     ) -> StreamQueryType:
-        filters = []
-        if res or resolution:
-            if isinstance(res, str) or isinstance(resolution, str):
-                filters.append(lambda s: s.resolution == (res or resolution))
-            elif isinstance(res, list) or isinstance(resolution, list):
-                filters.append(lambda s: s.resolution in (res or resolution))
+        """resolution, mime_type, type, subtype, codecs, audio_track_id and itag are
+        answered from the indexes, resolution and itag can be lists"""
+        ids: Optional[Set[int]] = None
 
-        if fps:
-            filters.append(lambda s: s.fps == fps)
+        def narrow(found: Set[int]):
+            nonlocal ids
+            ids = found if ids is None else ids & found
+
+        if itag is not None:
+            itags = itag if isinstance(itag, (list, tuple, set, frozenset)) else [itag]
+            narrow(self._lookup("itag", [int(i) for i in itags]))
+
+        if res or resolution:
+            narrow(self._lookup("resolution", res or resolution))
 
         if mime_type:
-            filters.append(lambda s: s.mime_type == mime_type)
+            narrow(self._lookup("mime_type", mime_type))
 
         if type:
-            filters.append(lambda s: s.type == type)
+            narrow(self._lookup("type", type))
 
         if subtype or file_extension:
-            filters.append(lambda s: s.subtype == (subtype or file_extension))
-
-        if abr or bitrate:
-            filters.append(lambda s: s.abr == (abr or bitrate))
+            narrow(self._lookup("ext", subtype or file_extension))
 
         if video_codec:
-            filters.append(lambda s: s.video_codec == video_codec)
+            narrow(self._lookup("video_codec", video_codec))
 
         if audio_codec:
-            filters.append(lambda s: s.audio_codec == audio_codec)
+            narrow(self._lookup("audio_codec", audio_codec))
+
+        if audio_track_id is not None:
+            narrow(self._lookup("audio_track_id", audio_track_id))
+
+        filters = []
+        if fps:
+            filters.append(lambda s: s.fps == fps)
+
+        if abr or bitrate:
+            filters.append(lambda s: s.abr == (abr or bitrate))
 
         if only_audio:
-            filters.append(
-                lambda s: (
-                    s.only_audio
-                ),
-            )
+            filters.append(lambda s: s.only_audio)
 
         if only_video:
-            filters.append(
-                lambda s: (
-                    s.only_video
-                ),
-            )
+            filters.append(lambda s: s.only_video)
+
         if contains_audio:
-            filters.append(
-                lambda s:{
-                    s.includes_audio
-                }
-            )
+            filters.append(lambda s: s.includes_audio)
+
         if contains_video:
-            filters.append(
-                lambda s:{
-                    s.includes_video
-                }
-            )
+            filters.append(lambda s: s.includes_video)
+
         if progressive:
             filters.append(lambda s: s.is_progressive)
 
@@ -409,8 +635,6 @@ class StreamQuery(Sequence):
         
         if contains_audio_track_info is not None:
             filters.append(lambda s: s.contains_audio_track_info == contains_audio_track_info)
-        if audio_track_id is not None:
-            filters.append(lambda s: s.contains_audio_track_info and s.audio_track_info.id == audio_track_id)
         # if size_less_than is not None:
         #     rfilter = None
         #     if isinstance(size_less_than,str):
@@ -428,7 +652,7 @@ class StreamQuery(Sequence):
         #     else:
         #         raise Exception(f"not understand command {rfilter}")
         #     filters.append(rfilter)
-        return self._filter(filters)
+        return self._filter(filters, ids)
     
     def order_by(self, attribute_name: str, reverse: bool = False) -> StreamQueryType:
         """Apply a sort order. Filters out stream the do not have the attribute.
@@ -448,7 +672,7 @@ class StreamQuery(Sequence):
             # Try to return a StreamQuery sorted by the integer representations
             # of the values.
             try:
-                return StreamQuery(
+                return self._derive(
                     sorted(
                         has_attribute,
                         key=lambda s: int(
@@ -461,10 +685,13 @@ class StreamQuery(Sequence):
             except ValueError:
                 pass
 
-        return StreamQuery(
-            sorted(has_attribute, key=lambda s: getattr(s, attribute_name))
-        )
+        return self._derive(sorted(has_attribute, key=lambda s: getattr(s, attribute_name), reverse=reverse))
     
+    def select(self, expression: str) -> Union[None, Stream, Tuple[Stream, Stream]]:
+        """Best stream or (video, audio) pair by format_selector expression,
+        e.g. "(bv[height<=1080][vcodec^=vp9]/bv[height<=1080])+ba[acodec=opus][default]" """
+        return format_selector.compile_selector(expression).select(self.items)
+
     def sort_by_filesize(self,reverse: bool = False)->StreamQueryType:
         return self.order_by("filesize_approx", reverse=reverse)
 
@@ -474,9 +701,6 @@ class StreamQuery(Sequence):
     def sort_by_bitrate(self, reverse: bool = False) -> StreamQueryType:
         return self.order_by("bitrate", reverse)
 
-    def get_by_itag(self, itag: int) -> Stream:
-        return self._filter(lambda x: x.itag == itag)
-
     def get_by_audio_codec(self, codec: str) -> StreamQueryType:
         return self.filter(audio_codec=codec)
 
@@ -510,8 +734,8 @@ class StreamQuery(Sequence):
     def get_audio_contains(self) -> StreamQueryType:
         return self.filter(contains_audio=True)
 
-    def otf(self,otf:bool=False) -> StreamQueryType:
-        return self._filter([lambda s: s.is_otf == is_otf])
+    def otf(self, otf: bool = False) -> StreamQueryType:
+        return self._filter([lambda s: bool(s.is_otf) == otf])
 
     def contains_audio_track_info(self, val: bool = True) -> StreamQueryType:
         return self.filter(contains_audio_track_info=val)
@@ -521,10 +745,55 @@ class StreamQuery(Sequence):
 
     def get_by_audio_track_name(self, name: str) -> StreamQueryType:
         ln = name.lower()
-        return self._filter([lambda x: contains_audio_track_info and audio_track_info.name.lower() == ln])
+        return self._filter([lambda x: x.contains_audio_track_info and x.audio_track_info.name.lower() == ln])
+
+    async def resolve_filesizes(self, concurrency: int = 8) -> StreamQueryType:
+        """Get sizes of all streams without contentLength at once, concurrency requests
+        at a time. Sizes are cached by (video_id, itag, audio track), streams that failed
+        keep filesize 0. Returns self"""
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, not {concurrency}")
+        missing = []
+        for s in self.items:
+            if s._content_lenght:
+                continue
+            key = self._filesize_key(s)
+            size = _filesizes.get(key) if key else None
+            if size:
+                s._content_lenght = size
+            else:
+                missing.append(s)
+        if not missing:
+            return self
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def resolve(s: Stream):
+            async with semaphore:
+                return await s.get_filesize()
+
+        with tracing.span("stream.filesizes", count=len(missing)):
+            results = await asyncio.gather(*(resolve(s) for s in missing), return_exceptions=True)
+        for s, result in zip(missing, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"filesize of itag={s.itag} is unknown: {result!r}")
+                continue
+            key = self._filesize_key(s)
+            if key and result:
+                _filesizes[key] = result
+                if len(_filesizes) > max_cached_filesizes:
+                    _filesizes.popitem(last=False)
+        return self
+
+    def _filesize_key(self, s: Stream) -> Optional[tuple]:
+        if self.video_id is None:
+            return None
+        return self.video_id, int(s.itag), s.audio_track_info.id if s.audio_track_info else None
 
-    def max_filesize(self, filesize: str):
-        ...  # TODO max size
+    def max_filesize(self, filesize: Union[int, str]) -> StreamQueryType:
+        """Streams not larger than filesize, bytes or a string like "50mb".
+        Unknown sizes are estimated (filesize_approx), resolve_filesizes first for exact ones"""
+        limit = parse_filesize(filesize)
+        return self._filter([lambda s: 0 < s.filesize_approx <= limit])
 
     def get_by_ext(self, ext: str)->StreamQueryType:
         return self.filter(subtype=ext)
@@ -545,7 +814,7 @@ class StreamQuery(Sequence):
 
     @property
     def reversed(self) -> StreamQueryType:
-        return StreamQuery(self.items[::-1])
+        return self._derive(self.items[::-1])
 
     @overload
     def __getitem__(self, i: slice) -> StreamQueryType:
@@ -557,7 +826,7 @@ class StreamQuery(Sequence):
 
     def __getitem__(self, i: Union[slice, int]) -> Union[StreamQueryType, Stream]:
         if isinstance(i, slice):
-            return StreamQuery(self.items[i])
+            return self._derive(self.items[i])
         return self.items[i]
 
     def __len__(self) -> int:
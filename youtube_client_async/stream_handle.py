@@ -0,0 +1,87 @@
+"""Streams that outlive their signed url.
+
+Stream urls are signed for several hours (Stream.expiration), a download
+queued for longer fails with 403. StreamHandle keeps the video and the itag
+and gets a fresh url from get_streams when the current one is about to expire
+or is answered with 403. The player js and its Cipher are cached, so renewal is
+one innertube request.
+
+    streams = await video.get_streams()
+    handle = video.get_stream_handle(streams.filter(only_video=True).first)
+    await yc.simple_download(handle, "out/video")  # renews the url between ranges
+"""
+import asyncio
+from typing import Optional
+
+from . import exceptions, stream, tracing
+from .helpers import logger
+
+
+class StreamExpiredError(exceptions.YoutubeClientError):
+    """Url of the stream can not be renewed"""
+
+
+class StreamHandle:
+    """Stream of a playable with renewable url.
+
+    :param playable:
+        video, short or live video the stream comes from (PlayableBase)
+    :param float margin:
+        seconds before expiration when the url is renewed
+    """
+
+    def __init__(self, playable, stream: stream.Stream, margin: float = 600.0):
+        self.playable = playable
+        self.stream: stream.Stream = stream
+        self.margin: float = margin
+        self.itag: int = stream.itag
+        self.audio_track_id: Optional[str] = stream.audio_track_info.id if stream.audio_track_info else None
+        self.renewals: int = 0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def url(self) -> str:
+        return self.stream.url
+
+    @property
+    def expires_in(self) -> float:
+        """Seconds until the url expires"""
+        return self.stream.expires_in
+
+    def is_expiring(self, margin: Optional[float] = None) -> bool:
+        return self.expires_in <= (self.margin if margin is None else margin)
+
+    async def refresh(self, stale_url: Optional[str] = None) -> stream.Stream:
+        """Get a new url from get_streams.
+        stale_url is the url that failed, when it was renewed by someone else meanwhile
+        the current stream is returned without a new request"""
+        async with self._lock:
+            if stale_url is not None and stale_url != self.stream.url:
+                return self.stream
+            with tracing.span("stream.refresh", itag=self.itag):
+                # the cached player response holds the old urls
+                self.playable._ios_initial_player = None
+                streams = await self.playable.get_streams()
+            found = streams.filter(itag=self.itag, audio_track_id=self.audio_track_id)
+            if not found:
+                raise StreamExpiredError(f"itag {self.itag} is not in the renewed streams of {self.playable.video_id}")
+            s = found.first
+            # filesize is the same, keep it to not ask for it again
+            if s._content_lenght == 0:
+                s._content_lenght = self.stream._content_lenght
+            self.stream = s
+            self.renewals += 1
+            logger.info(f"renewed url of itag={self.itag}, expires in {self.expires_in:.0f} s")
+            return self.stream
+
+    async def get_stream(self) -> stream.Stream:
+        """Stream with url valid for at least margin seconds"""
+        if self.is_expiring():
+            return await self.refresh(self.stream.url)
+        return self.stream
+
+    async def get_url(self) -> str:
+        return (await self.get_stream()).url
+
+    def __repr__(self) -> str:
+        return f"<StreamHandle itag={self.itag} expires_in={self.expires_in:.0f} renewals={self.renewals}/>"
@@ -0,0 +1,165 @@
+"""Optional tracing hooks.
+
+Tracing is disabled by default, then tracing.span() returns a shared no-op
+object and no tracer is called. The call sites still pass their attributes
+to span(), so they should stay cheap (no formatting of large values). Enable
+it by set_tracer() with a Tracer implementation: CallbackTracer for plain callbacks or
+OpenTelemetryTracer that wraps any opentelemetry tracer
+(opentelemetry is not a dependency of this package).
+
+Span names used by the package:
+    get_video, get_streams, http.request, json.decode, innertube.<endpoint>,
+    extract.initial_data, extract.ytcfg, extract.initial_player, extract.js_url,
+    extract.descrambler, cipher.discover, cipher.signature, cipher.n, cipher.service,
+    stream.build, stream.refresh, stream.filesizes, download, download.filesize,
+    download.range, download.segment, download.pair, live.record, live.segment,
+    manifest.resolve, manifest.decipher
+"""
+import contextvars
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+_tracer: Optional["Tracer"] = None
+_current_span: contextvars.ContextVar = contextvars.ContextVar("youtube_client_async_span", default=None)
+
+
+class Tracer(ABC):
+    """Base class of tracing backends.
+    start_span returns any object that will be passed back to set_attribute and end_span"""
+
+    @abstractmethod
+    def start_span(self, name: str, attributes: Dict[str, Any], parent: Any) -> Any:
+        pass
+
+    def set_attribute(self, span: Any, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    def end_span(self, span: Any, error: Optional[BaseException]):
+        pass
+
+
+class CallbackTracer(Tracer):
+    """Calls on_start(name, attributes) and on_end(name, attributes, duration, error).
+    Attributes set inside the span are visible in on_end."""
+
+    def __init__(
+        self,
+        on_start: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        on_end: Optional[Callable[[str, Dict[str, Any], float, Optional[BaseException]], None]] = None,
+    ):
+        self.on_start = on_start
+        self.on_end = on_end
+
+    def start_span(self, name: str, attributes: Dict[str, Any], parent: Any) -> Any:
+        if parent is not None:
+            attributes["parent"] = parent[0]
+        if self.on_start:
+            self.on_start(name, attributes)
+        return (name, attributes, time.perf_counter())
+
+    def set_attribute(self, span: Any, key: str, value: Any):
+        span[1][key] = value
+
+    def end_span(self, span: Any, error: Optional[BaseException]):
+        if self.on_end:
+            name, attributes, start_time = span
+            self.on_end(name, attributes, time.perf_counter() - start_time, error)
+
+
+class OpenTelemetryTracer(Tracer):
+    """Adapter for opentelemetry.trace.Tracer.
+
+    tracer = OpenTelemetryTracer(opentelemetry.trace.get_tracer("youtube_client_async"))"""
+
+    def __init__(self, otel_tracer):
+        from opentelemetry import trace as otel_trace  # optional dependency
+
+        self.otel_tracer = otel_tracer
+        self._otel_trace = otel_trace
+
+    def start_span(self, name: str, attributes: Dict[str, Any], parent: Any) -> Any:
+        context = self._otel_trace.set_span_in_context(parent) if parent is not None else None
+        return self.otel_tracer.start_span(
+            name,
+            context=context,
+            attributes={k: v for k, v in attributes.items() if v is not None}
+        )
+
+    def set_attribute(self, span: Any, key: str, value: Any):
+        if value is not None:
+            span.set_attribute(key, value)
+
+    def end_span(self, span: Any, error: Optional[BaseException]):
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(self._otel_trace.Status(self._otel_trace.StatusCode.ERROR, str(error)))
+        span.end()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attributes", "activate", "span", "token")
+
+    def __init__(self, tracer: Tracer, name: str, attributes: Dict[str, Any], activate: bool):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.activate = activate
+        self.span = None
+        self.token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.tracer.set_attribute(self.span, key, value)
+
+    def __enter__(self):
+        self.span = self.tracer.start_span(self.name, self.attributes, _current_span.get())
+        if self.activate:
+            self.token = _current_span.set(self.span)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.token is not None:
+            try:
+                _current_span.reset(self.token)
+            except ValueError:
+                # closed from another context (e.g. async generator finalization)
+                pass
+        self.tracer.end_span(self.span, exc_val)
+        return False
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    """Enable tracing with tracer. None disables tracing"""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, activate: bool = True, **attributes):
+    """Context manager around a traced block.
+
+    activate=False does not make the span a parent of spans opened inside,
+    use it in async generators where the block is interleaved with the caller."""
+    if _tracer is None:
+        return _null_span
+    return _Span(_tracer, name, attributes, activate)
@@ -1,8 +1,29 @@
 from dataclasses import dataclass
-from typing import List, NamedTuple, Optional
+from typing import Dict, List, NamedTuple, Optional
 from urllib import parse
 
-from . import chapter, comment, extract, helpers, innertube, net, playable, thumbnail
+from . import chapter, comment, export, extract, helpers, innertube, net, playable, thumbnail, tracing
+
+_watch_results = "contents|twoColumnWatchNextResults|results|results|contents"
+_primary_renderer_path = helpers.compile_path(_watch_results + "|0|videoPrimaryInfoRenderer", int_include=True)
+_secondary_renderer_path = helpers.compile_path(_watch_results + "|1|videoSecondaryInfoRenderer", int_include=True)
+_metadata_rows_path = helpers.compile_path(
+    _watch_results + "|1|videoSecondaryInfoRenderer|metadataRowContainer|metadataRowContainerRenderer",
+    int_include=True,
+)
+_rating_buttons_path = helpers.compile_path(
+    "videoActions|menuRenderer|topLevelButtons|0|segmentedLikeDislikeButtonViewModel", int_include=True
+)
+_like_button_view_model = "likeButtonViewModel|likeButtonViewModel|"
+_like_status_path = helpers.compile_path(_like_button_view_model + "likeStatusEntity|likeStatus")
+_toggling_disabled_path = helpers.compile_path(
+    _like_button_view_model + "toggleButtonViewModel|toggleButtonViewModel|isTogglingDisabled"
+)
+_default_like_view_model_path = helpers.compile_path(
+    _like_button_view_model + "toggleButtonViewModel|toggleButtonViewModel|defaultButtonViewModel|buttonViewModel"
+)
+_accessibility_text_path = helpers.compile_path("accessibilityText")
+_subscriber_count_path = helpers.compile_path("owner|videoOwnerRenderer|subscriberCountText|simpleText")
 
 
 def get_video_url(id: str) -> str:
@@ -109,6 +130,22 @@ class ShortUseVideo:
 class VideoBase(playable.PlayableBase):
     """Class for video on youtube"""
 
+    _unused_initial_data = (
+        ("contents", "twoColumnWatchNextResults", "secondaryResults"),  # related videos
+        ("frameworkUpdates",),
+        ("overlay",),
+    )
+
+    record_fields: Dict[str, export.RecordField] = {
+        **playable.PlayableBase.record_fields,
+        "likes_count": export.field(
+            "initial_data",
+            _primary_renderer_path, _rating_buttons_path, _default_like_view_model_path, _accessibility_text_path,
+        ),
+        "like_status": export.field("initial_data", _primary_renderer_path, _rating_buttons_path, _like_status_path),
+        "owner_subscribers_count": export.field("initial_data", _secondary_renderer_path, _subscriber_count_path),
+    }
+
     def __init__(
         self,
         url: str,
@@ -161,8 +198,7 @@ class VideoBase(playable.PlayableBase):
 
     @property
     def _primary_renderer(self) -> dict:
-        return self.initial_data["contents"]["twoColumnWatchNextResults"]["results"][
-            "results"]["contents"][0]["videoPrimaryInfoRenderer"]
+        return _primary_renderer_path(self.initial_data)
 
     @property
     def tags(self) -> Optional[str]:
@@ -173,26 +209,23 @@ class VideoBase(playable.PlayableBase):
 
     @property
     def _rating_buttons(self) -> dict:
-        return self._primary_renderer["videoActions"]["menuRenderer"][
-            "topLevelButtons"][0]["segmentedLikeDislikeButtonViewModel"]
+        return _rating_buttons_path(self._primary_renderer)
 
     @property
     def _default_like_view_model(self) -> dict:
-        return self._rating_buttons["likeButtonViewModel"]["likeButtonViewModel"][
-            "toggleButtonViewModel"]["toggleButtonViewModel"]["defaultButtonViewModel"]["buttonViewModel"]
+        return _default_like_view_model_path(self._rating_buttons)
 
     @property
     def likes_count(self) -> str:
-        return self._default_like_view_model["accessibilityText"]
+        return _accessibility_text_path(self._default_like_view_model)
 
     @property
     def like_status(self) -> str:
-        return self._rating_buttons["likeButtonViewModel"]["likeButtonViewModel"]["likeStatusEntity"]["likeStatus"]
+        return _like_status_path(self._rating_buttons)
 
     @property
     def like_is_disabled(self) -> str:
-        return self._rating_buttons["likeButtonViewModel"]["likeButtonViewModel"][
-            "toggleButtonViewModel"]["toggleButtonViewModel"]["isTogglingDisabled"]
+        return _toggling_disabled_path(self._rating_buttons)
 
     @property
     def money_hand(self) -> bool:
@@ -206,14 +239,12 @@ class VideoBase(playable.PlayableBase):
 
     @property
     def _chan_info(self) -> dict:
-        return self.initial_data["contents"]["twoColumnWatchNextResults"]["results"][
-            "results"]["contents"][1]["videoSecondaryInfoRenderer"]
+        return _secondary_renderer_path(self.initial_data)
 
     @property
     def owner_subscribers_count(self) -> Optional[str]:
         try:
-            return self._chan_info["owner"]["videoOwnerRenderer"][
-                "subscriberCountText"]["simpleText"]
+            return _subscriber_count_path(self._chan_info)
         except KeyError:
             return None
 
@@ -268,8 +299,7 @@ class VideoBase(playable.PlayableBase):
     @property
     def _categories(self)->List[VideoCategory]:
         categories = []
-        mrkr = self.initial_data["contents"]["twoColumnWatchNextResults"]["results"]["results"]["contents"][1]["videoSecondaryInfoRenderer"][
-            "metadataRowContainer"]["metadataRowContainerRenderer"]
+        mrkr = _metadata_rows_path(self.initial_data)
         if not "rows" in mrkr:
             return categories
         mrkr = mrkr["rows"][0]
@@ -287,9 +317,7 @@ class VideoBase(playable.PlayableBase):
         Returns:
             Optional[Tuple[str,str]]: first is text, second is url.
         """
-        mrkr = self.initial_data["contents"]["twoColumnWatchNextResults"]["results"][
-            "results"]["contents"][1]["videoSecondaryInfoRenderer"]["metadataRowContainer"][
-            "metadataRowContainerRenderer"]
+        mrkr = _metadata_rows_path(self.initial_data)
         if "rows" not in mrkr:
             return None
         for row in mrkr["rows"]:
@@ -524,7 +552,9 @@ async def get_video(
     ytcfg: Optional[dict] = None,
     js_url: Optional[str] = None,
     js: Optional[str] = None,
+    lean: bool = False,
 ) -> Video:
+    """lean releases the html after extraction, see BaseYoutube.release_html"""
 
     # If url is "https://www.youtube.com/shorts/{id}" it generic another initial_data,
     # that can descibe in other class
@@ -535,6 +565,10 @@ async def get_video(
             if not parsed_url.query
             else f"?{parsed_url.query}"
         )
-    c_html = html if html else await net_obj.get_text(url)
-    ip = await it.player(extract.video_id(parsed_url, parse.parse_qs(parsed_url.query))) if not initial_player else initial_player
-    return Video(url, c_html, net_obj, it, ip, initial_data, ytcfg, js_url, js)
+    with tracing.span("get_video", url=url):
+        c_html = html if html else await net_obj.get_text(url)
+        ip = await it.player(extract.video_id(parsed_url, parse.parse_qs(parsed_url.query))) if not initial_player else initial_player
+        video = Video(url, c_html, net_obj, it, ip, initial_data, ytcfg, js_url, js)
+        if lean:
+            video.release_html()
+        return video